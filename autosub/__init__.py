@@ -9,15 +9,19 @@ import gettext
 import sys
 import shlex
 
-# Import third-party modules
-import pysubs2
-
 # Any changes to the path and your own modules
-from autosub import ffmpeg_utils
-from autosub import cmdline_utils
 from autosub import options
 from autosub import exceptions
 from autosub import constants
+from autosub import lazy_utils
+from autosub import metrics_utils
+from autosub import profile_utils
+
+# Workflow modules are imported only when the args need them
+# so that "-h" and "-V" start fast.
+cmdline_utils = lazy_utils.lazy_import("autosub.cmdline_utils")  # pylint: disable=invalid-name
+server_utils = lazy_utils.lazy_import("autosub.server_utils")  # pylint: disable=invalid-name
+pysubs2 = lazy_utils.lazy_import("pysubs2")  # pylint: disable=invalid-name
 
 INIT_TEXT = gettext.translation(domain=__name__,
                                 localedir=constants.LOCALE_PATH,
@@ -56,7 +60,16 @@ def main():  # pylint: disable=too-many-branches, too-many-statements, too-many-
     if args.proxy_password:
         os.environ['proxy_password'] = args.proxy_password
 
+    if args.metrics_json:
+        metrics_utils.enable()
+
+    if args.profile:
+        profile_utils.enable()
+
     try:
+        if args.metrics_port:
+            server_utils.serve_metrics(args.metrics_port)
+
         if args.speech_config:
             cmdline_utils.validate_speech_config(args)
 
@@ -71,133 +84,44 @@ def main():  # pylint: disable=too-many-branches, too-many-statements, too-many-
         else:
             input_m = None
 
-        styles_list = []
-        result = cmdline_utils.validate_io(args, styles_list)
-
-        if result:
-            if not constants.FFMPEG_CMD:
-                raise exceptions.AutosubException(
-                    _("Error: Dependency ffmpeg"
-                      " not found on this machine."))
-            if not constants.FFPROBE_CMD:
-                raise exceptions.AutosubException(
-                    _("Error: Dependency ffprobe"
-                      " not found on this machine."))
-
-            cmdline_utils.fix_args(args)
-
-            if args.audio_process:
-                args.audio_process = {k.lower() for k in args.audio_process}
-                args.audio_process = \
-                    args.audio_process & constants.DEFAULT_AUDIO_PRCS_MODE_SET
-                if not args.audio_process:
-                    raise exceptions.AutosubException(
-                        _("Error: The args of \"-ap\"/\"--audio-process\" are wrong."
-                          "\nNo works done."))
-                if 'o' in args.audio_process:
-                    args.keep = True
-                    prcs_file = ffmpeg_utils.audio_pre_prcs(
-                        filename=args.input,
-                        is_keep=args.keep,
-                        cmds=args.audio_process_cmd,
-                        output_name=args.output,
-                        input_m=input_m)
-                    if not prcs_file:
-                        raise exceptions.AutosubException(
-                            _("No works done."))
-
-                    args.input = prcs_file
-                    raise exceptions.AutosubException(
-                        _("Audio pre-processing complete.\nAll works done."))
-
-                if 's' in args.audio_process:
-                    args.keep = True
-
-                if 'y' in args.audio_process:
-                    prcs_file = ffmpeg_utils.audio_pre_prcs(
-                        filename=args.input,
-                        is_keep=args.keep,
-                        cmds=args.audio_process_cmd,
-                        output_name=args.output,
-                        input_m=input_m)
-                    args.audio_split_cmd = \
-                        args.audio_split_cmd.replace(
-                            "-vn -ac [channel] -ar [sample_rate] ", "")
-                    if not prcs_file:
-                        print(_("Audio pre-processing failed. Try default method."))
-                    else:
-                        args.input = prcs_file
-                        print(_("Audio pre-processing complete."))
-
-            else:
-                if args.audio_split_cmd == constants.DEFAULT_AUDIO_SPLT_CMD:
-                    # if user doesn't modify the audio_split_cmd
-                    if args.api_suffix == ".ogg":
-                        # regard ogg as ogg_opus
-                        args.audio_split_cmd = \
-                            args.audio_split_cmd.replace(
-                                "-vn",
-                                "-vn -c:a libopus")
-                    elif args.api_suffix == ".pcm":
-                        # raw pcm
-                        args.audio_split_cmd = \
-                            args.audio_split_cmd.replace(
-                                "-vn",
-                                "-vn -c:a pcm_s16le -f s16le")
-
-            args.audio_split_cmd = \
-                args.audio_split_cmd.replace(
-                    "[channel]",
-                    "{channel}".format(channel=args.api_audio_channel))
-            args.audio_split_cmd = \
-                args.audio_split_cmd.replace(
-                    "[sample_rate]",
-                    "{sample_rate}".format(sample_rate=args.api_sample_rate))
-
-            cmdline_utils.validate_aovp_args(args)
-            fps = cmdline_utils.get_fps(args=args, input_m=input_m)
-            cmdline_utils.audio_or_video_prcs(args,
-                                              fps=fps,
-                                              input_m=input_m,
-                                              styles_list=styles_list)
+        if args.live:
+            cmdline_utils.live_prcs(args)
+            raise exceptions.AutosubException(_("\nAll works done."))
 
+        if args.server:
+            server_utils.serve(args)
+            raise exceptions.AutosubException(_("\nAll works done."))
+
+        if cmdline_utils.is_batch_input(args.input):
+            cmdline_utils.batch_prcs(args, input_m=input_m)
         else:
-            result = cmdline_utils.validate_sp_args(args)
-            fps = cmdline_utils.get_fps(args=args, input_m=input_m)
-            if result:
-                args.output_files = args.output_files & \
-                                    constants.DEFAULT_SUB_MODE_SET
-                if not args.output_files:
-                    raise exceptions.AutosubException(
-                        _("Error: No valid \"-of\"/\"--output-files\" arguments."))
-                cmdline_utils.sub_trans(args,
-                                        input_m=input_m,
-                                        fps=fps,
-                                        styles_list=None)
-            else:
-                args.audio_split_cmd = \
-                    args.audio_split_cmd.replace(
-                        "[channel]",
-                        "{channel}".format(channel=args.api_audio_channel))
-                args.audio_split_cmd = \
-                    args.audio_split_cmd.replace(
-                        "[sample_rate]",
-                        "{sample_rate}".format(sample_rate=args.api_sample_rate))
-
-                cmdline_utils.sub_conversion(
-                    args,
-                    input_m=input_m,
-                    fps=fps
-                )
+            cmdline_utils.input_prcs(args, input_m=input_m)
 
         raise exceptions.AutosubException(_("\nAll works done."))
 
     except KeyboardInterrupt:
         print(_("\nKeyboardInterrupt. Works stopped."))
-    except pysubs2.exceptions.Pysubs2Error:
-        print(_("\nError: pysubs2.exceptions. Check your file format."))
     except exceptions.AutosubException as err_msg:
         print(err_msg)
+    except pysubs2.exceptions.Pysubs2Error:
+        print(_("\nError: pysubs2.exceptions. Check your file format."))
+
+    if args.metrics_json:
+        try:
+            metrics_utils.RECORDER.write(args.metrics_json)
+            print(_("Metrics report written to \"{path}\".").format(path=args.metrics_json))
+        except OSError:
+            print(_("Error: Can't write the metrics report to \"{path}\".").format(
+                path=args.metrics_json))
+
+    if args.profile:
+        try:
+            folded_path = profile_utils.PROFILER.write(args.profile)
+            print(_("Profile written to \"{path}\" and \"{folded_path}\".").format(
+                path=args.profile, folded_path=folded_path))
+        except OSError:
+            print(_("Error: Can't write the profile to \"{path}\".").format(
+                path=args.profile))
 
     if is_pause:
         input(_("Press Enter to exit..."))
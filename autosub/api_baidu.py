@@ -8,16 +8,18 @@ Defines Baidu API used by autosub.
 from urllib.parse import urlencode
 import json
 import gettext
-import os
 import base64
-
-# Import third-party modules
-import requests
-
+import time
 
 # Any changes to the path and your own modules
+from autosub import audio_utils
 from autosub import constants
 from autosub import exceptions
+from autosub import hedge_utils
+from autosub import lazy_utils
+from autosub import metrics_utils
+
+requests = lazy_utils.lazy_import("requests")  # pylint: disable=invalid-name
 
 
 API_BAIDU_TEXT = gettext.translation(domain=__name__,
@@ -65,11 +67,13 @@ def get_baidu_transcript(
 def get_baidu_token(
         api_key,
         api_secret,
-        token_url=constants.BAIDU_TOKEN_URL
+        token_url=None
 ):
     """
     Function for getting Baidu ASR API token
     """
+    if not token_url:
+        token_url = constants.BAIDU_TOKEN_URL
     requests_params = {"grant_type": "client_credentials",
                        "client_id": api_key,
                        "client_secret": api_secret}
@@ -101,7 +105,8 @@ class BaiduASRAPI:  # pylint: disable=too-few-public-methods
                  retries=3,
                  is_keep=False,
                  is_full_result=False,
-                 delete_chars=None):
+                 delete_chars=None,
+                 hedge_ratio=0.0):
         # pylint: disable=too-many-arguments
         self.config = config
         self.api_url = api_url
@@ -109,14 +114,11 @@ class BaiduASRAPI:  # pylint: disable=too-few-public-methods
         self.is_keep = is_keep
         self.is_full_result = is_full_result
         self.delete_chars = delete_chars
+        self.hedge_ratio = hedge_ratio
 
-    def __call__(self, filename):
+    def __call__(self, audio_fragment):
         try:  # pylint: disable=too-many-nested-blocks
-            audio_file = open(filename, mode="rb")
-            audio_data = audio_file.read()
-            audio_file.close()
-            if not self.is_keep:
-                os.remove(filename)
+            audio_data = audio_utils.read_fragment(audio_fragment, self.is_keep)
 
             for _ in range(self.retries):
                 # Reference: https://github.com/Baidu-AIP/speech-demo/blob/master
@@ -124,17 +126,38 @@ class BaiduASRAPI:  # pylint: disable=too-few-public-methods
                 self.config["speech"] = base64.b64encode(audio_data).decode('utf-8')
                 self.config["len"] = len(audio_data)
                 config_json = json.dumps(self.config, ensure_ascii=False)
+                start_time = time.perf_counter()
                 try:
                     requests_result = \
-                        requests.post(self.api_url, data=config_json)
+                        hedge_utils.post("baidu", self.hedge_ratio, self.api_url,
+                                         data=config_json)
                 except requests.exceptions.ConnectionError:
+                    metrics_utils.record_call(provider="baidu",
+                                              latency=time.perf_counter() - start_time,
+                                              code="connection_error",
+                                              is_error=True,
+                                              bytes_out=len(config_json))
                     continue
+                latency = time.perf_counter() - start_time
                 requests_result_json = requests_result.content.decode("utf-8")
                 try:
                     result_dict = json.loads(requests_result_json)
                 except ValueError:
                     # no result
+                    metrics_utils.record_call(provider="baidu",
+                                              latency=latency,
+                                              code=requests_result.status_code,
+                                              is_error=True,
+                                              bytes_out=len(config_json),
+                                              bytes_in=len(requests_result.content))
                     continue
+                err_no = result_dict.get("err_no") if isinstance(result_dict, dict) else None
+                metrics_utils.record_call(provider="baidu",
+                                          latency=latency,
+                                          code=err_no,
+                                          is_error=err_no != 0,
+                                          bytes_out=len(config_json),
+                                          bytes_in=len(requests_result.content))
 
                 if not self.is_full_result:
                     return get_baidu_transcript(result_dict, self.delete_chars)
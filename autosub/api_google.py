@@ -4,24 +4,30 @@
 Defines Google API used by autosub.
 """
 # Import built-in modules
-import os
 import base64
 import json
-
-# Import third-party modules
-import requests
+import time
 
 # Any changes to the path and your own modules
+from autosub import audio_utils
 from autosub import exceptions
 from autosub import constants
+from autosub import hedge_utils
+from autosub import lazy_utils
+from autosub import metrics_utils
+
+requests = lazy_utils.lazy_import("requests")  # pylint: disable=invalid-name
 
 if constants.IS_GOOGLECLOUDCLIENT:
-    from google.cloud import speech_v1p1beta1
-    from google.protobuf.json_format import MessageToDict
-    from google.cloud.speech_v1p1beta1 import enums
+    speech_v1p1beta1 = lazy_utils.lazy_import(  # pylint: disable=invalid-name
+        "google.cloud.speech_v1p1beta1")
+    json_format = lazy_utils.lazy_import(  # pylint: disable=invalid-name
+        "google.protobuf.json_format")
+    enums = lazy_utils.lazy_import(  # pylint: disable=invalid-name
+        "google.cloud.speech_v1p1beta1.gapic.enums")
 else:
     speech_v1p1beta1 = None  # pylint: disable=invalid-name
-    MessageToDict = None  # pylint: disable=invalid-name
+    json_format = None  # pylint: disable=invalid-name
     enums = None  # pylint: disable=invalid-name
 
 
@@ -190,7 +196,8 @@ class GoogleSpeechV2:  # pylint: disable=too-few-public-methods
                  min_confidence=0.0,
                  retries=3,
                  is_keep=False,
-                 is_full_result=False):
+                 is_full_result=False,
+                 hedge_ratio=0.0):
         # pylint: disable=too-many-arguments
         self.min_confidence = min_confidence
         self.retries = retries
@@ -198,19 +205,29 @@ class GoogleSpeechV2:  # pylint: disable=too-few-public-methods
         self.is_keep = is_keep
         self.headers = headers
         self.is_full_result = is_full_result
+        self.hedge_ratio = hedge_ratio
 
-    def __call__(self, filename):
+    def __call__(self, audio_fragment):
         try:  # pylint: disable=too-many-nested-blocks
-            audio_file = open(filename, mode='rb')
-            audio_data = audio_file.read()
-            audio_file.close()
-            if not self.is_keep:
-                os.remove(filename)
+            audio_data = audio_utils.read_fragment(audio_fragment, self.is_keep)
             for _ in range(self.retries):
+                start_time = time.perf_counter()
                 try:
-                    result = requests.post(self.api_url, data=audio_data, headers=self.headers)
+                    result = hedge_utils.post("gsv2", self.hedge_ratio, self.api_url,
+                                              data=audio_data, headers=self.headers)
                 except requests.exceptions.ConnectionError:
+                    metrics_utils.record_call(provider="gsv2",
+                                              latency=time.perf_counter() - start_time,
+                                              code="connection_error",
+                                              is_error=True,
+                                              bytes_out=len(audio_data))
                     continue
+                metrics_utils.record_call(provider="gsv2",
+                                          latency=time.perf_counter() - start_time,
+                                          code=result.status_code,
+                                          is_error=result.status_code != 200,
+                                          bytes_out=len(audio_data),
+                                          bytes_in=len(result.content))
 
                 # receive several results delimited by LF
                 result_list = result.content.decode('utf-8').split("\n")
@@ -241,7 +258,7 @@ class GoogleSpeechV2:  # pylint: disable=too-few-public-methods
 
 
 def gcsv1p1beta1_service_client(
-        filename,
+        audio_fragment,
         is_keep,
         config,
         min_confidence,
@@ -251,19 +268,19 @@ def gcsv1p1beta1_service_client(
     using Google Cloud Speech-to-Text V1P1Beta1 API client for an input FLAC file.
     """
     try:  # pylint: disable=too-many-nested-blocks
-        audio_file = open(filename, mode='rb')
-        audio_data = audio_file.read()
-        audio_file.close()
-        if not is_keep:
-            os.remove(filename)
+        audio_data = audio_utils.read_fragment(audio_fragment, is_keep)
 
         # https://cloud.google.com/speech-to-text/docs/quickstart-client-libraries
         # https://cloud.google.com/speech-to-text/docs/basics
         # https://cloud.google.com/speech-to-text/docs/reference/rpc/google.cloud.speech.v1p1beta1#google.cloud.speech.v1p1beta1.SpeechRecognitionResult
         client = speech_v1p1beta1.SpeechClient()
         audio_dict = {"content": audio_data}
+        start_time = time.perf_counter()
         recognize_response = client.recognize(config, audio_dict)
-        result_dict = MessageToDict(
+        metrics_utils.record_call(provider="gcsv1",
+                                  latency=time.perf_counter() - start_time,
+                                  bytes_out=len(audio_data))
+        result_dict = json_format.MessageToDict(
             recognize_response,
             preserving_proto_field_name=True)
 
@@ -275,7 +292,7 @@ def gcsv1p1beta1_service_client(
         return None
 
 
-class GCSV1P1Beta1URL:  # pylint: disable=too-few-public-methods, duplicate-code
+class GCSV1P1Beta1URL:  # pylint: disable=too-few-public-methods, too-many-instance-attributes, duplicate-code
     """
     Class for performing Speech-to-Text
     using Google Cloud Speech-to-Text V1P1Beta1 API URL for an input FLAC file.
@@ -287,7 +304,8 @@ class GCSV1P1Beta1URL:  # pylint: disable=too-few-public-methods, duplicate-code
                  min_confidence=0.0,
                  retries=3,
                  is_keep=False,
-                 is_full_result=False):
+                 is_full_result=False,
+                 hedge_ratio=0.0):
         # pylint: disable=too-many-arguments
         self.config = config
         self.api_url = api_url
@@ -296,14 +314,11 @@ class GCSV1P1Beta1URL:  # pylint: disable=too-few-public-methods, duplicate-code
         self.retries = retries
         self.is_keep = is_keep
         self.is_full_result = is_full_result
+        self.hedge_ratio = hedge_ratio
 
-    def __call__(self, filename):
+    def __call__(self, audio_fragment):
         try:  # pylint: disable=too-many-nested-blocks
-            audio_file = open(filename, mode='rb')
-            audio_data = audio_file.read()
-            audio_file.close()
-            if not self.is_keep:
-                os.remove(filename)
+            audio_data = audio_utils.read_fragment(audio_fragment, self.is_keep)
 
             for _ in range(self.retries):
                 # https://cloud.google.com/speech-to-text/docs/quickstart-protocol
@@ -314,12 +329,25 @@ class GCSV1P1Beta1URL:  # pylint: disable=too-few-public-methods, duplicate-code
                 request_data = {"config": self.config, "audio": audio_dict}
                 config_json = json.dumps(request_data, ensure_ascii=False)
 
+                start_time = time.perf_counter()
                 try:
                     requests_result = \
-                        requests.post(self.api_url, data=config_json, headers=self.headers)
+                        hedge_utils.post("gcsv1", self.hedge_ratio, self.api_url,
+                                         data=config_json, headers=self.headers)
 
                 except requests.exceptions.ConnectionError:
+                    metrics_utils.record_call(provider="gcsv1",
+                                              latency=time.perf_counter() - start_time,
+                                              code="connection_error",
+                                              is_error=True,
+                                              bytes_out=len(config_json))
                     continue
+                metrics_utils.record_call(provider="gcsv1",
+                                          latency=time.perf_counter() - start_time,
+                                          code=requests_result.status_code,
+                                          is_error=requests_result.status_code != 200,
+                                          bytes_out=len(config_json),
+                                          bytes_in=len(requests_result.content))
 
                 requests_result_json = requests_result.content.decode('utf-8')
 
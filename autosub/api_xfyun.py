@@ -18,11 +18,15 @@ from time import mktime
 
 # Import third-party modules
 import _thread
-import websocket
 
 # Any changes to the path and your own modules
+from autosub import audio_utils
 from autosub import constants
 from autosub import exceptions
+from autosub import lazy_utils
+from autosub import metrics_utils
+
+websocket = lazy_utils.lazy_import("websocket")  # pylint: disable=invalid-name
 
 
 def create_xfyun_url(
@@ -34,7 +38,12 @@ def create_xfyun_url(
     Function for creating authorization for Xun Fei Yun Speech-to-Text Websocket API.
     """
     request_location = "/v2/iat"
-    result_url = "wss://" + api_address + request_location
+    if api_address.startswith("ws://") or api_address.startswith("wss://"):
+        # a scheme given explicitly, e.g. a local test server
+        scheme, api_address = api_address.split("://", 1)
+    else:
+        scheme = "wss"
+    result_url = scheme + "://" + api_address + request_location
     now = datetime.now()
     stamp = mktime(now.timetuple())
     date = formatdate(timeval=stamp, localtime=False, usegmt=True)
@@ -117,15 +126,19 @@ class XfyunWebSocketAPI:  # pylint: disable=too-many-instance-attributes, too-ma
                      "audio": ""}
         self.transcript = ""
         self.result_list = []
-        self.filename = None
+        self.audio_data = b""
         self.web_socket_app = None
+        self.last_code = None
+        self.received_size = 0
 
-    def __call__(self, filename):
+    def __call__(self, audio_fragment):
         if self.is_full_result:
             self.result_list = []
         else:
             self.transcript = ""
-        self.filename = filename
+        self.audio_data = audio_utils.read_fragment(audio_fragment, is_keep=True)
+        self.last_code = None
+        self.received_size = 0
         websocket.enableTrace(False)
         # Ref: https://stackoverflow.com/questions/26980966
         # /using-a-websocket-client-as-a-class-in-python
@@ -136,9 +149,16 @@ class XfyunWebSocketAPI:  # pylint: disable=too-many-instance-attributes, too-ma
                 api_address=self.api_address),
             on_message=lambda web_socket, msg: self.on_message(web_socket, msg),
             on_error=lambda web_socket, msg: self.on_error(web_socket, msg),
-            on_close=lambda web_socket: self.on_close(web_socket),
+            on_close=lambda web_socket, *args: self.on_close(web_socket),
             on_open=lambda web_socket: self.on_open(web_socket))
+        start_time = time.perf_counter()
         self.web_socket_app.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
+        metrics_utils.record_call(provider="xfyun",
+                                  latency=time.perf_counter() - start_time,
+                                  code=self.last_code,
+                                  is_error=self.last_code != 0,
+                                  bytes_out=len(self.audio_data),
+                                  bytes_in=self.received_size)
         if self.is_full_result:
             return self.result_list
         return self.transcript
@@ -147,10 +167,13 @@ class XfyunWebSocketAPI:  # pylint: disable=too-many-instance-attributes, too-ma
         """
         Process the message received from WebSocket.
         """
+        self.received_size += len(result)
         try:
             web_socket_result = json.loads(result)
         except ValueError:
             return
+        if isinstance(web_socket_result, dict):
+            self.last_code = web_socket_result.get("code")
         if not self.is_full_result:
             self.transcript = self.transcript + \
                               get_xfyun_transcript(
@@ -179,40 +202,42 @@ class XfyunWebSocketAPI:  # pylint: disable=too-many-instance-attributes, too-ma
             frame_size = 8000  # 每一帧的音频大小
             interval = 0.04  # 发送音频间隔(单位:s)
             status = 0  # 音频的状态信息，标识音频是第一帧，还是中间帧、最后一帧
-            with open(self.filename, "rb") as audio_file:
-                while True:
-                    buf = audio_file.read(frame_size)
-                    # 文件结束
-                    if not buf:
-                        status = 2
-                    self.data["audio"] = str(base64.b64encode(buf), "utf-8")
-                    # 第一帧处理
-                    # 发送第一帧音频，带business 参数
-                    # appid 必须带上，只需第一帧发送
-                    if status == 0:
-                        self.data["status"] = 0
-                        web_socket_data = {
-                            "common": self.common_args,
-                            "business": self.business_args,
-                            "data": self.data}
-                        status = 1
-                    # 中间帧处理
-                    elif status == 1:
-                        self.data["status"] = 1
-                        web_socket_data = {"data": self.data}
-                    # 最后一帧处理
-                    elif status == 2:
-                        self.data["status"] = 2
-                        web_socket_data = {"data": self.data}
-                        web_socket_json = json.dumps(web_socket_data)
-                        web_socket.send(web_socket_json)
-                        time.sleep(1)
-                        break
-
+            audio_data = memoryview(self.audio_data)
+            offset = 0
+            while True:
+                buf = audio_data[offset:offset + frame_size]
+                offset = offset + frame_size
+                # 文件结束
+                if not buf:
+                    status = 2
+                self.data["audio"] = str(base64.b64encode(buf), "utf-8")
+                # 第一帧处理
+                # 发送第一帧音频，带business 参数
+                # appid 必须带上，只需第一帧发送
+                if status == 0:
+                    self.data["status"] = 0
+                    web_socket_data = {
+                        "common": self.common_args,
+                        "business": self.business_args,
+                        "data": self.data}
+                    status = 1
+                # 中间帧处理
+                elif status == 1:
+                    self.data["status"] = 1
+                    web_socket_data = {"data": self.data}
+                # 最后一帧处理
+                elif status == 2:
+                    self.data["status"] = 2
+                    web_socket_data = {"data": self.data}
                     web_socket_json = json.dumps(web_socket_data)
                     web_socket.send(web_socket_json)
-                    # 模拟音频采样间隔
-                    time.sleep(interval)
+                    time.sleep(1)
+                    break
+
+                web_socket_json = json.dumps(web_socket_data)
+                web_socket.send(web_socket_json)
+                # 模拟音频采样间隔
+                time.sleep(interval)
             web_socket.close()
         _thread.start_new_thread(run, ())
 
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Defines autosub's in-process audio encoding functionality.
+"""
+# Import built-in modules
+import os
+import io
+import gettext
+import functools
+import subprocess
+import tempfile
+import wave
+
+# Import third-party modules
+
+
+# Any changes to the path and your own modules
+from autosub import constants
+from autosub import exceptions
+from autosub import lazy_utils
+
+soundfile = lazy_utils.lazy_import("soundfile")  # pylint: disable=invalid-name
+
+AUDIO_UTILS_TEXT = gettext.translation(domain=__name__,
+                                       localedir=constants.LOCALE_PATH,
+                                       languages=[constants.CURRENT_LOCALE],
+                                       fallback=True)
+
+_ = AUDIO_UTILS_TEXT.gettext
+
+# sample rates supported by the opus encoder
+OPUS_SAMPLE_RATES = {8000, 12000, 16000, 24000, 48000}
+
+# bytes of a 16-bit sample
+SAMPLE_WIDTH = 2
+
+
+class AudioFragment:
+    """
+    Class for a short-term audio fragment whose data is in memory or in a file.
+    """
+    __slots__ = ("data", "path", "suffix")
+
+    def __init__(self, data=None, path=None, suffix=""):
+        self.data = data
+        self.path = path
+        self.suffix = suffix
+
+    def __len__(self):
+        if self.data is not None:
+            return len(self.data)
+        if self.path and os.path.isfile(self.path):
+            return os.path.getsize(self.path)
+        return 0
+
+    def read(self, is_keep=False):
+        """
+        Return the audio data. Remove the file unless it is kept.
+        """
+        if self.data is not None:
+            return self.data
+        with open(self.path, mode="rb") as audio_file:
+            audio_data = audio_file.read()
+        if not is_keep:
+            os.remove(self.path)
+        return audio_data
+
+    def remove(self):
+        """
+        Remove the file if there is one.
+        """
+        if self.path and os.path.isfile(self.path):
+            os.remove(self.path)
+
+
+@functools.lru_cache(maxsize=None)
+def get_native_suffixes():
+    """
+    Return the audio suffixes which can be encoded in process.
+    FLAC and OGG Opus need the optional "soundfile" module.
+    """
+    suffixes = [".pcm", ".wav"]
+    if not lazy_utils.is_module_available("soundfile"):
+        return suffixes
+    try:
+        if "FLAC" in soundfile.available_formats():
+            suffixes.append(".flac")
+        if "OPUS" in soundfile.available_subtypes("OGG"):
+            suffixes.append(".ogg")
+    except (OSError, ImportError):
+        # libsndfile isn't found
+        pass
+    return suffixes
+
+
+def is_native_suffix(suffix, sample_rate):
+    """
+    Check if an audio suffix can be encoded in process at the sample rate.
+    """
+    if suffix == ".ogg" and sample_rate not in OPUS_SAMPLE_RATES:
+        return False
+    return suffix in get_native_suffixes()
+
+
+def encode_pcm(pcm_data, suffix, sample_rate, channel):
+    """
+    Give raw 16-bit little-endian pcm data
+    and return the audio data encoded in the suffix's format.
+    """
+    if suffix == ".pcm":
+        return pcm_data
+
+    audio_buffer = io.BytesIO()
+    if suffix == ".wav":
+        # Wave_write directly since pylint infers wave.open as a Wave_read
+        with wave.Wave_write(audio_buffer) as wav_file:
+            wav_file.setnchannels(channel)
+            wav_file.setsampwidth(SAMPLE_WIDTH)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes(pcm_data)
+        return audio_buffer.getvalue()
+
+    if suffix == ".flac":
+        audio_format, subtype = "FLAC", "PCM_16"
+    else:
+        # regard ogg as ogg_opus
+        audio_format, subtype = "OGG", "OPUS"
+    with soundfile.SoundFile(audio_buffer, mode="w",
+                             samplerate=sample_rate,
+                             channels=channel,
+                             format=audio_format,
+                             subtype=subtype) as sound_file:
+        sound_file.buffer_write(pcm_data, dtype="int16")
+    return audio_buffer.getvalue()
+
+
+def decode_pcm(source_path, sample_rate, channel):
+    """
+    Give an input audio or video file and decode it once
+    into a temporary raw pcm file at the sample rate and the channel count.
+    Return the pcm file path.
+    """
+    pcm_temp = tempfile.NamedTemporaryFile(suffix=".pcm", delete=False)
+    pcm_temp.close()
+    command = constants.DEFAULT_AUDIO_DECODE_CMD.format(
+        in_=source_path,
+        channel=channel,
+        sample_rate=sample_rate,
+        out_=pcm_temp.name)
+    prcs = subprocess.Popen(constants.cmd_conversion(command),
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    prcs.communicate()
+    if prcs.returncode or not os.path.getsize(pcm_temp.name):
+        os.remove(pcm_temp.name)
+        raise exceptions.ConversionException(
+            _("Error: ffmpeg can't decode your file. "
+              "Check your audio processing options."))
+    return pcm_temp.name
+
+
+class SplitPCMIntoAudioPiece:  # pylint: disable=too-few-public-methods, too-many-instance-attributes
+    """
+    Class for slicing a region of a decoded pcm file and encoding it in process.
+    Return an audio fragment in memory, or in a file when the fragments are kept.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+            self,
+            pcm_path,
+            output,
+            is_keep,
+            suffix,
+            sample_rate,
+            channel=1,
+            include_before=0.0,
+            include_after=0.0):
+        self.pcm_path = pcm_path
+        self.output = output
+        self.is_keep = is_keep
+        self.suffix = suffix
+        self.sample_rate = sample_rate
+        self.channel = channel
+        self.include_before = include_before
+        self.include_after = include_after
+
+    def __call__(self, region):
+        try:
+            start_ms, end_ms = region
+            start = float(start_ms) / 1000.0
+            end = float(end_ms) / 1000.0
+            if start > self.include_before:
+                start = start - self.include_before
+            end += self.include_after
+
+            frame_size = SAMPLE_WIDTH * self.channel
+            with open(self.pcm_path, "rb") as pcm_file:
+                pcm_file.seek(int(start * self.sample_rate) * frame_size)
+                pcm_data = pcm_file.read(int((end - start) * self.sample_rate) * frame_size)
+            if len(pcm_data) < frame_size:
+                return None
+            audio_data = encode_pcm(pcm_data=pcm_data,
+                                    suffix=self.suffix,
+                                    sample_rate=self.sample_rate,
+                                    channel=self.channel)
+
+            if not self.is_keep or not self.output:
+                return AudioFragment(data=audio_data, suffix=self.suffix)
+
+            filename = self.output \
+                + "-{start:0>8.3f}-{end:0>8.3f}{suffix}".format(
+                    start=start,
+                    end=end,
+                    suffix=self.suffix)
+            with open(filename, "wb") as audio_file:
+                audio_file.write(audio_data)
+            return AudioFragment(path=filename, suffix=self.suffix)
+
+        except KeyboardInterrupt:
+            return None
+
+
+def read_fragment(audio_fragment, is_keep=False):
+    """
+    Give an audio fragment or an audio file path and return its data.
+    Remove the file unless it is kept.
+    """
+    if isinstance(audio_fragment, AudioFragment):
+        return audio_fragment.read(is_keep)
+    with open(audio_fragment, mode="rb") as audio_file:
+        audio_data = audio_file.read()
+    if not is_keep:
+        os.remove(audio_fragment)
+    return audio_data
+
+
+def remove_fragment(audio_fragment):
+    """
+    Remove an audio fragment or an audio file if it is a file.
+    """
+    if isinstance(audio_fragment, AudioFragment):
+        audio_fragment.remove()
+    elif os.path.isfile(audio_fragment):
+        os.remove(audio_fragment)
+
+
+def get_fragment_size(audio_fragment):
+    """
+    Return the data size of an audio fragment or an audio file.
+    """
+    if isinstance(audio_fragment, AudioFragment):
+        return len(audio_fragment)
+    if audio_fragment and os.path.isfile(audio_fragment):
+        return os.path.getsize(audio_fragment)
+    return 0
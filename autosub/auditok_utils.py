@@ -8,12 +8,16 @@ Defines utils used by auditok.
 
 # Import third-party modules
 import auditok
-import pysubs2
 
 # Any changes to the path and your own modules
 from autosub import constants
+from autosub import lazy_utils
+from autosub import metrics_utils
 
+pysubs2 = lazy_utils.lazy_import("pysubs2")  # pylint: disable=invalid-name
 
+
+@metrics_utils.timed_stage("detect")
 def auditok_gen_speech_regions(  # pylint: disable=too-many-arguments
         audio_wav,
         energy_threshold=constants.DEFAULT_ENERGY_THRESHOLD,
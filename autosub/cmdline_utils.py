@@ -13,13 +13,17 @@ import tempfile
 import gc
 import json
 import copy
+import functools
+import glob
+import multiprocessing
+import queue
+import threading
 
 # Import third-party modules
 import auditok
-import googletrans
-import pysubs2
 
 # Any changes to the path and your own modules
+from autosub import audio_utils
 from autosub import constants
 from autosub import core
 from autosub import exceptions
@@ -28,7 +32,16 @@ from autosub import lang_code_utils
 from autosub import sub_utils
 from autosub import api_google
 from autosub import api_baidu
+from autosub import api_xfyun
 from autosub import auditok_utils
+from autosub import live_utils
+from autosub import lazy_utils
+from autosub import metrics_utils
+from autosub import timing_utils
+from autosub import trans_utils
+
+googletrans = lazy_utils.lazy_import("googletrans")  # pylint: disable=invalid-name
+pysubs2 = lazy_utils.lazy_import("pysubs2")  # pylint: disable=invalid-name
 
 CMDLINE_UTILS_TEXT = gettext.translation(domain=__name__,
                                          localedir=constants.LOCALE_PATH,
@@ -38,6 +51,66 @@ CMDLINE_UTILS_TEXT = gettext.translation(domain=__name__,
 _ = CMDLINE_UTILS_TEXT.gettext
 
 
+def get_googletrans_translator(args):
+    """
+    Give args and return a py-googletrans translator.
+    """
+    if args.user_agent:
+        user_agent = args.user_agent
+    else:
+        user_agent = googletrans.constants.DEFAULT_USER_AGENT
+    return googletrans.Translator(
+        user_agent=user_agent,
+        service_urls=args.service_urls)
+
+
+def get_translator(args, input_m=input):
+    """
+    Give args and return the translator of the translation api.
+    """
+    if args.translation_api == "man":
+        trans_doc_name = "{base}.{nt}.{extension}".format(
+            base=args.output,
+            nt='trans',
+            extension=args.translation_format)
+        if not args.src_language or args.src_language == "auto":
+            args.src_language = "src"
+        if not args.dst_language:
+            args.dst_language = "dst"
+        if args.sleep_seconds == constants.DEFAULT_SLEEP_SECONDS:
+            args.sleep_seconds = 0.1
+        if args.max_trans_size == constants.DEFAULT_SIZE_PER_TRANS:
+            args.max_trans_size = 9950
+        return core.ManualTranslator(
+            trans_doc_name=trans_doc_name,
+            input_m=input_m,
+            is_watch=args.trans_watch)
+    if args.translation_api != "pygt":
+        try:
+            return trans_utils.get_translator(args.translation_api, args.translation_config)
+        except (KeyError, ValueError, OSError, ImportError, AttributeError) as error:
+            raise exceptions.AutosubException(
+                _("Error: Can't load the translator backend \"{backend}\". {error}").format(
+                    backend=args.translation_api, error=error)) from error
+    return get_googletrans_translator(args)
+
+
+def validate_trans_config(args):
+    """
+    Check that the translation-config args passed to autosub are valid
+    for the translator backends.
+    """
+    if args.translation_api in ("pygt", "man"):
+        return
+    if not args.translation_config:
+        raise exceptions.AutosubException(
+            _("Error: You must provide \"-tconf\", \"--translation-config\" option "
+              "when using the translator backend \"{backend}\".").format(
+                  backend=args.translation_api))
+    if not isinstance(args.translation_config, dict):
+        args.translation_config = validate_json_config(args.translation_config)
+
+
 def list_args(args):
     """
     Check if there's any list args.
@@ -64,9 +137,7 @@ def list_args(args):
     if args.detect_sub_language:
         print(_("Use py-googletrans to detect a sub file's first line language."))
         pysubs2_obj = pysubs2.SSAFile.load(args.detect_sub_language)
-        translator = googletrans.Translator(
-            user_agent=args.user_agent,
-            service_urls=args.service_urls)
+        translator = get_googletrans_translator(args)
         result_obj = translator.detect(pysubs2_obj.events[0].text)
         print("{column_1}{column_2}".format(
             column_1=lang_code_utils.wjust(_("Lang code"), 18),
@@ -162,6 +233,13 @@ def validate_io(  # pylint: disable=too-many-branches, too-many-statements
             _("Error: arg of \"-er\"/\"--ext-regions\": \"{path}\" isn't valid. "
               "You need to give a valid path.").format(path=args.ext_regions))
 
+    # the first format is the main one and the others are output as well
+    if isinstance(args.format, list):
+        args.extra_formats = args.format[1:]
+        args.format = args.format[0]
+    elif not hasattr(args, "extra_formats"):
+        args.extra_formats = []
+
     input_name = os.path.splitext(args.input)
     input_ext = input_name[-1]
     input_fmt = input_ext.strip('.')
@@ -209,15 +287,19 @@ def validate_io(  # pylint: disable=too-many-branches, too-many-statements
         args.output = output_name[0]
         # output = output name without extension
 
-    if args.format not in constants.OUTPUT_FORMAT:
-        raise exceptions.AutosubException(
-            _("Error: Output subtitles format \"{fmt}\" not supported. "
-              "Run with \"-lf\"/\"--list-formats\" to see all supported formats.\n"
-              "Or use ffmpeg or SubtitleEdit to convert the formats.").format(fmt=args.format))
+    for fmt in [args.format] + args.extra_formats:
+        if fmt not in constants.OUTPUT_FORMAT:
+            raise exceptions.AutosubException(
+                _("Error: Output subtitles format \"{fmt}\" not supported. "
+                  "Run with \"-lf\"/\"--list-formats\" to see all supported formats.\n"
+                  "Or use ffmpeg or SubtitleEdit to convert the formats.").format(fmt=fmt))
+    args.extra_formats = [fmt for i, fmt in enumerate(args.extra_formats)
+                          if fmt != args.format and fmt not in args.extra_formats[:i]]
 
     args.output_files = set(args.output_files)
     if "all" in args.output_files:
-        args.output_files = constants.DEFAULT_MODE_SET
+        # copy it since the modes are removed from it once written
+        args.output_files = set(constants.DEFAULT_MODE_SET)
     else:
         if not is_ass_input:
             args.output_files = args.output_files & \
@@ -374,6 +456,27 @@ def validate_speech_config(args):  # pylint: disable=too-many-branches, too-many
     args.speech_config = config_dict
 
 
+def get_hedge_ratio(args):
+    """
+    Return the hedging ratio of the speech api from the args.
+    """
+    if args.hedge is None:
+        return 0.0
+    ratio = constants.DEFAULT_HEDGE_RATIO
+    for item in args.hedge:
+        provider, _sep, value = item.rpartition("=")
+        if provider and provider != args.speech_api:
+            continue
+        try:
+            ratio = float(value)
+        except ValueError:
+            ratio = -1.0
+        if not 0 <= ratio <= 1:
+            raise exceptions.AutosubException(
+                _("Error: The args of \"-hdg\"/\"--hedge\" are wrong."))
+    return ratio
+
+
 def validate_aovp_args(args):  # pylint: disable=too-many-branches, too-many-return-statements, too-many-statements
     """
     Check that the commandline arguments passed to autosub are valid
@@ -383,6 +486,17 @@ def validate_aovp_args(args):  # pylint: disable=too-many-branches, too-many-ret
         raise exceptions.AutosubException(
             _("Error: \"-slp\"/\"--sleep-seconds\" arg is illegal."))
 
+    if args.trans_concurrency < 1:
+        raise exceptions.AutosubException(
+            _("Error: \"-tc\"/\"--trans-concurrency\" arg is illegal."))
+
+    if args.trans_qps is not None and args.trans_qps < 0:
+        raise exceptions.AutosubException(
+            _("Error: \"-tqps\"/\"--trans-qps\" arg is illegal."))
+
+    get_hedge_ratio(args)
+    validate_trans_config(args)
+
     if args.speech_language:  # pylint: disable=too-many-nested-blocks
         if args.speech_api == "gsv2" or args.speech_api == "gcsv1":
             args.speech_language = args.speech_language.lower()
@@ -450,7 +564,8 @@ def validate_aovp_args(args):  # pylint: disable=too-many-branches, too-many-ret
             args.src_language = args.src_language.lower()
             args.dst_language = args.dst_language.lower()
 
-            if args.src_language != 'auto' and \
+            if args.translation_api == "pygt" and \
+                    args.src_language != 'auto' and \
                     args.src_language not in googletrans.constants.LANGUAGES:
                 if args.best_match and 'src' in args.best_match:
                     print(_("Let translation source lang code "
@@ -473,7 +588,8 @@ def validate_aovp_args(args):  # pylint: disable=too-many-branches, too-many-ret
                           "Or use \"-bm\"/\"--best-match\" to get a best match.").format(
                               src=args.src_language))
 
-            if args.dst_language not in googletrans.constants.LANGUAGES:
+            if args.translation_api == "pygt" and \
+                    args.dst_language not in googletrans.constants.LANGUAGES:
                 if args.best_match and 'd' in args.best_match:
                     print(_("Let translation destination lang code "
                             "to match py-googletrans lang codes."))
@@ -501,6 +617,9 @@ def validate_aovp_args(args):  # pylint: disable=too-many-branches, too-many-ret
                     "Only performing speech recognition."))
             args.dst_language = None
             args.src_language = None
+            args.output_files = args.output_files - constants.DEFAULT_SUB_MODE_SET
+            if not args.output_files:
+                args.output_files = {"src"}
 
     else:
         if not args.audio_process or 's' not in args.audio_process:
@@ -533,7 +652,23 @@ def validate_sp_args(args):  # pylint: disable=too-many-branches,too-many-return
     Check that the commandline arguments passed to autosub are valid
     for subtitles processing.
     """
+    if args.trans_concurrency < 1:
+        raise exceptions.AutosubException(
+            _("Error: \"-tc\"/\"--trans-concurrency\" arg is illegal."))
+
+    if args.trans_qps is not None and args.trans_qps < 0:
+        raise exceptions.AutosubException(
+            _("Error: \"-tqps\"/\"--trans-qps\" arg is illegal."))
+
+    if args.translation_api == "man":
+        return 1
+
     if args.translation_api != "pygt":
+        validate_trans_config(args)
+        if not args.dst_language:
+            return 0
+        args.dst_language = args.dst_language.lower()
+        args.src_language = args.src_language.lower() if args.src_language else "auto"
         return 1
 
     if not args.dst_language or not args.src_language:
@@ -643,6 +778,20 @@ def fix_args(args):
                                                   dmxcs=constants.DEFAULT_CONTINUOUS_SILENCE))
             args.max_continuous_silence = constants.DEFAULT_CONTINUOUS_SILENCE
 
+    if args.pack_size > constants.MAX_REGION_SIZE_LIMIT:
+        print(
+            _("Your pack size {pks} is larger than {mrs}.\n"
+              "Now reset to {mrs}.").format(pks=args.pack_size,
+                                            mrs=constants.MAX_REGION_SIZE_LIMIT))
+        args.pack_size = constants.MAX_REGION_SIZE_LIMIT
+
+    if args.pack_gap < 0:
+        print(
+            _("Your pack gap {pkg} is smaller than 0.\n"
+              "Now reset to {dpkg}.").format(pkg=args.pack_gap,
+                                             dpkg=constants.DEFAULT_PACK_GAP))
+        args.pack_gap = constants.DEFAULT_PACK_GAP
+
 
 def get_timed_text(
         is_empty_dropped,
@@ -687,37 +836,129 @@ def regions_to_events(
         i = i + 1
 
 
-def sub_to_file(
+def get_formats(args):
+    """
+    Return the output formats, the main one first.
+    """
+    return [args.format] + getattr(args, "extra_formats", [])
+
+
+def is_styled_format(fmt):
+    """
+    Return whether an output format keeps the ass styles.
+    """
+    return fmt in ('ass', 'ssa', 'ass.json')
+
+
+def get_extension(fmt):
+    """
+    Return the file extension of an output format.
+    """
+    if fmt == 'mpl2':
+        return 'mpl2.txt'
+    return fmt
+
+
+def sub_to_file(  # pylint: disable=too-many-arguments
         name_tail,
         args,
         ssafile,
         input_m=input,
-        fps=30.0):
+        fps=30.0,
+        sub_strings=None):
     """
-    Write subtitles to a file and return its path.
+    Write subtitles to a file in each output format and return their paths.
+    If sub_strings are given, they are the rendered ones of the formats
+    and ssafile isn't used.
     """
-    sub_string = core.ssafile_to_sub_str(
-        ssafile=ssafile,
-        fps=fps,
-        subtitles_file_format=args.format)
+    formats = get_formats(args)
+    if sub_strings is None:
+        sub_strings = [core.ssafile_to_sub_str(ssafile=ssafile,
+                                               fps=fps,
+                                               subtitles_file_format=fmt)
+                       for fmt in formats]
+
+    subtitles_file_paths = []
+    for fmt, sub_string in zip(formats, sub_strings):
+        sub_name = "{base}.{nt}.{extension}".format(
+            base=args.output,
+            nt=name_tail,
+            extension=get_extension(fmt))
 
-    if args.format == 'mpl2':
-        extension = 'mpl2.txt'
-    else:
-        extension = args.format
+        subtitles_file_paths.append(sub_utils.str_to_file(
+            str_=sub_string,
+            output=sub_name,
+            input_m=input_m))
+        # subtitles string to file
 
-    sub_name = "{base}.{nt}.{extension}".format(
-        base=args.output,
-        nt=name_tail,
-        extension=extension)
+    return subtitles_file_paths
 
-    subtitles_file_path = sub_utils.str_to_file(
-        str_=sub_string,
-        output=sub_name,
-        input_m=input_m)
-    # subtitles string to file
 
-    return subtitles_file_path
+def get_mode_name_tail(args, mode):
+    """
+    Return the file name tail and the message of an output mode.
+    """
+    if mode == "src":
+        return args.speech_language, \
+            _("Speech language subtitles file created at \"{}\".")
+    if mode == "dst":
+        return args.dst_language, \
+            _("Destination language subtitles file created at \"{}\".")
+    name_tail = "{src}&{dst}".format(src=args.src_language, dst=args.dst_language)
+    if mode == "bilingual":
+        return name_tail, _("Bilingual subtitles file created at \"{}\".")
+    if mode == "dst-lf-src":
+        return name_tail + ".0", _("\"dst-lf-src\" subtitles file created at \"{}\".")
+    return name_tail + ".1", _("\"src-lf-dst\" subtitles file created at \"{}\".")
+
+
+def write_outputs(  # pylint: disable=too-many-arguments, too-many-locals
+        args,
+        model,
+        modes,
+        style_names=None,
+        input_m=input,
+        fps=30.0,
+        pool=None,
+        styled_model=None,
+        styled_style_names=None):
+    """
+    Give the event model and the output modes in order,
+    render the subtitles of the requested ones in parallel and write them in order.
+    If styled_model is given, the formats keeping the ass styles
+    are rendered from it by styled_style_names instead.
+    The written modes are removed from args.output_files.
+    """
+    modes = [mode for mode in modes if mode in args.output_files]
+    args.output_files = args.output_files - set(modes)
+    formats = get_formats(args)
+    groups = [(model, style_names,
+               [fmt for fmt in formats if not styled_model or not is_styled_format(fmt)]),
+              (styled_model, styled_style_names,
+               [fmt for fmt in formats if styled_model and is_styled_format(fmt)])]
+    sub_strings_dicts = [{} for _mode in modes]
+    for group_model, group_style_names, group_formats in groups:
+        if not group_formats:
+            continue
+        sub_strings_list = core.bulk_render_outputs(
+            model=group_model,
+            modes=modes,
+            style_names=group_style_names,
+            fps=fps,
+            subtitles_file_formats=group_formats,
+            pool=pool)
+        for sub_strings_dict, sub_strings in zip(sub_strings_dicts, sub_strings_list):
+            sub_strings_dict.update(zip(group_formats, sub_strings))
+
+    for mode, sub_strings_dict in zip(modes, sub_strings_dicts):
+        name_tail, message = get_mode_name_tail(args, mode)
+        for subtitles_file_path in sub_to_file(
+                name_tail=name_tail,
+                args=args,
+                ssafile=None,
+                input_m=input_m,
+                sub_strings=[sub_strings_dict[fmt] for fmt in formats]):
+            print(message.format(subtitles_file_path))
 
 
 def sub_conversion(  # pylint: disable=too-many-branches, too-many-statements, too-many-locals
@@ -752,16 +993,15 @@ def sub_conversion(  # pylint: disable=too-many-branches, too-many-statements, t
         new_sub = sub_utils.merge_bilingual_assfile(
             subtitles=src_sub
         )
-        subtitles_file_path = sub_to_file(
-            name_tail="combination",
-            args=args,
-            ssafile=new_sub,
-            input_m=input_m,
-            fps=fps
-        )
-        # subtitles string to file
-        print(_("\"dst-lf-src\" subtitles file "
-                "created at \"{}\".").format(subtitles_file_path))
+        for subtitles_file_path in sub_to_file(
+                name_tail="combination",
+                args=args,
+                ssafile=new_sub,
+                input_m=input_m,
+                fps=fps):
+            # subtitles string to file
+            print(_("\"dst-lf-src\" subtitles file "
+                    "created at \"{}\".").format(subtitles_file_path))
 
         if not args.output_files:
             raise exceptions.AutosubException(_("\nAll works done."))
@@ -775,16 +1015,15 @@ def sub_conversion(  # pylint: disable=too-many-branches, too-many-statements, t
             subtitles=src_sub,
             order=0
         )
-        subtitles_file_path = sub_to_file(
-            name_tail="combination.2",
-            args=args,
-            ssafile=new_sub,
-            input_m=input_m,
-            fps=fps
-        )
-        # subtitles string to file
-        print(_("\"src-lf-dst\" subtitles file "
-                "created at \"{}\".").format(subtitles_file_path))
+        for subtitles_file_path in sub_to_file(
+                name_tail="combination.2",
+                args=args,
+                ssafile=new_sub,
+                input_m=input_m,
+                fps=fps):
+            # subtitles string to file
+            print(_("\"src-lf-dst\" subtitles file "
+                    "created at \"{}\".").format(subtitles_file_path))
 
         if not args.output_files:
             raise exceptions.AutosubException(_("\nAll works done."))
@@ -798,16 +1037,15 @@ def sub_conversion(  # pylint: disable=too-many-branches, too-many-statements, t
             subtitles=src_sub,
             style_name=args.style_name
         )
-        subtitles_file_path = sub_to_file(
-            name_tail="split",
-            args=args,
-            ssafile=new_sub,
-            input_m=input_m,
-            fps=fps
-        )
-        # subtitles string to file
-        print(_("\"bilingual\" subtitles file "
-                "created at \"{}\".").format(subtitles_file_path))
+        for subtitles_file_path in sub_to_file(
+                name_tail="split",
+                args=args,
+                ssafile=new_sub,
+                input_m=input_m,
+                fps=fps):
+            # subtitles string to file
+            print(_("\"bilingual\" subtitles file "
+                    "created at \"{}\".").format(subtitles_file_path))
 
         if not args.output_files:
             raise exceptions.AutosubException(_("\nAll works done."))
@@ -822,16 +1060,15 @@ def sub_conversion(  # pylint: disable=too-many-branches, too-many-statements, t
             order=0,
             style_name=args.style_name
         )
-        subtitles_file_path = sub_to_file(
-            name_tail="split.2",
-            args=args,
-            ssafile=new_sub,
-            input_m=input_m,
-            fps=fps
-        )
-        # subtitles string to file
-        print(_("\"bilingual-2\" subtitles file "
-                "created at \"{}\".").format(subtitles_file_path))
+        for subtitles_file_path in sub_to_file(
+                name_tail="split.2",
+                args=args,
+                ssafile=new_sub,
+                input_m=input_m,
+                fps=fps):
+            # subtitles string to file
+            print(_("\"bilingual-2\" subtitles file "
+                    "created at \"{}\".").format(subtitles_file_path))
 
         if not args.output_files:
             raise exceptions.AutosubException(_("\nAll works done."))
@@ -1019,16 +1256,15 @@ def sub_conversion(  # pylint: disable=too-many-branches, too-many-statements, t
         except KeyError:
             pass
 
-        subtitles_file_path = sub_to_file(
-            name_tail="join",
-            args=args,
-            ssafile=new_sub,
-            input_m=input_m,
-            fps=fps
-        )
-        # subtitles string to file
-        print(_("\"join-events\" subtitles file "
-                "created at \"{}\".").format(subtitles_file_path))
+        for subtitles_file_path in sub_to_file(
+                name_tail="join",
+                args=args,
+                ssafile=new_sub,
+                input_m=input_m,
+                fps=fps):
+            # subtitles string to file
+            print(_("\"join-events\" subtitles file "
+                    "created at \"{}\".").format(subtitles_file_path))
 
         if not args.output_files:
             raise exceptions.AutosubException(_("\nAll works done."))
@@ -1046,44 +1282,23 @@ def sub_trans(  # pylint: disable=too-many-branches, too-many-statements, too-ma
     Give args and translate a subtitles file.
     """
     src_sub = pysubs2.SSAFile.load(args.input)
-    text_list = []
+    text_list = [event.text for event in src_sub.events]
 
-    if args.styles and \
-            (args.format == 'ass' or
-             args.format == 'ssa' or
-             args.format == 'ass.json'):
-        src_sub.styles = \
+    # the formats keeping the ass styles use the given styles, the others the input ones
+    if args.styles and styles_list and any(is_styled_format(fmt) for fmt in get_formats(args)):
+        styled_sub = pysubs2.SSAFile()
+        styled_sub.info = src_sub.info
+        styled_sub.styles = \
             {styles_list[i]: styles_list[i + 1] for i in range(0, len(styles_list), 2)}
         for event in src_sub.events:
-            event.style = styles_list[0]
-            text_list.append(event.text)
+            styled_event = event.copy()
+            styled_event.style = styles_list[0]
+            styled_sub.events.append(styled_event)
     else:
-        styles_list = [src_sub.events[0].style, ]
-        for event in src_sub.events:
-            text_list.append(event.text)
+        styled_sub = None
 
     # text translation
-    if args.translation_api == "man":
-        trans_doc_name = "{base}.{nt}.{extension}".format(
-            base=args.output,
-            nt='trans',
-            extension=args.translation_format)
-        if not args.src_language or args.src_language == "auto":
-            args.src_language = "src"
-        if not args.dst_language:
-            args.dst_language = "dst"
-        translator = core.ManualTranslator(
-            trans_doc_name=trans_doc_name,
-            input_m=input_m
-        )
-        if args.sleep_seconds == constants.DEFAULT_SLEEP_SECONDS:
-            args.sleep_seconds = 0.1
-        if args.max_trans_size == constants.DEFAULT_SIZE_PER_TRANS:
-            args.max_trans_size = 9950
-    else:
-        translator = googletrans.Translator(
-            user_agent=args.user_agent,
-            service_urls=args.service_urls)
+    translator = get_translator(args, input_m=input_m)
 
     translated_text, args.src_language = core.list_to_googletrans(
         text_list,
@@ -1093,168 +1308,35 @@ def sub_trans(  # pylint: disable=too-many-branches, too-many-statements, too-ma
         size_per_trans=args.max_trans_size,
         sleep_seconds=args.sleep_seconds,
         drop_override_codes=args.drop_override_codes,
-        delete_chars=args.trans_delete_chars)
+        delete_chars=args.trans_delete_chars,
+        concurrency=args.trans_concurrency,
+        qps=args.trans_qps)
 
     if not translated_text or len(translated_text) != len(text_list):
         raise exceptions.AutosubException(
             _("Error: Translation failed."))
 
-    try:
-        args.output_files.remove("bilingual")
-        bilingual_sub = pysubs2.SSAFile()
-        bilingual_sub.styles = src_sub.styles
-        bilingual_sub.info = src_sub.info
-        bilingual_sub.events = src_sub.events[:]
-        if args.styles and \
-                len(styles_list) == 2 and \
-                (args.format == 'ass' or
-                 args.format == 'ssa' or
-                 args.format == 'ass.json'):
-            sub_utils.pysubs2_ssa_event_add(
-                src_ssafile=bilingual_sub,
-                dst_ssafile=bilingual_sub,
-                text_list=translated_text,
-                style_name=styles_list[1])
-        else:
-            sub_utils.pysubs2_ssa_event_add(
-                src_ssafile=bilingual_sub,
-                dst_ssafile=bilingual_sub,
-                text_list=translated_text,
-                style_name="")
-
-        subtitles_file_path = sub_to_file(
-            name_tail=args.src_language + '&' + args.dst_language,
-            args=args,
-            ssafile=bilingual_sub,
-            input_m=input_m,
-            fps=fps
-        )
-        # subtitles string to file
-        print(_("Bilingual subtitles file "
-                "created at \"{}\".").format(subtitles_file_path))
-
-        if not args.output_files:
-            raise exceptions.AutosubException(_("\nAll works done."))
-
-    except KeyError:
-        pass
-
-    try:
-        args.output_files.remove("dst-lf-src")
-        bilingual_sub = pysubs2.SSAFile()
-        bilingual_sub.styles = src_sub.styles
-        bilingual_sub.info = src_sub.info
-        if args.styles and \
-                len(styles_list) == 2 and \
-                (args.format == 'ass' or
-                 args.format == 'ssa' or
-                 args.format == 'ass.json'):
-            sub_utils.pysubs2_ssa_event_add(
-                src_ssafile=src_sub,
-                dst_ssafile=bilingual_sub,
-                text_list=translated_text,
-                style_name=styles_list[1],
-                same_event_type=1)
-        else:
-            sub_utils.pysubs2_ssa_event_add(
-                src_ssafile=src_sub,
-                dst_ssafile=bilingual_sub,
-                text_list=translated_text,
-                style_name="",
-                same_event_type=1)
-
-        subtitles_file_path = sub_to_file(
-            name_tail="{src}&{dst}.0".format(
-                src=args.src_language,
-                dst=args.dst_language),
-            args=args,
-            ssafile=bilingual_sub,
-            input_m=input_m,
-            fps=fps
-        )
-        # subtitles string to file
-        print(_("\"dst-lf-src\" subtitles file "
-                "created at \"{}\".").format(subtitles_file_path))
-
-        if not args.output_files:
-            raise exceptions.AutosubException(_("\nAll works done."))
-
-    except KeyError:
-        pass
-
-    try:
-        args.output_files.remove("src-lf-dst")
-        bilingual_sub = pysubs2.SSAFile()
-        bilingual_sub.styles = src_sub.styles
-        bilingual_sub.info = src_sub.info
-        if args.styles and \
-                len(styles_list) == 2 and \
-                (args.format == 'ass' or
-                 args.format == 'ssa' or
-                 args.format == 'ass.json'):
-            sub_utils.pysubs2_ssa_event_add(
-                src_ssafile=src_sub,
-                dst_ssafile=bilingual_sub,
-                text_list=translated_text,
-                style_name=styles_list[1],
-                same_event_type=2)
-        else:
-            sub_utils.pysubs2_ssa_event_add(
-                src_ssafile=src_sub,
-                dst_ssafile=bilingual_sub,
-                text_list=translated_text,
-                style_name="",
-                same_event_type=2)
-
-        subtitles_file_path = sub_to_file(
-            name_tail="{src}&{dst}.1".format(
-                src=args.src_language,
-                dst=args.dst_language),
-            args=args,
-            ssafile=bilingual_sub,
-            input_m=input_m,
-            fps=fps
-        )
-        # subtitles string to file
-        print(_("\"src-lf-dst\" subtitles file "
-                "created at \"{}\".").format(subtitles_file_path))
-
-        if not args.output_files:
-            raise exceptions.AutosubException(_("\nAll works done."))
-
-    except KeyError:
-        pass
-
-    try:
-        args.output_files.remove("dst")
-        dst_sub = pysubs2.SSAFile()
-        dst_sub.styles = src_sub.styles
-        dst_sub.info = src_sub.info
-        if len(styles_list) == 2:
-            sub_utils.pysubs2_ssa_event_add(
-                src_ssafile=src_sub,
-                dst_ssafile=dst_sub,
-                text_list=translated_text,
-                style_name=styles_list[1])
-        else:
-            sub_utils.pysubs2_ssa_event_add(
-                src_ssafile=src_sub,
-                dst_ssafile=dst_sub,
-                text_list=translated_text,
-                style_name="")
-        subtitles_file_path = sub_to_file(
-            name_tail=args.dst_language,
-            args=args,
-            ssafile=dst_sub,
-            input_m=input_m,
-            fps=fps
-        )
-        # subtitles string to file
-        print(_("Destination language subtitles "
-                "file created at \"{}\".").format(subtitles_file_path))
-
-    except KeyError:
-        pass
+    if styled_sub:
+        style_name = styles_list[2] if len(styles_list) >= 4 else styles_list[0]
+        styled_model = sub_utils.EventModel(styled_sub, dst_text_list=translated_text)
+    else:
+        style_name = ""
+        styled_model = None
+    write_outputs(
+        args=args,
+        model=sub_utils.EventModel(src_sub, dst_text_list=translated_text),
+        modes=["bilingual", "dst-lf-src", "src-lf-dst", "dst"],
+        style_names={"bilingual": "",
+                     "dst-lf-src": "",
+                     "src-lf-dst": "",
+                     "dst": ""},
+        input_m=input_m,
+        fps=fps,
+        styled_model=styled_model,
+        styled_style_names={"bilingual": style_name,
+                            "dst-lf-src": style_name,
+                            "src-lf-dst": style_name,
+                            "dst": style_name})
 
 
 def get_fps(
@@ -1263,14 +1345,17 @@ def get_fps(
     """
     Give args and get fps.
     """
-    if args.format == 'sub':
+    if 'sub' in get_formats(args):
         if not args.sub_fps:
             fps = ffmpeg_utils.ffprobe_get_fps(
                 args.input,
                 input_m=input_m)
             if fps == 0.0:
                 if not args.yes:
-                    args.format = 'srt'
+                    if args.format == 'sub':
+                        args.format = 'srt'
+                    args.extra_formats = [fmt for fmt in get_formats(args)[1:]
+                                          if fmt not in ('sub', args.format)]
                 else:
                     raise pysubs2.exceptions.Pysubs2Error
         else:
@@ -1281,6 +1366,146 @@ def get_fps(
     return fps
 
 
+def get_gsv2_api_url_headers(args):
+    """
+    Give args and return Google Speech V2 API URL and headers.
+    """
+    if args.http_speech_api:
+        gsv2_api_url = "http://" + \
+                       constants.GOOGLE_SPEECH_V2_API_URL
+    else:
+        gsv2_api_url = "https://" + \
+                       constants.GOOGLE_SPEECH_V2_API_URL
+
+    if args.speech_key:
+        gsv2_api_url = gsv2_api_url.format(
+            lang=args.speech_language,
+            key=args.speech_key)
+    else:
+        gsv2_api_url = gsv2_api_url.format(
+            lang=args.speech_language,
+            key=constants.GOOGLE_SPEECH_V2_API_KEY)
+
+    if args.api_suffix == ".flac":
+        headers = \
+            {"Content-Type": "audio/x-flac; rate={rate}".format(rate=args.api_sample_rate)}
+    else:
+        headers = \
+            {"Content-Type": "audio/ogg; rate={rate}".format(rate=args.api_sample_rate)}
+
+    return gsv2_api_url, headers
+
+
+def get_speech_recognizer(  # pylint: disable=too-many-branches
+        args,
+        is_keep=False,
+        is_full_result=False):
+    """
+    Give args and return a picklable speech-to-text recognizer
+    which accepts an audio fragment file.
+    """
+    if args.speech_api == "gsv2":
+        gsv2_api_url, headers = get_gsv2_api_url_headers(args)
+        return api_google.GoogleSpeechV2(
+            api_url=gsv2_api_url,
+            headers=headers,
+            min_confidence=args.min_confidence,
+            is_keep=is_keep,
+            is_full_result=is_full_result)
+
+    if args.speech_api == "gcsv1":
+        if args.speech_config:
+            config = args.speech_config
+        else:
+            config = {}
+        if args.speech_key:
+            if "languageCode" in config:
+                config["languageCode"] = args.speech_language
+            else:
+                config["language_code"] = args.speech_language
+            if "encoding" not in config:
+                config["encoding"] = api_google.google_ext_to_enc(args.api_suffix)
+            if "sampleRateHertz" not in config and "sample_rate_hertz" not in config:
+                config["sampleRateHertz"] = args.api_sample_rate
+            return api_google.GCSV1P1Beta1URL(
+                config=config,
+                api_url=constants.GOOGLE_CLOUD_SPEECH_API_URL.format(
+                    api_key=args.speech_key),
+                headers={"Content-Type": "application/json"},
+                min_confidence=args.min_confidence,
+                is_keep=is_keep,
+                is_full_result=is_full_result)
+        if not constants.IS_GOOGLECLOUDCLIENT:
+            raise exceptions.SpeechToTextException(
+                _("Error: Current build version doesn't support "
+                  "Google Cloud service account credentials."
+                  "\nPlease use other build version "
+                  "or use option \"-skey\"/\"--speech-key\" instead."))
+        if args.service_account and os.path.isfile(args.service_account):
+            os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = args.service_account
+        elif 'GOOGLE_APPLICATION_CREDENTIALS' not in os.environ:
+            raise exceptions.SpeechToTextException(
+                _("No available GOOGLE_APPLICATION_CREDENTIALS. "
+                  "Use \"-sa\"/\"--service-account\" to set one."))
+        config["encoding"] = api_google.google_ext_to_enc(
+            extension=args.api_suffix,
+            is_string=False)
+        config["language_code"] = args.speech_language
+        if "sample_rate_hertz" not in config:
+            config["sample_rate_hertz"] = args.api_sample_rate
+        return functools.partial(
+            api_google.gcsv1p1beta1_service_client,
+            is_keep=is_keep,
+            config=config,
+            min_confidence=args.min_confidence,
+            is_full_result=is_full_result)
+
+    if args.speech_api == "xfyun":
+        config = args.speech_config
+        return api_xfyun.XfyunWebSocketAPI(
+            app_id=config["app_id"],
+            api_key=config["api_key"],
+            api_secret=config["api_secret"],
+            api_address=config.get("api_address", constants.XFYUN_SPEECH_WEBAPI_URL),
+            business_args=config["business"],
+            is_full_result=is_full_result,
+            delete_chars=config.get("delete_chars"))
+
+    if args.speech_api == "baidu":
+        config = args.speech_config
+        if "token" not in config["config"]:
+            config["config"]["token"] = \
+                api_baidu.get_baidu_token(api_secret=config["api_secret"],
+                                          api_key=config["api_key"])
+        if config["config"]["dev_pid"] == 80001:
+            api_url = constants.BAIDU_PRO_ASR_URL
+        else:
+            api_url = constants.BAIDU_ASR_URL
+        return api_baidu.BaiduASRAPI(
+            config=config["config"],
+            api_url=api_url,
+            is_keep=is_keep,
+            is_full_result=is_full_result,
+            delete_chars=config.get("delete_chars"))
+
+    return None
+
+
+def is_native_split(args):
+    """
+    Check if the audio fragments can be split and encoded in process
+    instead of launching ffmpeg for each region.
+    """
+    if args.disable_native_split \
+            or not audio_utils.is_native_suffix(args.api_suffix, args.api_sample_rate):
+        return False
+    default_cmd = constants.DEFAULT_AUDIO_SPLT_CMD.replace(
+        "[channel]", str(args.api_audio_channel)).replace(
+            "[sample_rate]", str(args.api_sample_rate))
+    return args.audio_split_cmd in (constants.DEFAULT_AUDIO_SPLT_CMD, default_cmd)
+
+
+@metrics_utils.timed_stage("convert")
 def convert_wav(
         input_,
         conversion_cmd,
@@ -1320,6 +1545,10 @@ def convert_wav(
         raise exceptions.AutosubException(
             _("Error: Convert source file to \"{name}\" failed.").format(
                 name=audio_wav))
+    metrics_utils.add_bytes(
+        "convert",
+        bytes_in=os.path.getsize(input_) if os.path.isfile(input_) else 0,
+        bytes_out=os.path.getsize(audio_wav))
     return audio_wav
 
 
@@ -1327,7 +1556,9 @@ def audio_or_video_prcs(  # pylint: disable=too-many-branches, too-many-statemen
         args,
         input_m=input,
         fps=30.0,
-        styles_list=None):
+        styles_list=None,
+        audio_pool=None,
+        speech_pool=None):
     """
     Give args and process an input audio or video file.
     """
@@ -1373,30 +1604,28 @@ def audio_or_video_prcs(  # pylint: disable=too-many-branches, too-many-statemen
             _("Error: Can't get speech regions."))
     try:
         args.output_files.remove("regions")
-        if args.styles and \
-                (args.format == 'ass' or
-                 args.format == 'ssa' or
-                 args.format == 'ass.json'):
-            times_string = core.list_to_ass_str(
-                text_list=regions,
-                styles_list=styles_list,
-                subtitles_file_format=args.format)
-        else:
-            times_string = core.list_to_sub_str(
-                timed_text=regions,
-                fps=fps,
-                subtitles_file_format=args.format)
-        # times to subtitles string
-        times_name = "{base}.{nt}.{extension}".format(base=args.output,
-                                                      nt="times",
-                                                      extension=args.format)
-        subtitles_file_path = sub_utils.str_to_file(
-            str_=times_string,
-            output=times_name,
-            input_m=input_m)
-        # subtitles string to file
+        for fmt in get_formats(args):
+            if args.styles and is_styled_format(fmt):
+                times_string = core.list_to_ass_str(
+                    text_list=regions,
+                    styles_list=styles_list,
+                    subtitles_file_format=fmt)
+            else:
+                times_string = core.list_to_sub_str(
+                    timed_text=regions,
+                    fps=fps,
+                    subtitles_file_format=fmt)
+            # times to subtitles string
+            times_name = "{base}.{nt}.{extension}".format(base=args.output,
+                                                          nt="times",
+                                                          extension=fmt)
+            subtitles_file_path = sub_utils.str_to_file(
+                str_=times_string,
+                output=times_name,
+                input_m=input_m)
+            # subtitles string to file
 
-        print(_("Times file created at \"{}\".").format(subtitles_file_path))
+            print(_("Times file created at \"{}\".").format(subtitles_file_path))
 
         if not args.output_files:
             raise exceptions.AutosubException(_("\nAll works done."))
@@ -1404,21 +1633,38 @@ def audio_or_video_prcs(  # pylint: disable=too-many-branches, too-many-statemen
     except KeyError:
         pass
 
+    if args.pack_size > 0:
+        packed_regions, groups = timing_utils.pack_regions(
+            regions=regions,
+            max_size=int(args.pack_size * 1000),
+            max_gap=int(args.pack_gap * 1000))
+        print(_("Pack {count} speech regions into {packed_count} requests.").format(
+            count=len(regions), packed_count=len(packed_regions)))
+    else:
+        packed_regions, groups = regions, None
+
+    if is_native_split(args):
+        split_cmd = None
+    else:
+        split_cmd = args.audio_split_cmd
     audio_fragments = core.bulk_audio_conversion(
         source_file=args.input,
         output=args.output,
-        regions=regions,
-        split_cmd=args.audio_split_cmd,
+        regions=packed_regions,
+        split_cmd=split_cmd,
         suffix=args.api_suffix,
         concurrency=args.audio_concurrency,
-        is_keep=args.keep)
+        is_keep=args.keep,
+        pool=audio_pool,
+        sample_rate=args.api_sample_rate,
+        channel=args.api_audio_channel)
     gc.collect(0)
 
     if not audio_fragments or \
-            len(audio_fragments) != len(regions):
-        if not args.keep:
+            len(audio_fragments) != len(packed_regions):
+        if not args.keep and audio_fragments:
             for audio_fragment in audio_fragments:
-                os.remove(audio_fragment)
+                audio_utils.remove_fragment(audio_fragment)
         raise exceptions.ConversionException(
             _("Error: Conversion failed."))
 
@@ -1428,34 +1674,24 @@ def audio_or_video_prcs(  # pylint: disable=too-many-branches, too-many-statemen
 
     try:
         args.output_files.remove("full-src")
-        result_list = []
+        is_full_src = True
     except KeyError:
+        is_full_src = False
+
+    is_word_time = bool(groups) or args.word_timing is not None
+    if is_full_src or \
+            (is_word_time and args.speech_api in ("gcsv1", "xfyun")):
+        # word timestamps are needed to split the packed transcripts
+        # or refine the timing
+        result_list = []
+    else:
         result_list = None
 
+    hedge_ratio = get_hedge_ratio(args)
+
     if args.speech_api == "gsv2":
         # Google speech-to-text v2
-        if args.http_speech_api:
-            gsv2_api_url = "http://" + \
-                           constants.GOOGLE_SPEECH_V2_API_URL
-        else:
-            gsv2_api_url = "https://" + \
-                           constants.GOOGLE_SPEECH_V2_API_URL
-
-        if args.speech_key:
-            gsv2_api_url = gsv2_api_url.format(
-                lang=args.speech_language,
-                key=args.speech_key)
-        else:
-            gsv2_api_url = gsv2_api_url.format(
-                lang=args.speech_language,
-                key=constants.GOOGLE_SPEECH_V2_API_KEY)
-
-        if args.api_suffix == ".flac":
-            headers = \
-                {"Content-Type": "audio/x-flac; rate={rate}".format(rate=args.api_sample_rate)}
-        else:
-            headers = \
-                {"Content-Type": "audio/ogg; rate={rate}".format(rate=args.api_sample_rate)}
+        gsv2_api_url, headers = get_gsv2_api_url_headers(args)
 
         text_list = core.gsv2_to_text(
             audio_fragments=audio_fragments,
@@ -1464,7 +1700,9 @@ def audio_or_video_prcs(  # pylint: disable=too-many-branches, too-many-statemen
             concurrency=args.speech_concurrency,
             min_confidence=args.min_confidence,
             is_keep=args.keep,
-            result_list=result_list)
+            result_list=result_list,
+            pool=speech_pool,
+            hedge_ratio=hedge_ratio)
         gc.collect(0)
 
     elif args.speech_api == "gcsv1":
@@ -1473,8 +1711,7 @@ def audio_or_video_prcs(  # pylint: disable=too-many-branches, too-many-statemen
             headers = \
                 {"Content-Type": "application/json"}
             gcsv1_api_url = \
-                "https://speech.googleapis.com/" \
-                "v1p1beta1/speech:recognize?key={api_key}".format(
+                constants.GOOGLE_CLOUD_SPEECH_API_URL.format(
                     api_key=args.speech_key)
             print(_("Use the API key "
                     "given in the option \"-skey\"/\"--speech-key\"."))
@@ -1488,7 +1725,11 @@ def audio_or_video_prcs(  # pylint: disable=too-many-branches, too-many-statemen
                 src_language=args.speech_language,
                 min_confidence=args.min_confidence,
                 is_keep=args.keep,
-                result_list=result_list)
+                result_list=result_list,
+                pool=speech_pool,
+                suffix=args.api_suffix,
+                is_word_time=is_word_time,
+                hedge_ratio=hedge_ratio)
         elif not constants.IS_GOOGLECLOUDCLIENT:
             raise exceptions.SpeechToTextException(
                 _("Error: Current build version doesn't support "
@@ -1507,7 +1748,10 @@ def audio_or_video_prcs(  # pylint: disable=too-many-branches, too-many-statemen
                 src_language=args.speech_language,
                 min_confidence=args.min_confidence,
                 is_keep=args.keep,
-                result_list=result_list)
+                result_list=result_list,
+                pool=speech_pool,
+                suffix=args.api_suffix,
+                is_word_time=is_word_time)
         else:
             if 'GOOGLE_APPLICATION_CREDENTIALS' in os.environ:
                 print(_("Use the GOOGLE_APPLICATION_CREDENTIALS "
@@ -1520,7 +1764,10 @@ def audio_or_video_prcs(  # pylint: disable=too-many-branches, too-many-statemen
                     src_language=args.speech_language,
                     min_confidence=args.min_confidence,
                     is_keep=args.keep,
-                    result_list=result_list)
+                    result_list=result_list,
+                    pool=speech_pool,
+                    suffix=args.api_suffix,
+                    is_word_time=is_word_time)
             else:
                 print(_("No available GOOGLE_APPLICATION_CREDENTIALS. "
                         "Use \"-sa\"/\"--service-account\" to set one."))
@@ -1533,7 +1780,8 @@ def audio_or_video_prcs(  # pylint: disable=too-many-branches, too-many-statemen
             config=args.speech_config,
             concurrency=args.speech_concurrency,
             is_keep=False,
-            result_list=result_list)
+            result_list=result_list,
+            pool=speech_pool)
     elif args.speech_api == "baidu":
         # Baidu ASR API
         text_list = core.baidu_to_text(
@@ -1541,16 +1789,18 @@ def audio_or_video_prcs(  # pylint: disable=too-many-branches, too-many-statemen
             config=args.speech_config,
             concurrency=args.speech_concurrency,
             is_keep=False,
-            result_list=result_list)
+            result_list=result_list,
+            pool=speech_pool,
+            hedge_ratio=hedge_ratio)
     else:
         text_list = None
 
     gc.collect(0)
 
-    if result_list and result_list is not None:
+    if is_full_src and result_list:
         timed_result = get_timed_text(
             is_empty_dropped=False,
-            regions=regions,
+            regions=packed_regions,
             text_list=result_list)
         result_string = sub_utils.list_to_json_str(timed_result)
         result_name = "{base}.result.json".format(base=args.output)
@@ -1564,53 +1814,65 @@ def audio_or_video_prcs(  # pylint: disable=too-many-branches, too-many-statemen
         if not args.output_files:
             raise exceptions.AutosubException(_("\nAll works done."))
 
+    if groups and text_list and len(text_list) == len(packed_regions):
+        text_list = timing_utils.unpack_text_list(
+            text_list=text_list,
+            regions=regions,
+            packed_regions=packed_regions,
+            groups=groups,
+            result_list=result_list)
+
     if not text_list or len(text_list) != len(regions):
         raise exceptions.SpeechToTextException(
             _("Error: Speech-to-text failed.\nAll works done."))
 
+    if args.word_timing is not None and result_list:
+        regions, text_list = timing_utils.refine_regions(
+            regions=regions,
+            text_list=text_list,
+            result_list=result_list,
+            packed_regions=packed_regions if groups else None,
+            groups=groups,
+            split_gap=int(args.word_timing * 1000),
+            min_size=int(args.min_region_size * 1000))
+        print(_("Refine the timing by the word timestamps. "
+                "Get {count} speech regions.").format(count=len(regions)))
+
+    # the events shared by all the subtitles outputs
     timed_text = get_timed_text(
-        is_empty_dropped=args.drop_empty_regions,
+        is_empty_dropped=False,
         regions=regions,
         text_list=text_list)
+    model = sub_utils.EventModel.from_timed_text(
+        timed_text=timed_text,
+        is_empty_dropped=args.drop_empty_regions)
+    # the formats keeping the ass styles use the given styles
+    if args.styles and styles_list and any(is_styled_format(fmt) for fmt in get_formats(args)):
+        styled_dst_style_name = styles_list[2] if len(styles_list) >= 4 else styles_list[0]
+        styled_model = sub_utils.EventModel.from_timed_text(
+            timed_text=timed_text,
+            style_name=styles_list[0],
+            styles={styles_list[i]: styles_list[i + 1]
+                    for i in range(0, len(styles_list), 2)},
+            is_empty_dropped=args.drop_empty_regions)
+    else:
+        styled_dst_style_name = 'Default'
+        styled_model = None
 
-    try:
-        args.output_files.remove("src")
-        if args.styles and \
-                (args.format == 'ass' or
-                 args.format == 'ssa' or
-                 args.format == 'ass.json'):
-            src_string = core.list_to_ass_str(
-                text_list=timed_text,
-                styles_list=styles_list[:2],
-                subtitles_file_format=args.format, )
-        else:
-            src_string = core.list_to_sub_str(
-                timed_text=timed_text,
-                fps=fps,
-                subtitles_file_format=args.format)
-
-        # formatting timed_text to subtitles string
-        src_name = "{base}.{nt}.{extension}".format(base=args.output,
-                                                    nt=args.speech_language,
-                                                    extension=args.format)
-        subtitles_file_path = sub_utils.str_to_file(
-            str_=src_string,
-            output=src_name,
-            input_m=input_m)
-        # subtitles string to file
-        print(_("Speech language subtitles "
-                "file created at \"{}\".").format(subtitles_file_path))
+    if "src" in args.output_files:
+        write_outputs(
+            args=args,
+            model=model,
+            modes=["src"],
+            input_m=input_m,
+            fps=fps,
+            styled_model=styled_model)
 
         if not args.output_files:
             raise exceptions.AutosubException(_("\nAll works done."))
 
-    except KeyError:
-        pass
-
     # text translation
-    translator = googletrans.Translator(
-        user_agent=args.user_agent,
-        service_urls=args.service_urls)
+    translator = get_translator(args, input_m=input_m)
 
     translated_text, args.src_language = core.list_to_googletrans(
         text_list,
@@ -1620,186 +1882,398 @@ def audio_or_video_prcs(  # pylint: disable=too-many-branches, too-many-statemen
         size_per_trans=args.max_trans_size,
         sleep_seconds=args.sleep_seconds,
         drop_override_codes=args.drop_override_codes,
-        delete_chars=args.trans_delete_chars)
+        delete_chars=args.trans_delete_chars,
+        concurrency=args.trans_concurrency,
+        qps=args.trans_qps)
 
     if not translated_text or len(translated_text) != len(regions):
         raise exceptions.AutosubException(
             _("Error: Translation failed."))
 
-    try:
-        args.output_files.remove("bilingual")
-        if args.styles and \
-                (args.format == 'ass' or
-                 args.format == 'ssa' or
-                 args.format == 'ass.json'):
-            bilingual_string = core.list_to_ass_str(
-                text_list=[timed_text, translated_text],
-                styles_list=styles_list,
-                subtitles_file_format=args.format, )
-        else:
-            bilingual_sub = pysubs2.SSAFile()
-            sub_utils.pysubs2_ssa_event_add(
-                src_ssafile=None,
-                dst_ssafile=bilingual_sub,
-                text_list=timed_text)
-            sub_utils.pysubs2_ssa_event_add(
-                src_ssafile=bilingual_sub,
-                dst_ssafile=bilingual_sub,
-                text_list=translated_text,
-                same_event_type=0)
-            bilingual_string = core.ssafile_to_sub_str(
-                ssafile=bilingual_sub,
-                fps=fps,
-                subtitles_file_format=args.format)
-        # formatting timed_text to subtitles string
-        bilingual_name = "{base}.{nt}.{extension}".format(
-            base=args.output,
-            nt=args.src_language + '&' + args.dst_language,
-            extension=args.format)
-        subtitles_file_path = sub_utils.str_to_file(
-            str_=bilingual_string,
-            output=bilingual_name,
-            input_m=input_m)
-        # subtitles string to file
-        print(_("Bilingual subtitles file "
-                "created at \"{}\".").format(subtitles_file_path))
+    model.dst_text_list = translated_text
+    if styled_model:
+        styled_model.dst_text_list = translated_text
+    write_outputs(
+        args=args,
+        model=model,
+        modes=["bilingual", "dst-lf-src", "src-lf-dst", "dst"],
+        style_names={"bilingual": 'Default',
+                     "dst-lf-src": 'Default',
+                     "src-lf-dst": 'Default',
+                     "dst": 'Default'},
+        input_m=input_m,
+        fps=fps,
+        pool=audio_pool,
+        styled_model=styled_model,
+        styled_style_names={"bilingual": styled_dst_style_name,
+                            "dst-lf-src": styled_dst_style_name,
+                            "src-lf-dst": styled_dst_style_name,
+                            "dst": styled_dst_style_name})
 
-        if not args.output_files:
-            raise exceptions.AutosubException(_("\nAll works done."))
 
-    except KeyError:
-        pass
+def input_prcs(  # pylint: disable=too-many-branches, too-many-statements
+        args,
+        input_m=input,
+        audio_pool=None,
+        speech_pool=None):
+    """
+    Give args and process a single input file.
+    """
+    styles_list = []
+    result = validate_io(args, styles_list)
 
-    try:
-        args.output_files.remove("dst-lf-src")
-        if args.styles and \
-                (args.format == 'ass' or
-                 args.format == 'ssa' or
-                 args.format == 'ass.json'):
-            bilingual_string = core.list_to_ass_str(
-                text_list=[timed_text, translated_text],
-                styles_list=styles_list,
-                subtitles_file_format=args.format,
-                same_event_type=1)
-        else:
-            bilingual_sub = pysubs2.SSAFile()
-            src_sub = pysubs2.SSAFile()
-            sub_utils.pysubs2_ssa_event_add(
-                src_ssafile=None,
-                dst_ssafile=src_sub,
-                text_list=timed_text)
-            sub_utils.pysubs2_ssa_event_add(
-                src_ssafile=src_sub,
-                dst_ssafile=bilingual_sub,
-                text_list=translated_text,
-                same_event_type=1)
-            bilingual_string = core.ssafile_to_sub_str(
-                ssafile=bilingual_sub,
-                fps=fps,
-                subtitles_file_format=args.format)
-        # formatting timed_text to subtitles string
-        bilingual_name = "{base}.{nt}.0.{extension}".format(
-            base=args.output,
-            nt=args.src_language + '&' + args.dst_language,
-            extension=args.format)
-        subtitles_file_path = sub_utils.str_to_file(
-            str_=bilingual_string,
-            output=bilingual_name,
-            input_m=input_m)
-        # subtitles string to file
-        print(_("\"dst-lf-src\" subtitles file "
-                "created at \"{}\".").format(subtitles_file_path))
+    if result:
+        if not constants.get_program_cmd("ffmpeg"):
+            raise exceptions.AutosubException(
+                _("Error: Dependency ffmpeg"
+                  " not found on this machine."))
+        if not constants.get_program_cmd("ffprobe"):
+            raise exceptions.AutosubException(
+                _("Error: Dependency ffprobe"
+                  " not found on this machine."))
 
-        if not args.output_files:
-            raise exceptions.AutosubException(_("\nAll works done."))
+        fix_args(args)
 
-    except KeyError:
-        pass
+        if args.audio_process:
+            args.audio_process = {k.lower() for k in args.audio_process}
+            args.audio_process = \
+                args.audio_process & constants.DEFAULT_AUDIO_PRCS_MODE_SET
+            if not args.audio_process:
+                raise exceptions.AutosubException(
+                    _("Error: The args of \"-ap\"/\"--audio-process\" are wrong."
+                      "\nNo works done."))
+            if 'o' in args.audio_process:
+                args.keep = True
+                prcs_file = ffmpeg_utils.audio_pre_prcs(
+                    filename=args.input,
+                    is_keep=args.keep,
+                    cmds=args.audio_process_cmd,
+                    output_name=args.output,
+                    input_m=input_m)
+                if not prcs_file:
+                    raise exceptions.AutosubException(
+                        _("No works done."))
+
+                args.input = prcs_file
+                raise exceptions.AutosubException(
+                    _("Audio pre-processing complete.\nAll works done."))
+
+            if 's' in args.audio_process:
+                args.keep = True
+
+            if 'y' in args.audio_process:
+                prcs_file = ffmpeg_utils.audio_pre_prcs(
+                    filename=args.input,
+                    is_keep=args.keep,
+                    cmds=args.audio_process_cmd,
+                    output_name=args.output,
+                    input_m=input_m)
+                args.audio_split_cmd = \
+                    args.audio_split_cmd.replace(
+                        "-vn -ac [channel] -ar [sample_rate] ", "")
+                if not prcs_file:
+                    print(_("Audio pre-processing failed. Try default method."))
+                else:
+                    args.input = prcs_file
+                    print(_("Audio pre-processing complete."))
 
-    try:
-        args.output_files.remove("src-lf-dst")
-        if args.styles and \
-                (args.format == 'ass' or
-                 args.format == 'ssa' or
-                 args.format == 'ass.json'):
-            bilingual_string = core.list_to_ass_str(
-                text_list=[timed_text, translated_text],
-                styles_list=styles_list,
-                subtitles_file_format=args.format,
-                same_event_type=2)
         else:
-            bilingual_sub = pysubs2.SSAFile()
-            src_sub = pysubs2.SSAFile()
-            sub_utils.pysubs2_ssa_event_add(
-                src_ssafile=None,
-                dst_ssafile=src_sub,
-                text_list=timed_text)
-            sub_utils.pysubs2_ssa_event_add(
-                src_ssafile=src_sub,
-                dst_ssafile=bilingual_sub,
-                text_list=translated_text,
-                same_event_type=2)
-            bilingual_string = core.ssafile_to_sub_str(
-                ssafile=bilingual_sub,
-                fps=fps,
-                subtitles_file_format=args.format)
-        # formatting timed_text to subtitles string
-        bilingual_name = "{base}.{nt}.1.{extension}".format(
-            base=args.output,
-            nt=args.src_language + '&' + args.dst_language,
-            extension=args.format)
-        subtitles_file_path = sub_utils.str_to_file(
-            str_=bilingual_string,
-            output=bilingual_name,
-            input_m=input_m)
-        # subtitles string to file
-        print(_("\"src-lf-dst\" subtitles file "
-                "created at \"{}\".").format(subtitles_file_path))
+            if args.audio_split_cmd == constants.DEFAULT_AUDIO_SPLT_CMD \
+                    and not is_native_split(args):
+                # if user doesn't modify the audio_split_cmd
+                if args.api_suffix == ".ogg":
+                    # regard ogg as ogg_opus
+                    args.audio_split_cmd = \
+                        args.audio_split_cmd.replace(
+                            "-vn",
+                            "-vn " + ffmpeg_utils.get_opus_codec_args())
+                elif args.api_suffix == ".pcm":
+                    # raw pcm
+                    args.audio_split_cmd = \
+                        args.audio_split_cmd.replace(
+                            "-vn",
+                            "-vn -c:a pcm_s16le -f s16le")
+
+        args.audio_split_cmd = \
+            args.audio_split_cmd.replace(
+                "[channel]",
+                "{channel}".format(channel=args.api_audio_channel))
+        args.audio_split_cmd = \
+            args.audio_split_cmd.replace(
+                "[sample_rate]",
+                "{sample_rate}".format(sample_rate=args.api_sample_rate))
+
+        validate_aovp_args(args)
+        fps = get_fps(args=args, input_m=input_m)
+        audio_or_video_prcs(args,
+                            fps=fps,
+                            input_m=input_m,
+                            styles_list=styles_list,
+                            audio_pool=audio_pool,
+                            speech_pool=speech_pool)
 
-        if not args.output_files:
-            raise exceptions.AutosubException(_("\nAll works done."))
+    else:
+        result = validate_sp_args(args)
+        fps = get_fps(args=args, input_m=input_m)
+        if result:
+            args.output_files = args.output_files & \
+                                constants.DEFAULT_SUB_MODE_SET
+            if not args.output_files:
+                raise exceptions.AutosubException(
+                    _("Error: No valid \"-of\"/\"--output-files\" arguments."))
+            sub_trans(args,
+                      input_m=input_m,
+                      fps=fps,
+                      styles_list=styles_list)
+        else:
+            args.audio_split_cmd = \
+                args.audio_split_cmd.replace(
+                    "[channel]",
+                    "{channel}".format(channel=args.api_audio_channel))
+            args.audio_split_cmd = \
+                args.audio_split_cmd.replace(
+                    "[sample_rate]",
+                    "{sample_rate}".format(sample_rate=args.api_sample_rate))
+
+            sub_conversion(
+                args,
+                input_m=input_m,
+                fps=fps
+            )
 
-    except KeyError:
-        pass
+
+def is_batch_input(input_):
+    """
+    Check if an input is a directory, a glob pattern
+    or a manifest file for the batch mode.
+    """
+    if not input_ or input_ == "-":
+        return False
+    if input_.startswith("@"):
+        return True
+    if os.path.isdir(input_):
+        return True
+    return not os.path.isfile(input_) and \
+        any(char in input_ for char in "*?[")
+
+
+def get_batch_inputs(input_):
+    """
+    Give a directory, a glob pattern or a manifest file
+    and return the input file list.
+    """
+    if input_.startswith("@"):
+        manifest = input_[1:]
+        if not os.path.isfile(manifest):
+            raise exceptions.AutosubException(
+                _("Error: Manifest file \"{path}\" isn't valid. "
+                  "You need to give a valid path.").format(path=manifest))
+        base_dir = os.path.dirname(os.path.abspath(manifest))
+        input_list = []
+        with open(manifest, encoding=constants.DEFAULT_ENCODING) as manifest_file:
+            for line in manifest_file:
+                line = line.strip().strip("\"")
+                if not line or line.startswith("#"):
+                    continue
+                # relative paths are relative to the manifest file
+                input_list.append(os.path.join(base_dir, line))
+
+    elif os.path.isdir(input_):
+        input_list = []
+        for name in sorted(os.listdir(input_)):
+            if name.startswith("."):
+                continue
+            ext = os.path.splitext(name)[-1].strip(".").lower()
+            if ext in constants.INPUT_FORMAT or ext in constants.OUTPUT_FORMAT:
+                # skip subtitles files including the outputs of the last run
+                continue
+            input_list.append(os.path.join(input_, name))
+
+    else:
+        input_list = sorted(glob.glob(input_))
+
+    result_list = []
+    for path in input_list:
+        if os.path.isfile(path) and path not in result_list:
+            result_list.append(path)
+    return result_list
+
+
+def batch_prcs(  # pylint: disable=too-many-branches, too-many-statements
+        args,
+        input_m=input):
+    """
+    Give args and process many input files
+    with the shared ffmpeg and Speech-to-Text worker pools.
+    """
+    input_list = get_batch_inputs(args.input)
+    if not input_list:
+        raise exceptions.AutosubException(
+            _("Error: No valid input files in \"{path}\".").format(path=args.input))
+
+    if args.output and not os.path.isdir(args.output):
+        raise exceptions.AutosubException(
+            _("Error: arg of \"-o\"/\"--output\" must be a directory "
+              "in the batch mode."))
+
+    if args.batch_concurrency < 1:
+        raise exceptions.AutosubException(
+            _("Error: \"-bc\"/\"--batch-concurrency\" arg is illegal."))
+
+    if args.speech_api == "baidu" and args.speech_config \
+            and "token" not in args.speech_config["config"]:
+        # fetch the token once and share it with all the files
+        print(_("Get the token online."))
+        args.speech_config["config"]["token"] = \
+            api_baidu.get_baidu_token(api_secret=args.speech_config["api_secret"],
+                                      api_key=args.speech_config["api_key"])
+
+    if args.batch_concurrency > 1 and input_m:
+        print(_("Files are processed at the same time. "
+                "Existing output files will be overwritten."))
+        input_m = None
+
+    print(_("Batch mode: {count} input files found.").format(count=len(input_list)))
+
+    input_queue = queue.Queue()
+    for input_ in input_list:
+        input_queue.put(input_)
+    result_dict = {}
+
+    audio_pool = multiprocessing.Pool(args.audio_concurrency)
+    speech_pool = multiprocessing.Pool(args.speech_concurrency)
+
+    def worker():
+        while True:
+            try:
+                input_ = input_queue.get_nowait()
+            except queue.Empty:
+                return
+            metrics_utils.set_queue_depth("batch", input_queue.qsize())
+            file_args = copy.copy(args)
+            file_args.input = input_
+            # each file changes the options below in its own copy
+            file_args.output_files = set(args.output_files)
+            file_args.speech_config = copy.deepcopy(args.speech_config)
+            file_args.auditok_config = copy.deepcopy(args.auditok_config)
+            file_args.best_match = copy.deepcopy(args.best_match)
+            print(_("\nBatch mode: Start processing \"{path}\".").format(path=input_))
+            try:
+                input_prcs(file_args,
+                           input_m=input_m,
+                           audio_pool=audio_pool,
+                           speech_pool=speech_pool)
+                result_dict[input_] = _("All works done.")
+            except pysubs2.exceptions.Pysubs2Error:
+                result_dict[input_] = _("Error: pysubs2.exceptions. Check your file format.")
+            except exceptions.AutosubException as err_msg:
+                result_dict[input_] = str(err_msg).strip().replace("\n", " ")
+            except Exception as error:  # pylint: disable=broad-except
+                # keep the worker alive for the rest of the files
+                result_dict[input_] = _("Error: {error}").format(
+                    error=repr(error).strip().replace("\n", " "))
+
+    threads = []
+    for _i in range(min(args.batch_concurrency, len(input_list))):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
 
     try:
-        args.output_files.remove("dst")
-        timed_trans = get_timed_text(
-            is_empty_dropped=False,
-            regions=regions,
-            text_list=translated_text
-        )
-        # formatting timed_text to subtitles string
-        if args.styles and \
-                (args.format == 'ass' or
-                 args.format == 'ssa' or
-                 args.format == 'ass.json'):
-            if len(args.styles) == 4:
-                dst_string = core.list_to_ass_str(
-                    text_list=timed_trans,
-                    styles_list=styles_list[2:4],
-                    subtitles_file_format=args.format, )
-            else:
-                dst_string = core.list_to_ass_str(
-                    text_list=timed_trans,
-                    styles_list=styles_list,
-                    subtitles_file_format=args.format, )
-        else:
-            dst_string = core.list_to_sub_str(
-                timed_text=timed_trans,
-                fps=fps,
-                subtitles_file_format=args.format)
-        dst_name = "{base}.{nt}.{extension}".format(
-            base=args.output,
-            nt=args.dst_language,
-            extension=args.format)
-        subtitles_file_path = sub_utils.str_to_file(
-            str_=dst_string,
-            output=dst_name,
-            input_m=input_m)
-        # subtitles string to file
-        print(_("Destination language subtitles "
-                "file created at \"{}\".").format(subtitles_file_path))
+        for thread in threads:
+            while thread.is_alive():
+                # join with a timeout to keep KeyboardInterrupt responsive
+                thread.join(1)
+    finally:
+        core.release_pool(audio_pool)
+        core.release_pool(speech_pool)
+
+    print(_("\nBatch mode results:"))
+    for input_ in input_list:
+        print("\"{path}\": {result}".format(
+            path=input_,
+            result=result_dict.get(input_, _("Not processed."))))
+
+
+def live_prcs(args):
+    """
+    Give args and generate subtitles from a live stream.
+    """
+    if not args.speech_language:
+        raise exceptions.AutosubException(
+            _("Error: \"-S\"/\"--speech-language\" is required in the live mode."))
 
-    except KeyError:
-        pass
+    if args.speech_api in ("gsv2", "gcsv1"):
+        args.speech_language = args.speech_language.lower()
+
+    if args.speech_api in ("xfyun", "baidu") and not args.speech_config:
+        raise exceptions.AutosubException(
+            _("Error: You must provide \"-sconf\", \"--speech-config\" option "
+              "when using Xun Fei Yun API or Baidu ASR API."))
+
+    recognizer = get_speech_recognizer(args)
+
+    mode = 0
+    if not args.not_strict_min_length:
+        mode = auditok.StreamTokenizer.STRICT_MIN_LENGTH
+    if args.drop_trailing_silence:
+        mode = mode | auditok.StreamTokenizer.DROP_TRAILING_SILENCE
+
+    if args.output:
+        vtt_path = os.path.splitext(args.output)[0] + ".vtt"
+        print(_("Write the rolling WebVTT file to \"{path}\".").format(path=vtt_path),
+              file=sys.stderr)
+    else:
+        vtt_path = None
+
+    writer = live_utils.LiveSubtitlesWriter(
+        vtt_path=vtt_path,
+        window=args.live_window)
+
+    if args.input == "-":
+        print(_("Read raw s16le PCM from stdin."), file=sys.stderr)
+        live_utils.live_speech_to_text(
+            stream=sys.stdin.buffer,
+            recognizer=recognizer,
+            suffix=args.api_suffix,
+            writer=writer,
+            sample_rate=args.api_sample_rate,
+            concurrency=args.speech_concurrency,
+            max_latency=args.live_latency,
+            energy_threshold=args.energy_threshold,
+            min_region_size=args.min_region_size,
+            max_region_size=args.max_region_size,
+            max_continuous_silence=args.max_continuous_silence,
+            mode=mode)
+        return
+
+    if not constants.get_program_cmd("ffmpeg"):
+        raise exceptions.AutosubException(
+            _("Error: Dependency ffmpeg"
+              " not found on this machine."))
+
+    command = constants.DEFAULT_LIVE_CMD.format(
+        in_=args.input,
+        channel=1,
+        sample_rate=args.api_sample_rate)
+    print(command, file=sys.stderr)
+    prcs = subprocess.Popen(constants.cmd_conversion(command),
+                            stdout=subprocess.PIPE)
+    try:
+        live_utils.live_speech_to_text(
+            stream=prcs.stdout,
+            recognizer=recognizer,
+            suffix=args.api_suffix,
+            writer=writer,
+            sample_rate=args.api_sample_rate,
+            concurrency=args.speech_concurrency,
+            max_latency=args.live_latency,
+            energy_threshold=args.energy_threshold,
+            min_region_size=args.min_region_size,
+            max_region_size=args.max_region_size,
+            max_continuous_silence=args.max_continuous_silence,
+            mode=mode)
+    finally:
+        prcs.terminate()
+        prcs.wait()
@@ -10,26 +10,31 @@ import multiprocessing
 import time
 import gettext
 import gc
-import re
 import operator
 
 # Import third-party modules
 import progressbar
-import pysubs2
-import wcwidth
-import docx
-import googletrans
 import auditok
 
 # Any changes to the path and your own modules
 from autosub import api_baidu
 from autosub import api_google
 from autosub import api_xfyun
+from autosub import audio_utils
 from autosub import auditok_utils
 from autosub import sub_utils
 from autosub import ffmpeg_utils
 from autosub import constants
 from autosub import exceptions
+from autosub import lazy_utils
+from autosub import metrics_utils
+from autosub import profile_utils
+from autosub import text_utils
+from autosub import trans_utils
+
+pysubs2 = lazy_utils.lazy_import("pysubs2")  # pylint: disable=invalid-name
+docx = lazy_utils.lazy_import("docx")  # pylint: disable=invalid-name
+googletrans = lazy_utils.lazy_import("googletrans")  # pylint: disable=invalid-name
 
 CORE_TEXT = gettext.translation(domain=__name__,
                                 localedir=constants.LOCALE_PATH,
@@ -85,13 +90,13 @@ def auditok_opt_opt(  # pylint: disable=too-many-locals, too-many-branches, too-
         result_stats = []
         for stat in input_stats:
             tasks.append(pool.apply_async(
-                auditok_utils.auditok_gen_stats_regions,
+                profile_utils.wrap(auditok_utils.auditok_gen_stats_regions),
                 args=(stat, asource)))
             gc.collect(0)
 
         for task in tasks:
             i = i + 1
-            result_stats.append(task.get())
+            result_stats.append(profile_utils.collect(task.get()))
             pbar.update(i)
 
         rank_list = [
@@ -107,9 +112,9 @@ def auditok_opt_opt(  # pylint: disable=too-many-locals, too-many-branches, too-
         asource.close()
         pbar.finish()
         print(_("Best options for Auditok is:\n"
-                "mxcs = {mxcs}s\net = {et}").format(mxcs=result.mxcs, et=result.et))
+                "mxcs = {mxcs}s\net = {et}").format(mxcs=result.mxcs, et=result.energy_t))
         config_dict["result_mxcs"] = result.mxcs
-        config_dict["result_et"] = result.et
+        config_dict["result_et"] = result.energy_t
         pool.terminate()
         pool.join()
         return result.events
@@ -147,7 +152,7 @@ def trim_audio_regions(  # pylint: disable=too-many-arguments, too-many-locals,
         regions = []
         for audio_fragment in audio_fragments:
             regions.append(auditok_utils.auditok_gen_speech_regions(
-                audio_fragment,
+                audio_fragment.path,
                 energy_threshold,
                 min_region_size,
                 max_region_size,
@@ -198,7 +203,7 @@ def trim_audio_regions(  # pylint: disable=too-many-arguments, too-many-locals,
 
         if not is_keep:
             for audio_fragment in audio_fragments:
-                os.remove(audio_fragment)
+                audio_utils.remove_fragment(audio_fragment)
 
         pbar.finish()
 
@@ -206,6 +211,37 @@ def trim_audio_regions(  # pylint: disable=too-many-arguments, too-many-locals,
         pbar.finish()
 
 
+def release_pool(pool, is_shared=False):
+    """
+    Terminate a worker pool unless it is shared with other works.
+    """
+    if not is_shared:
+        pool.terminate()
+        pool.join()
+
+
+def imap_longest_first(
+        pool,
+        func,
+        items,
+        key=audio_utils.get_fragment_size,
+        args=()):
+    """
+    Give a pool, a function and a list of items.
+    Dispatch the items by their key in descending order
+    so that a long item won't be the last straggler,
+    and yield the results in the original order.
+    The idle workers take the next task from the pool's shared queue.
+    """
+    order = sorted(range(len(items)), key=lambda index: key(items[index]), reverse=True)
+    tasks = [None] * len(items)
+    for index in order:
+        tasks[index] = pool.apply_async(func, args=(items[index],) + tuple(args))
+    for task in tasks:
+        yield task.get()
+
+
+@metrics_utils.timed_stage("split")
 def bulk_audio_conversion(  # pylint: disable=too-many-arguments, too-many-locals
         source_file,
         regions,
@@ -215,25 +251,53 @@ def bulk_audio_conversion(  # pylint: disable=too-many-arguments, too-many-local
         output=None,
         is_keep=False,
         include_before=0.0,
-        include_after=0.0):
+        include_after=0.0,
+        pool=None,
+        sample_rate=None,
+        channel=1):
     """
     Give an input audio/video file and
     generate short-term audio fragments.
+    If split_cmd is None, decode the input once at the sample rate
+    and split it in process instead of launching ffmpeg for each region.
+    Then the fragments are their audio data unless they are kept.
+    If a pool is given, use it instead of a private one.
     """
 
     if not regions:
         return None
 
-    pool = multiprocessing.Pool(concurrency)
+    pcm_path = None
+    if split_cmd is None:
+        pcm_path = audio_utils.decode_pcm(
+            source_path=source_file,
+            sample_rate=sample_rate,
+            channel=channel)
+        converter = audio_utils.SplitPCMIntoAudioPiece(
+            pcm_path=pcm_path,
+            output=output,
+            is_keep=is_keep,
+            suffix=suffix,
+            sample_rate=sample_rate,
+            channel=channel,
+            include_before=include_before,
+            include_after=include_after)
+    else:
+        converter = ffmpeg_utils.SplitIntoAudioPiece(
+            source_path=source_file,
+            cmd=split_cmd,
+            suffix=suffix,
+            output=output,
+            is_keep=is_keep,
+            include_before=include_before,
+            include_after=include_after)
 
-    converter = ffmpeg_utils.SplitIntoAudioPiece(
-        source_path=source_file,
-        cmd=split_cmd,
-        suffix=suffix,
-        output=output,
-        is_keep=is_keep,
-        include_before=include_before,
-        include_after=include_after)
+    is_shared = pool is not None
+    if not is_shared:
+        pool = multiprocessing.Pool(concurrency)
+
+    converter = metrics_utils.measure(converter, "split",
+                                      total=len(regions), workers=concurrency)
 
     print(_("\nConverting speech regions to short-term fragments."))
     widgets = [_("Converting: "),
@@ -243,23 +307,29 @@ def bulk_audio_conversion(  # pylint: disable=too-many-arguments, too-many-local
     pbar = progressbar.ProgressBar(widgets=widgets, maxval=len(regions)).start()
     try:
         audio_fragments = []
-        for i, audio_fragment in enumerate(pool.imap(converter, regions)):
+        for i, audio_fragment in enumerate(imap_longest_first(
+                pool, converter, regions,
+                key=lambda region: region[1] - region[0])):
+            audio_fragment = metrics_utils.collect(audio_fragment)
             if audio_fragment:
                 audio_fragments.append(audio_fragment)
             pbar.update(i)
             gc.collect(0)
         pbar.finish()
-        pool.terminate()
-        pool.join()
+        release_pool(pool, is_shared)
 
     except KeyboardInterrupt:
         pbar.finish()
-        pool.terminate()
-        pool.join()
+        release_pool(pool, is_shared)
         return None
+
+    finally:
+        if pcm_path:
+            os.remove(pcm_path)
     return audio_fragments
 
 
+@metrics_utils.timed_stage("speech")
 def gsv2_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-many-branches,too-many-statements
         audio_fragments,
         api_url,
@@ -267,20 +337,30 @@ def gsv2_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-many
         concurrency=constants.DEFAULT_CONCURRENCY,
         min_confidence=0.0,
         is_keep=False,
-        result_list=None):
+        result_list=None,
+        pool=None,
+        hedge_ratio=0.0):
     """
     Give a list of short-term audio fragment files
     and generate text_list from Google speech-to-text V2 api.
+    If a pool is given, use it instead of a private one.
+    If hedge_ratio is positive, hedge the slow requests.
     """
     text_list = []
-    pool = multiprocessing.Pool(concurrency)
+    is_shared = pool is not None
+    if not is_shared:
+        pool = multiprocessing.Pool(concurrency)
 
     recognizer = api_google.GoogleSpeechV2(
         api_url=api_url,
         headers=headers,
         min_confidence=min_confidence,
         is_keep=is_keep,
-        is_full_result=result_list is not None)
+        is_full_result=result_list is not None,
+        hedge_ratio=hedge_ratio)
+    recognizer = metrics_utils.measure(
+        recognizer, "speech",
+        total=len(audio_fragments), workers=concurrency, provider="gsv2")
 
     print(_("\nSending short-term fragments to Google Speech V2 API and getting result."))
     widgets = [_("Speech-to-Text: "),
@@ -291,7 +371,8 @@ def gsv2_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-many
     try:
         # get transcript
         if result_list is None:
-            for i, transcript in enumerate(pool.imap(recognizer, audio_fragments)):
+            for i, transcript in enumerate(imap_longest_first(pool, recognizer, audio_fragments)):
+                transcript = metrics_utils.collect(transcript)
                 if transcript:
                     text_list.append(transcript)
                 else:
@@ -300,7 +381,8 @@ def gsv2_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-many
                 pbar.update(i)
         # get full result and transcript
         else:
-            for i, result in enumerate(pool.imap(recognizer, audio_fragments)):
+            for i, result in enumerate(imap_longest_first(pool, recognizer, audio_fragments)):
+                result = metrics_utils.collect(result)
                 if result:
                     result_list.append(result)
                     transcript = \
@@ -314,13 +396,11 @@ def gsv2_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-many
                 gc.collect(0)
                 pbar.update(i)
         pbar.finish()
-        pool.terminate()
-        pool.join()
+        release_pool(pool, is_shared)
 
     except (KeyboardInterrupt, AttributeError) as error:
         pbar.finish()
-        pool.terminate()
-        pool.join()
+        release_pool(pool, is_shared)
 
         if error == AttributeError:
             print(
@@ -331,6 +411,7 @@ def gsv2_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-many
     return text_list
 
 
+@metrics_utils.timed_stage("speech")
 def gcsv1_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-many-branches,too-many-statements, too-many-nested-blocks
         audio_fragments,
         sample_rate,
@@ -341,14 +422,26 @@ def gcsv1_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-man
         src_language=constants.DEFAULT_SRC_LANGUAGE,
         min_confidence=0.0,
         is_keep=False,
-        result_list=None):
+        result_list=None,
+        pool=None,
+        suffix=None,
+        is_word_time=False,
+        hedge_ratio=0.0):
     """
-    Give a list of short-term audio fragment files
+    Give a list of short-term audio fragments
     and generate text_list from Google cloud speech-to-text V1P1Beta1 api.
+    The audio encoding is based on the suffix or the fragments' suffix.
+    If a pool is given, use it instead of a private one.
+    If is_word_time, request the word time offsets as well.
+    If hedge_ratio is positive, hedge the slow requests of the API URL.
     """
+    if not suffix and audio_fragments:
+        suffix = audio_fragments[0].suffix
 
     text_list = []
-    pool = multiprocessing.Pool(concurrency)
+    is_shared = pool is not None
+    if not is_shared:
+        pool = multiprocessing.Pool(concurrency)
 
     print(_("\nSending short-term fragments to Google Cloud Speech V1P1Beta1 API"
             " and getting result."))
@@ -369,9 +462,11 @@ def gcsv1_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-man
                     config["language_code"] = src_language
             else:
                 config = {
-                    "encoding": api_google.google_ext_to_enc(audio_fragments[0]),
+                    "encoding": api_google.google_ext_to_enc(suffix),
                     "sampleRateHertz": sample_rate,
                     "languageCode": src_language}
+            if is_word_time and "enable_word_time_offsets" not in config:
+                config["enableWordTimeOffsets"] = True
 
             recognizer = api_google.GCSV1P1Beta1URL(
                 config=config,
@@ -379,11 +474,17 @@ def gcsv1_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-man
                 headers=headers,
                 min_confidence=min_confidence,
                 is_keep=is_keep,
-                is_full_result=result_list is not None)
+                is_full_result=result_list is not None,
+                hedge_ratio=hedge_ratio)
+            recognizer = metrics_utils.measure(
+                recognizer, "speech",
+                total=len(audio_fragments), workers=concurrency, provider="gcsv1")
 
             # get transcript
             if result_list is None:
-                for i, transcript in enumerate(pool.imap(recognizer, audio_fragments)):
+                for i, transcript in enumerate(
+                        imap_longest_first(pool, recognizer, audio_fragments)):
+                    transcript = metrics_utils.collect(transcript)
                     if transcript:
                         text_list.append(transcript)
                     else:
@@ -391,7 +492,8 @@ def gcsv1_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-man
                     pbar.update(i)
             # get full result and transcript
             else:
-                for i, result in enumerate(pool.imap(recognizer, audio_fragments)):
+                for i, result in enumerate(imap_longest_first(pool, recognizer, audio_fragments)):
+                    result = metrics_utils.collect(result)
                     if result:
                         result_list.append(result)
                         transcript = api_google.get_gcsv1p1beta1_transcript(
@@ -410,33 +512,34 @@ def gcsv1_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-man
             if config:
                 # Use the fixed arguments
                 config["encoding"] = api_google.google_ext_to_enc(
-                    extension=audio_fragments[0],
+                    extension=suffix,
                     is_string=False
                 )
                 config["language_code"] = src_language
             else:
                 config = {
                     "encoding": api_google.google_ext_to_enc(
-                        extension=audio_fragments[0],
+                        extension=suffix,
                         is_string=False),
                     "sample_rate_hertz": sample_rate,
                     "language_code": src_language}
+            if is_word_time:
+                config["enable_word_time_offsets"] = True
 
             i = 0
-            tasks = []
-            for filename in audio_fragments:
-                # google cloud speech-to-text client can't use multiprocessing.pool
-                # based on class call, otherwise will receive pickling error
-                tasks.append(pool.apply_async(
-                    api_google.gcsv1p1beta1_service_client,
-                    args=(filename, is_keep, config, min_confidence,
-                          result_list is not None)))
-                gc.collect(0)
+            service_client = metrics_utils.measure(
+                api_google.gcsv1p1beta1_service_client, "speech",
+                total=len(audio_fragments), workers=concurrency, provider="gcsv1")
+            # google cloud speech-to-text client can't use multiprocessing.pool
+            # based on class call, otherwise will receive pickling error
+            tasks = imap_longest_first(
+                pool, service_client, audio_fragments,
+                args=(is_keep, config, min_confidence, result_list is not None))
 
             if result_list is None:
                 for task in tasks:
                     i = i + 1
-                    transcript = task.get()
+                    transcript = metrics_utils.collect(task)
                     if transcript:
                         text_list.append(transcript)
                     else:
@@ -445,7 +548,7 @@ def gcsv1_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-man
             else:
                 for task in tasks:
                     i = i + 1
-                    result = task.get()
+                    result = metrics_utils.collect(task)
                     result_list.append(result)
                     transcript = api_google.get_gcsv1p1beta1_transcript(
                         min_confidence,
@@ -457,13 +560,11 @@ def gcsv1_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-man
                     pbar.update(i)
 
         pbar.finish()
-        pool.terminate()
-        pool.join()
+        release_pool(pool, is_shared)
 
     except (KeyboardInterrupt, AttributeError) as error:
         pbar.finish()
-        pool.terminate()
-        pool.join()
+        release_pool(pool, is_shared)
 
         if error == AttributeError:
             print(
@@ -473,8 +574,7 @@ def gcsv1_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-man
 
     except exceptions.SpeechToTextException as err_msg:
         pbar.finish()
-        pool.terminate()
-        pool.join()
+        release_pool(pool, is_shared)
         print(_("Receive something unexpected:"))
         print(err_msg)
         return None
@@ -482,16 +582,19 @@ def gcsv1_to_text(  # pylint: disable=too-many-locals,too-many-arguments,too-man
     return text_list
 
 
+@metrics_utils.timed_stage("speech")
 def xfyun_to_text(  # pylint: disable=too-many-locals, too-many-arguments,
         # pylint: disable=too-many-branches, too-many-statements, too-many-nested-blocks
         audio_fragments,
         config,
         concurrency=constants.DEFAULT_CONCURRENCY,
         is_keep=False,
-        result_list=None):
+        result_list=None,
+        pool=None):
     """
     Give a list of short-term audio fragment files
     and generate text_list from Google cloud speech-to-text V1P1Beta1 api.
+    If a pool is given, use it instead of a private one.
     """
 
     text_list = []
@@ -506,7 +609,9 @@ def xfyun_to_text(  # pylint: disable=too-many-locals, too-many-arguments,
     else:
         delete_chars = None
 
-    pool = multiprocessing.Pool(concurrency)
+    is_shared = pool is not None
+    if not is_shared:
+        pool = multiprocessing.Pool(concurrency)
 
     print(_("\nSending short-term fragments to Xun Fei Yun WebSocket API"
             " and getting result."))
@@ -525,10 +630,14 @@ def xfyun_to_text(  # pylint: disable=too-many-locals, too-many-arguments,
             business_args=config["business"],
             is_full_result=result_list is not None,
             delete_chars=delete_chars)
+        recognizer = metrics_utils.measure(
+            recognizer, "speech",
+            total=len(audio_fragments), workers=concurrency, provider="xfyun")
 
         # get transcript
         if result_list is None:
-            for i, transcript in enumerate(pool.imap(recognizer, audio_fragments)):
+            for i, transcript in enumerate(imap_longest_first(pool, recognizer, audio_fragments)):
+                transcript = metrics_utils.collect(transcript)
                 if transcript:
                     text_list.append(transcript)
                 else:
@@ -536,7 +645,8 @@ def xfyun_to_text(  # pylint: disable=too-many-locals, too-many-arguments,
                 pbar.update(i)
         # get full result and transcript
         else:
-            for i, result in enumerate(pool.imap(recognizer, audio_fragments)):
+            for i, result in enumerate(imap_longest_first(pool, recognizer, audio_fragments)):
+                result = metrics_utils.collect(result)
                 if result:
                     result_list.append(result)
                     transcript = ""
@@ -555,19 +665,17 @@ def xfyun_to_text(  # pylint: disable=too-many-locals, too-many-arguments,
 
         if not is_keep:
             for audio_fragment in audio_fragments:
-                os.remove(audio_fragment)
+                audio_utils.remove_fragment(audio_fragment)
 
         pbar.finish()
-        pool.terminate()
-        pool.join()
+        release_pool(pool, is_shared)
 
     except (KeyboardInterrupt, AttributeError) as error:
         if not is_keep:
             for audio_fragment in audio_fragments:
-                os.remove(audio_fragment)
+                audio_utils.remove_fragment(audio_fragment)
         pbar.finish()
-        pool.terminate()
-        pool.join()
+        release_pool(pool, is_shared)
 
         if error == AttributeError:
             print(
@@ -578,10 +686,9 @@ def xfyun_to_text(  # pylint: disable=too-many-locals, too-many-arguments,
     except exceptions.SpeechToTextException as err_msg:
         if not is_keep:
             for audio_fragment in audio_fragments:
-                os.remove(audio_fragment)
+                audio_utils.remove_fragment(audio_fragment)
         pbar.finish()
-        pool.terminate()
-        pool.join()
+        release_pool(pool, is_shared)
         print(_("Receive something unexpected:"))
         print(err_msg)
         return None
@@ -589,16 +696,21 @@ def xfyun_to_text(  # pylint: disable=too-many-locals, too-many-arguments,
     return text_list
 
 
+@metrics_utils.timed_stage("speech")
 def baidu_to_text(  # pylint: disable=too-many-locals, too-many-arguments,
         # pylint: disable=too-many-branches, too-many-statements, too-many-nested-blocks
         audio_fragments,
         config,
         concurrency=constants.DEFAULT_CONCURRENCY,
         is_keep=False,
-        result_list=None):
+        result_list=None,
+        pool=None,
+        hedge_ratio=0.0):
     """
     Give a list of short-term audio fragment files
     and generate text_list from Google cloud speech-to-text V1P1Beta1 api.
+    If a pool is given, use it instead of a private one.
+    If hedge_ratio is positive, hedge the slow requests.
     """
 
     text_list = []
@@ -632,7 +744,9 @@ def baidu_to_text(  # pylint: disable=too-many-locals, too-many-arguments,
         print(err_msg)
         return None
 
-    pool = multiprocessing.Pool(concurrency)
+    is_shared = pool is not None
+    if not is_shared:
+        pool = multiprocessing.Pool(concurrency)
 
     widgets = [_("Speech-to-Text: "),
                progressbar.Percentage(), ' ',
@@ -646,11 +760,16 @@ def baidu_to_text(  # pylint: disable=too-many-locals, too-many-arguments,
             api_url=api_url,
             is_keep=is_keep,
             is_full_result=result_list is not None,
-            delete_chars=delete_chars)
+            delete_chars=delete_chars,
+            hedge_ratio=hedge_ratio)
+        recognizer = metrics_utils.measure(
+            recognizer, "speech",
+            total=len(audio_fragments), workers=concurrency, provider="baidu")
 
         # get transcript
         if result_list is None:
-            for i, transcript in enumerate(pool.imap(recognizer, audio_fragments)):
+            for i, transcript in enumerate(imap_longest_first(pool, recognizer, audio_fragments)):
+                transcript = metrics_utils.collect(transcript)
                 if transcript:
                     text_list.append(transcript)
                 else:
@@ -658,7 +777,8 @@ def baidu_to_text(  # pylint: disable=too-many-locals, too-many-arguments,
                 pbar.update(i)
         # get full result and transcript
         else:
-            for i, result in enumerate(pool.imap(recognizer, audio_fragments)):
+            for i, result in enumerate(imap_longest_first(pool, recognizer, audio_fragments)):
+                result = metrics_utils.collect(result)
                 if result:
                     result_list.append(result)
                     transcript = api_baidu.get_baidu_transcript(
@@ -672,13 +792,11 @@ def baidu_to_text(  # pylint: disable=too-many-locals, too-many-arguments,
                 text_list.append("")
                 pbar.update(i)
         pbar.finish()
-        pool.terminate()
-        pool.join()
+        release_pool(pool, is_shared)
 
     except (KeyboardInterrupt, AttributeError) as error:
         pbar.finish()
-        pool.terminate()
-        pool.join()
+        release_pool(pool, is_shared)
 
         if error == AttributeError:
             print(
@@ -688,8 +806,7 @@ def baidu_to_text(  # pylint: disable=too-many-locals, too-many-arguments,
 
     except exceptions.SpeechToTextException as err_msg:
         pbar.finish()
-        pool.terminate()
-        pool.join()
+        release_pool(pool, is_shared)
         print(_("Receive something unexpected:"))
         print(err_msg)
         return None
@@ -697,6 +814,41 @@ def baidu_to_text(  # pylint: disable=too-many-locals, too-many-arguments,
     return text_list
 
 
+def get_trans_size(text):
+    """
+    Return the size a text counts for in a translation request.
+    """
+    return text_utils.get_text_metrics(text).trans
+
+
+def split_trans_chunks(text_list, size_per_trans, extra_size=0):
+    """
+    Give a text list and split it into chunks of the text positions
+    whose translation request sizes are not bigger than size_per_trans.
+    Each non-empty text counts extra_size more, e.g. for its line id.
+    A text bigger than size_per_trans takes a chunk alone.
+    Return a list of the chunks' start and end positions.
+    """
+    return text_utils.TextWidthIndex(text_list).partition(
+        size_per_trans, extra_size=extra_size)
+
+
+def align_trans_lines(text_list, result_text):
+    """
+    Give the source text list of a chunk and its translated text
+    and return the translated text list aligned with the source.
+    Empty source lines get empty results.
+    Return None if the results are not as many as the source lines.
+    """
+    result_lines = [line for line in result_text.split('\n') if line]
+    count = sum(1 for text in text_list if text)
+    if len(result_lines) != count:
+        return None
+    result_iter = iter(result_lines)
+    return [next(result_iter) if text else "" for text in text_list]
+
+
+@metrics_utils.timed_stage("translation")
 def list_to_googletrans(  # pylint: disable=too-many-locals, too-many-arguments, too-many-branches, too-many-statements
         text_list,
         translator,
@@ -705,70 +857,45 @@ def list_to_googletrans(  # pylint: disable=too-many-locals, too-many-arguments,
         size_per_trans=constants.DEFAULT_SIZE_PER_TRANS,
         sleep_seconds=constants.DEFAULT_SLEEP_SECONDS,
         drop_override_codes=False,
-        delete_chars=None):
+        delete_chars=None,
+        concurrency=1,
+        qps=None,
+        retries=3):
     """
-    Give a text list, generate translated text list from GoogleTranslatorV2 api.
+    Give a text list, generate translated text list from GoogleTranslatorV2 api
+    or a translator backend.
+    The chunks are translated concurrently and paced by the qps limit.
+    If qps is None, pace the requests by sleep_seconds instead
+    unless the translator is a local one.
+    Identical lines are translated once and the translated lines are cached.
+    Each line is tagged with its line id so that the translated lines are matched by ids
+    and only the missing lines are re-requested.
+    A chunk whose translation fails is retried.
+    The manual translation in the watch mode exports all the lines at once with their line ids.
     """
 
     if not text_list:
         return None
 
-    translated_text = []
-    size = 0
-    i = 0
-    partial_index = []
-    valid_index = []
-    is_last = ""
-    text_list_length = len(text_list)
-    if size_per_trans <= 0:
-        size_per_trans = float("inf")
-    while i < text_list_length:
-        if text_list[i]:
-            if not is_last:
-                is_last = text_list[i]
-                valid_index.append(i)
-                # valid_index for valid text position start
-            wcswidth_text = wcwidth.wcswidth(text_list[i])
-            if wcswidth_text * 10 / len(text_list[i]) >= 10:
-                # If text contains full-wide char,
-                # count its length about 4 times than the ordinary text.
-                # Avoid weird problem when text has full-wide char.
-                # In this case Google will count a full-wide char
-                # at least 2 times larger than a half-wide char.
-                # It will certainly exceed the limit of the size_per_trans.
-                # Causing a googletrans internal jsondecode error.
-                size = size + wcswidth_text * 2
-            else:
-                size = size + len(text_list[i])
-            if size > size_per_trans:
-                # use size_per_trans to split the list
-                partial_index.append(i)
-                size = 0
-                continue
-                # stay at this line of text
-                # in case it's the last one
-        else:
-            if is_last:
-                is_last = text_list[i]
-                valid_index.append(i)
-                # valid_index for valid text position end
-        i = i + 1
-
-    if size:
-        partial_index.append(i)
-        # python sequence
-        # every group's end index
-    elif not partial_index:
-        return translated_text, src_language
-
-    len_valid_index = len(valid_index)
-
-    if len_valid_index % 2:
-        valid_index.append(i)
-        # valid_index for valid text position end
-
-    if translator != ManualTranslator and src_language == "auto":
-        content_to_trans = '\n'.join(text_list[i:partial_index[0]])
+    source_list = text_list
+    if drop_override_codes:
+        source_list = [trans_utils.OVERRIDE_CODES_REGEX.sub("", text) for text in text_list]
+    # the manual translation without the line ids keeps the lines by their order
+    is_manual = isinstance(translator, ManualTranslator) and not translator.use_line_ids
+    if isinstance(translator, ManualTranslator) and translator.is_watch:
+        # export all the text at once
+        size_per_trans = 0
+    if is_manual:
+        chunks = split_trans_chunks(source_list, size_per_trans)
+    else:
+        chunks = split_trans_chunks(source_list, size_per_trans,
+                                    extra_size=trans_utils.get_line_id_size(len(text_list)))
+    if not chunks:
+        return [""] * len(text_list), src_language
+
+    if not isinstance(translator, ManualTranslator) and src_language == "auto":
+        start, end = chunks[0]
+        content_to_trans = '\n'.join(source_list[start:end])
         result_src = translator.detect(content_to_trans).lang
     else:
         result_src = src_language
@@ -777,68 +904,157 @@ def list_to_googletrans(  # pylint: disable=too-many-locals, too-many-arguments,
         result_src,
         dst_language))
 
+    if isinstance(translator, ManualTranslator):
+        concurrency = 1
+    if qps is None:
+        if getattr(translator, "is_local", False):
+            qps = 0
+        else:
+            qps = 1.0 / sleep_seconds if sleep_seconds > 0 else 0
+    bucket = trans_utils.TokenBucket(qps)
+    if isinstance(translator, ManualTranslator):
+        provider = "manual"
+    else:
+        provider = getattr(translator, "provider", "googletrans")
+    # the backends of different configs don't share the cached lines
+    cache_key = getattr(translator, "cache_key", provider)
+    if delete_chars:
+        delete_table = str.maketrans(delete_chars, " " * len(delete_chars))
+    else:
+        delete_table = None
+
+    def request(content_to_trans):
+        """
+        Send a translation request and return the translated text and its source language.
+        """
+        for _i in range(retries):
+            bucket.acquire()
+            start_time = time.perf_counter()
+            try:
+                with metrics_utils.inflight(provider):
+                    translation = translator.translate(text=content_to_trans,
+                                                       dest=dst_language,
+                                                       src=src_language)
+                result_text = translation.text
+            except Exception:  # pylint: disable=broad-except
+                # googletrans raises json decode errors on the rejected requests
+                metrics_utils.record_call(
+                    provider=provider,
+                    latency=time.perf_counter() - start_time,
+                    is_error=True,
+                    bytes_out=len(content_to_trans.encode("utf-8")))
+                continue
+            metrics_utils.record_call(
+                provider=provider,
+                latency=time.perf_counter() - start_time,
+                bytes_out=len(content_to_trans.encode("utf-8")),
+                bytes_in=len(result_text.encode("utf-8")))
+            return result_text.translate(str.maketrans('’', '\'')), translation.src
+        return None, None
+
+    def translate_aligned_lines(start, end):
+        """
+        Translate the lines of a chunk by their order
+        and return the translated lines and their source language.
+        The lines which still can't be aligned after the retries keep their source text
+        instead of being dropped or shifted.
+        Return None as the lines if no request succeeds.
+        """
+        result_src = None
+        is_answered = False
+        for _i in range(retries):
+            result_text, chunk_src = request('\n'.join(source_list[start:end]))
+            if result_text is None:
+                continue
+            is_answered = True
+            result_src = chunk_src
+            result_list = align_trans_lines(source_list[start:end], result_text)
+            if result_list is not None:
+                return result_list, result_src
+        if not is_answered:
+            return None, None
+        print(_("Warning: {count} lines are still not translated after retries. "
+                "Keep their source text.").format(
+                    count=sum(1 for text in source_list[start:end] if text)))
+        return source_list[start:end], result_src
+
+    def translate_tagged_lines(start, end):
+        """
+        Translate the lines of a chunk with their line ids
+        and return the translated lines and their source language.
+        The identical lines are requested once and the cached ones are not requested.
+        The lines still missing after the retries keep their source text.
+        Return None as the lines if no request succeeds.
+        """
+        results = {}
+        first_indexes = {}
+        pending = []
+        for i in range(start, end):
+            if not source_list[i] or source_list[i] in first_indexes:
+                continue
+            first_indexes[source_list[i]] = i
+            cached = trans_utils.CACHE.get(cache_key, src_language, dst_language,
+                                           source_list[i])
+            if cached is None:
+                pending.append(i)
+            else:
+                results[i] = cached
+        result_src = None
+        is_answered = False
+        for _i in range(retries):
+            if not pending:
+                break
+            result_text, chunk_src = request(trans_utils.tag_line_ids(source_list, pending))
+            if result_text is None:
+                continue
+            is_answered = True
+            result_src = chunk_src
+            # re-request the missing lines only
+            translated = trans_utils.parse_line_ids(result_text, pending)
+            for i, text in translated.items():
+                trans_utils.CACHE.put(cache_key, src_language, dst_language,
+                                      source_list[i], text)
+            results.update(translated)
+            pending = [i for i in pending if i not in results]
+        if pending:
+            if not is_answered:
+                return None, None
+            print(_("Warning: {count} lines are still not translated after retries. "
+                    "Keep their source text.").format(count=len(pending)))
+            for i in pending:
+                results[i] = source_list[i]
+        return [results.get(first_indexes.get(source_list[i]), "")
+                for i in range(start, end)], result_src
+
+    def translate_chunk(index):
+        start, end = chunks[index]
+        if is_manual:
+            result_list, result_src = translate_aligned_lines(start, end)
+        else:
+            result_list, result_src = translate_tagged_lines(start, end)
+        if result_list is not None and delete_table:
+            result_list = [line.translate(delete_table).rstrip(" ")
+                           for line in result_list]
+        return result_list, result_src
+
     widgets = [_("Translation: "),
                progressbar.Percentage(), ' ',
                progressbar.Bar(), ' ',
                progressbar.ETA()]
-    pbar = progressbar.ProgressBar(widgets=widgets, maxval=i).start()
+    pbar = progressbar.ProgressBar(widgets=widgets, maxval=len(text_list)).start()
+    progress = {"lines": 0, "chunks": len(chunks)}
 
-    try:
-        i = 0
-        # total position
-        j = 0
-        # valid_index position
-
-        for index in partial_index:
-            content_to_trans = '\n'.join(text_list[i:index])
-            if drop_override_codes:
-                content_to_trans = "".join(re.compile(r'{.*?}').split(content_to_trans))
-            translation = translator.translate(text=content_to_trans,
-                                               dest=dst_language,
-                                               src=src_language)
-            result_text = translation.text.translate(str.maketrans('’', '\''))
-            result_src = translation.src
-            result_list = result_text.split('\n')
-            k = 0
-            len_result_list = len(result_list)
-            while i < index and j < len_valid_index and k < len_result_list:
-                if not result_list[k]:
-                    # if the result is invalid,
-                    # continue
-                    k = k + 1
-                    continue
-                if i < valid_index[j]:
-                    # if text is invalid,
-                    # append the empty string
-                    # and then continue
-                    translated_text.append("")
-                    i = i + 1
-                    if i % 20 == 5:
-                        pbar.update(i)
-                    continue
-                if i < valid_index[j + 1]:
-                    # if text is valid, append it
-                    if delete_chars:
-                        result_list[k] = result_list[k].translate(
-                            str.maketrans(delete_chars, " " * len(delete_chars)))
-                        result_list[k] = result_list[k].rstrip(" ")
-                    translated_text.append(result_list[k])
-                    k = k + 1
-                    i = i + 1
-                else:
-                    j = j + 2
-                if i % 20 == 5:
-                    pbar.update(i)
-            if len(partial_index) > 1:
-                time.sleep(sleep_seconds)
-
-        i = valid_index[-1]
-        while i < partial_index[-1]:
-            # if valid_index[-1] is less than partial_index[-1]
-            # add empty strings
-            translated_text.append("")
-            i = i + 1
+    def update_progress(index, _result):
+        progress["lines"] = progress["lines"] + chunks[index][1] - chunks[index][0]
+        progress["chunks"] = progress["chunks"] - 1
+        metrics_utils.set_queue_depth("translation", progress["chunks"])
+        pbar.update(progress["lines"])
 
+    try:
+        metrics_utils.set_queue_depth("translation", len(chunks))
+        results = trans_utils.run_tasks(translate_chunk, len(chunks),
+                                        concurrency=concurrency,
+                                        callback=update_progress)
         pbar.finish()
 
     except KeyboardInterrupt:
@@ -846,19 +1062,118 @@ def list_to_googletrans(  # pylint: disable=too-many-locals, too-many-arguments,
         print(_("Cancelling translation."))
         return 1
 
+    translated_text = []
+    for result_list, chunk_src in results:
+        if result_list is None:
+            print(_("Error: A translation chunk still fails after retries."))
+            return None, result_src
+        translated_text.extend(result_list)
+        if chunk_src:
+            result_src = chunk_src
     return translated_text, result_src
 
 
 class ManualTranslator:  # pylint: disable=too-few-public-methods
     """
     Class for performing translation manually.
+    If is_watch, the text is exported with its line ids
+    and the translated document is polled instead of blocking the input.
     """
     def __init__(self,
                  trans_doc_name,
-                 input_m=input):
+                 input_m=input,
+                 is_watch=False,
+                 result_doc_name=None,
+                 poll_interval=constants.DEFAULT_MANUAL_POLL_INTERVAL,
+                 max_poll_interval=constants.DEFAULT_MANUAL_MAX_POLL_INTERVAL):
         # pylint: disable=too-many-arguments
         self.trans_doc_name = trans_doc_name
         self.input_m = input_m
+        self.is_watch = is_watch
+        if result_doc_name:
+            self.result_doc_name = result_doc_name
+        else:
+            root, ext = os.path.splitext(trans_doc_name)
+            self.result_doc_name = "{root}.done{ext}".format(root=root, ext=ext)
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+
+    @property
+    def use_line_ids(self):
+        """
+        Whether the text is exported with its line ids.
+        """
+        return self.is_watch
+
+    def write_doc(self, text):
+        """
+        Write the text to the document to translate.
+        """
+        if self.trans_doc_name.endswith("docx"):
+            trans_doc = docx.Document()
+            trans_doc.add_paragraph(text=text)
+            trans_doc.save(self.trans_doc_name)
+            return self.trans_doc_name
+        return sub_utils.str_to_file(
+            str_=text,
+            output=self.trans_doc_name,
+            input_m=None if self.is_watch else self.input_m)
+
+    @staticmethod
+    def read_doc(doc_name):
+        """
+        Read the translated text from a document.
+        """
+        if doc_name.endswith("docx"):
+            trans_doc = docx.Document(doc_name)
+            return '\n'.join(para.text for para in trans_doc.paragraphs)
+        with open(doc_name, encoding=constants.DEFAULT_ENCODING) as trans_doc:
+            return trans_doc.read()
+
+    def wait(self):
+        """
+        Wait for the manual translation.
+        """
+        if self.input_m:
+            self.input_m(_("Wait for the manual translation. "
+                           "Press Enter to continue."))
+        else:
+            print(_("Wait 20 seconds for the manual translation. "))
+            widgets = [_("Manual translation: "),
+                       progressbar.Percentage(), ' ',
+                       progressbar.Bar(), ' ',
+                       progressbar.ETA()]
+            pbar = progressbar.ProgressBar(widgets=widgets, maxval=20).start()
+            for i in range(20):
+                pbar.update(i)
+                time.sleep(1)
+            pbar.finish()
+
+    def watch(self):
+        """
+        Poll until the translated document appears and stops changing.
+        The polling interval backs off up to max_poll_interval.
+        """
+        print(_("Translate the text in \"{src}\", keep the \"[#n]\" line ids "
+                "and save it as \"{dst}\". "
+                "The translation resumes when it appears.").format(
+                    src=self.trans_doc_name, dst=self.result_doc_name))
+        interval = self.poll_interval
+        last_stat = None
+        while True:
+            try:
+                stat = os.stat(self.result_doc_name)
+                stat = (stat.st_size, stat.st_mtime)
+            except OSError:
+                stat = None
+            if stat and stat[0] and stat == last_stat:
+                return
+            if stat != last_stat:
+                # check again soon after it changes
+                interval = self.poll_interval
+            last_stat = stat
+            time.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
 
     def translate(self,
                   text,
@@ -867,52 +1182,17 @@ class ManualTranslator:  # pylint: disable=too-few-public-methods
         """
         Translate text manually.
         """
-        if self.trans_doc_name.endswith("docx"):
-            trans_doc = docx.Document()
-            trans_doc.add_paragraph(text=text)
-            trans_doc.save(self.trans_doc_name)
-            if self.input_m:
-                self.input_m(_("Wait for the manual translation. "
-                               "Press Enter to continue."))
-            else:
-                print(_("Wait 20 seconds for the manual translation. "))
-                widgets = [_("Manual translation: "),
-                           progressbar.Percentage(), ' ',
-                           progressbar.Bar(), ' ',
-                           progressbar.ETA()]
-                pbar = progressbar.ProgressBar(widgets=widgets, maxval=20).start()
-                for i in range(20):
-                    pbar.update(i)
-                    time.sleep(1)
-                pbar.finish()
-            trans_doc = docx.Document(self.trans_doc_name)
-            para_list = []
-            for para in trans_doc.paragraphs:
-                para_list.append(para.text)
-            trans_doc_str = '\n'.join(para_list)
+        trans_doc_name = self.write_doc(text)
+        if self.is_watch:
+            if os.path.isfile(self.result_doc_name):
+                constants.DELETE_PATH(self.result_doc_name)
+            self.watch()
+            trans_doc_str = self.read_doc(self.result_doc_name)
+            constants.DELETE_PATH(self.result_doc_name)
         else:
-            trans_doc_name = sub_utils.str_to_file(
-                str_=text,
-                output=self.trans_doc_name,
-                input_m=self.input_m)
-            if self.input_m:
-                self.input_m(_("Wait for the manual translation. "
-                               "Press Enter to continue."))
-            else:
-                print(_("Wait 20 seconds for the manual translation. "))
-                widgets = [_("Manual translation: "),
-                           progressbar.Percentage(), ' ',
-                           progressbar.Bar(), ' ',
-                           progressbar.ETA()]
-                pbar = progressbar.ProgressBar(widgets=widgets, maxval=20).start()
-                for i in range(20):
-                    pbar.update(i)
-                    time.sleep(1)
-                pbar.finish()
-            trans_doc = open(trans_doc_name, encoding=constants.DEFAULT_ENCODING)
-            trans_doc_str = trans_doc.read()
-            trans_doc.close()
-        constants.DELETE_PATH(self.trans_doc_name)
+            self.wait()
+            trans_doc_str = self.read_doc(trans_doc_name)
+        constants.DELETE_PATH(trans_doc_name)
         return googletrans.client.Translated(
             src=src, dest=dest, origin="manual",
             text=trans_doc_str, pronunciation="manual", extra_data="manual")
@@ -1049,6 +1329,56 @@ def ssafile_to_sub_str(
     return formatted_subtitles
 
 
+def render_output(
+        model,
+        mode,
+        style_name='Default',
+        fps=30.0,
+        subtitles_file_formats=(constants.DEFAULT_SUBTITLES_FORMAT, )):
+    """
+    Give the event model and an output mode, format it to a string in each format.
+    """
+    ssafile = model.get_ssafile(mode, style_name=style_name)
+    return [ssafile_to_sub_str(
+        ssafile=ssafile,
+        fps=fps,
+        subtitles_file_format=subtitles_file_format)
+            for subtitles_file_format in subtitles_file_formats]
+
+
+def bulk_render_outputs(  # pylint: disable=too-many-arguments
+        model,
+        modes,
+        style_names=None,
+        fps=30.0,
+        subtitles_file_formats=(constants.DEFAULT_SUBTITLES_FORMAT, ),
+        pool=None):
+    """
+    Give the event model and the output modes,
+    format them to strings in each format in parallel.
+    Return the strings of each mode in the order of the formats.
+    Use the pool if given, otherwise a new one if the events are many
+    and there are several cpus.
+    """
+    if not style_names:
+        style_names = {}
+    items = [(model, mode, style_names.get(mode, 'Default'), fps, tuple(subtitles_file_formats))
+             for mode in modes]
+    is_shared = pool is not None
+    if not is_shared and len(modes) > 1 \
+            and len(model.src_ssafile.events) * len(modes) * len(subtitles_file_formats) \
+            >= constants.MIN_PARALLEL_RENDER_SIZE:
+        cpu_count = multiprocessing.cpu_count()
+        if cpu_count > 1:
+            pool = multiprocessing.Pool(min(len(modes), cpu_count))
+    if pool is None:
+        return [render_output(*item) for item in items]
+    try:
+        return pool.starmap(render_output, items)
+    finally:
+        release_pool(pool, is_shared=is_shared)
+
+
 def list_to_ass_str(
         text_list,
         styles_list,
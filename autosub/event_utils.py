@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Defines autosub's compact subtitles event table.
+"""
+# Import built-in modules
+import array
+
+# Import third-party modules
+
+
+# Any changes to the path and your own modules
+from autosub import lazy_utils
+
+pysubs2 = lazy_utils.lazy_import("pysubs2")  # pylint: disable=invalid-name
+
+# event flags
+COMMENT_FLAG = 1
+
+
+class EventView:
+    """
+    Class for a light view of an event row in an EventTable.
+    """
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def start(self):
+        """
+        Start time in milliseconds.
+        """
+        return self.table.starts[self.index]
+
+    @property
+    def end(self):
+        """
+        End time in milliseconds.
+        """
+        return self.table.ends[self.index]
+
+    @property
+    def style(self):
+        """
+        Style name.
+        """
+        return self.table.styles[self.table.style_ids[self.index]]
+
+    @property
+    def text(self):
+        """
+        Event text.
+        """
+        return self.table.texts[self.table.text_ids[self.index]]
+
+    @property
+    def is_comment(self):
+        """
+        Whether the event is a comment.
+        """
+        return bool(self.table.flags[self.index] & COMMENT_FLAG)
+
+
+class EventTable:  # pylint: disable=too-many-instance-attributes
+    """
+    Class for a compact table of subtitles events.
+    The events are kept in parallel arrays of start, end, style id, flags and text id.
+    The styles and the texts are interned in pools.
+    Each row also keeps the index of the pysubs2 event it comes from
+    so that the other fields are restored at I/O time.
+    """
+    __slots__ = ("starts", "ends", "style_ids", "flags", "text_ids", "source_ids",
+                 "styles", "style_index", "texts", "text_index", "source_events")
+
+    def __init__(self, source_events=None):
+        self.starts = array.array("q")
+        self.ends = array.array("q")
+        self.style_ids = array.array("l")
+        self.flags = array.array("b")
+        self.text_ids = array.array("l")
+        self.source_ids = array.array("l")
+        self.styles = []
+        self.style_index = {}
+        self.texts = []
+        self.text_index = {}
+        self.source_events = source_events if source_events is not None else []
+
+    @classmethod
+    def from_events(cls, events):
+        """
+        Build a table from a list of pysubs2 events.
+        """
+        table = cls(source_events=events)
+        table.starts = array.array("q", [event.start for event in events])
+        table.ends = array.array("q", [event.end for event in events])
+        # the ids are the insertion orders of the pools
+        style_index = table.style_index
+        table.style_ids = array.array("l", [style_index.setdefault(event.style, len(style_index))
+                                            for event in events])
+        table.styles = list(style_index)
+        table.flags = array.array("b", [COMMENT_FLAG if event.is_comment else 0
+                                        for event in events])
+        text_index = table.text_index
+        table.text_ids = array.array("l", [text_index.setdefault(event.text, len(text_index))
+                                           for event in events])
+        table.texts = list(text_index)
+        table.source_ids = array.array("l", range(len(events)))
+        return table
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        return EventView(self, index)
+
+    def intern_style(self, style):
+        """
+        Return the id of a style name.
+        """
+        style_id = self.style_index.get(style)
+        if style_id is None:
+            style_id = len(self.styles)
+            self.styles.append(style)
+            self.style_index[style] = style_id
+        return style_id
+
+    def intern_text(self, text):
+        """
+        Return the id of a text.
+        """
+        text_id = self.text_index.get(text)
+        if text_id is None:
+            text_id = len(self.texts)
+            self.texts.append(text)
+            self.text_index[text] = text_id
+        return text_id
+
+    def append(self,  # pylint: disable=too-many-arguments
+               start,
+               end,
+               style,
+               text,
+               is_comment=False,
+               source_id=-1):
+        """
+        Append an event row and return its index.
+        """
+        self.starts.append(start)
+        self.ends.append(end)
+        self.style_ids.append(self.intern_style(style))
+        self.flags.append(COMMENT_FLAG if is_comment else 0)
+        self.text_ids.append(self.intern_text(text))
+        self.source_ids.append(source_id)
+        return len(self.starts) - 1
+
+    def append_row(self,  # pylint: disable=too-many-arguments
+                   index,
+                   start=None,
+                   end=None,
+                   style=None,
+                   text=None,
+                   keep_source=True):
+        """
+        Append a copy of a row with some fields replaced and return its index.
+        If not keep_source, the other fields of the source event are dropped.
+        """
+        self.starts.append(self.starts[index] if start is None else start)
+        self.ends.append(self.ends[index] if end is None else end)
+        if style is None:
+            self.style_ids.append(self.style_ids[index])
+        else:
+            self.style_ids.append(self.intern_style(style))
+        self.flags.append(self.flags[index])
+        if text is None:
+            self.text_ids.append(self.text_ids[index])
+        else:
+            self.text_ids.append(self.intern_text(text))
+        self.source_ids.append(self.source_ids[index] if keep_source else -1)
+        return len(self.starts) - 1
+
+    def get_style(self, index):
+        """
+        Return the style name of a row.
+        """
+        return self.styles[self.style_ids[index]]
+
+    def get_text(self, index):
+        """
+        Return the text of a row.
+        """
+        return self.texts[self.text_ids[index]]
+
+    def is_comment(self, index):
+        """
+        Return whether a row is a comment.
+        """
+        return bool(self.flags[index] & COMMENT_FLAG)
+
+    def group_by_style(self, rows=None):
+        """
+        Return the row indexes of each style by the order the styles appear
+        and the first row index of each style.
+        """
+        if rows is None:
+            rows = range(len(self.starts))
+        style_ids = self.style_ids
+        groups = {}
+        first_rows = {}
+        for i in rows:
+            style_id = style_ids[i]
+            if style_id in groups:
+                groups[style_id].append(i)
+            else:
+                groups[style_id] = [i]
+                first_rows[style_id] = i
+        return groups, first_rows
+
+    def sort_rows(self, rows):
+        """
+        Return the row indexes sorted by the start and the end like SSAFile.sort.
+        """
+        starts = self.starts
+        ends = self.ends
+        return sorted(rows, key=lambda i: (starts[i], ends[i]))
+
+    def to_event(self, index, event=None):
+        """
+        Convert a row to a pysubs2 event.
+        The other fields are copied from its source event.
+        If event is given, it is updated in place instead.
+        """
+        if event is not None:
+            event.start = self.starts[index]
+            event.end = self.ends[index]
+            event.style = self.styles[self.style_ids[index]]
+            event.text = self.texts[self.text_ids[index]]
+            event.is_comment = bool(self.flags[index] & COMMENT_FLAG)
+            return event
+        source_id = self.source_ids[index]
+        fields = {}
+        if source_id >= 0:
+            fields = self.source_events[source_id].as_dict()
+        fields["start"] = self.starts[index]
+        fields["end"] = self.ends[index]
+        fields["style"] = self.styles[self.style_ids[index]]
+        fields["text"] = self.texts[self.text_ids[index]]
+        fields["type"] = "Comment" if self.flags[index] & COMMENT_FLAG else "Dialogue"
+        return pysubs2.SSAEvent(**fields)
+
+    def to_events(self, rows=None, is_reused=False):
+        """
+        Convert the rows to a list of pysubs2 events.
+        The rows unchanged since from_events reuse their source events.
+        If is_reused, the first row from each source event updates it in place
+        instead of copying it.
+        """
+        if rows is None:
+            rows = range(len(self.starts))
+        source_ids = self.source_ids
+        used_ids = set()
+        events = []
+        for index in rows:
+            source_id = source_ids[index]
+            if source_id < 0 or source_id in used_ids:
+                events.append(self.to_event(index))
+            elif source_id == index:
+                used_ids.add(source_id)
+                events.append(self.source_events[source_id])
+            elif is_reused:
+                used_ids.add(source_id)
+                events.append(self.to_event(index, event=self.source_events[source_id]))
+            else:
+                events.append(self.to_event(index))
+        return events
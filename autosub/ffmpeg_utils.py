@@ -10,11 +10,13 @@ import re
 import os
 import sys
 import gettext
+import functools
 
 # Import third-party modules
 
 
 # Any changes to the path and your own modules
+from autosub import audio_utils
 from autosub import constants
 from autosub import exceptions
 
@@ -25,10 +27,68 @@ FFMPEG_UTILS_TEXT = gettext.translation(domain=__name__,
 
 _ = FFMPEG_UTILS_TEXT.gettext
 
+# ffmpeg output formats of the audio suffixes which can be written to a pipe
+# wav isn't included since its header needs a seekable output
+PIPE_FORMATS = {".flac": "flac", ".ogg": "ogg", ".mp3": "mp3", ".pcm": "s16le"}
 
-class SplitIntoAudioPiece:  # pylint: disable=too-few-public-methods
+# the pipe output argument of a formatted command, quoted or not
+PIPE_OUTPUT_REGEX = re.compile(r'(?<!\S)"?pipe:1"?(?!\S)')
+
+
+@functools.lru_cache(maxsize=None)
+def get_ffmpeg_capabilities():
+    """
+    Return ffmpeg's version and available audio encoders.
+    Probe them only once per ffmpeg executable and cache them on disk.
+    """
+    ffmpeg_cmd = constants.get_program_cmd("ffmpeg")
+    capabilities = {"version": "", "encoders": []}
+    if not ffmpeg_cmd:
+        return capabilities
+
+    try:
+        stamp = constants.get_file_stamp(ffmpeg_cmd)
+    except OSError:
+        return capabilities
+    cache_dict = constants.load_cache("ffmpeg_capabilities.json")
+    item = cache_dict.get(ffmpeg_cmd)
+    if item and item.get("stamp") == stamp:
+        return item["capabilities"]
+
+    try:
+        version_str = subprocess.check_output(
+            [ffmpeg_cmd, "-hide_banner", "-version"],
+            stderr=subprocess.DEVNULL).decode("utf-8", "replace")
+        encoders_str = subprocess.check_output(
+            [ffmpeg_cmd, "-hide_banner", "-encoders"],
+            stderr=subprocess.DEVNULL).decode("utf-8", "replace")
+    except (OSError, subprocess.CalledProcessError):
+        return capabilities
+
+    capabilities["version"] = version_str.split("\n", maxsplit=1)[0].strip()
+    # e.g. " A..... libopus              libopus Opus (codec opus)"
+    capabilities["encoders"] = re.findall(r"^ A\S{5} (\S+)", encoders_str, re.MULTILINE)
+    cache_dict[ffmpeg_cmd] = {"stamp": stamp, "capabilities": capabilities}
+    constants.save_cache("ffmpeg_capabilities.json", cache_dict)
+    return capabilities
+
+
+def get_opus_codec_args():
     """
-    Class for converting a region of an input audio or video file into a short-term audio file
+    Return ffmpeg's codec args to encode ogg opus audio
+    based on the available encoders.
+    """
+    encoders = get_ffmpeg_capabilities()["encoders"]
+    if encoders and "libopus" not in encoders and "opus" in encoders:
+        # ffmpeg's native opus encoder is experimental
+        return "-c:a opus -strict -2"
+    return "-c:a libopus"
+
+
+class SplitIntoAudioPiece:
+    """
+    Class for converting a region of an input audio or video file into a short-term audio fragment
+    in memory, or in a file when the fragments are kept or can't be written to a pipe.
     """
 
     def __init__(  # pylint: disable=too-many-arguments
@@ -48,6 +108,43 @@ class SplitIntoAudioPiece:  # pylint: disable=too-few-public-methods
         self.include_after = include_after
         self.output = output
 
+    def run(self, start, end, out_):
+        """
+        Run the command on a time range and return its stdout and stderr.
+        """
+        command = self.cmd.format(start=start,
+                                  dura=end - start,
+                                  in_=self.source_path,
+                                  out_=out_)
+        return self.run_command(command)
+
+    @staticmethod
+    def run_command(command):
+        """
+        Run a command and return its stdout and stderr.
+        """
+        prcs = subprocess.Popen(constants.cmd_conversion(command),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        return prcs.communicate()
+
+    def split_to_memory(self, start, end):
+        """
+        Write the fragment to stdout and keep it in memory.
+        Return None if the command doesn't write its output to the pipe.
+        """
+        command = self.cmd.format(start=start,
+                                  dura=end - start,
+                                  in_=self.source_path,
+                                  out_="pipe:1")
+        # the pipe has no extension to guess the format from
+        command, count = PIPE_OUTPUT_REGEX.subn(
+            "-f {fmt} pipe:1".format(fmt=PIPE_FORMATS[self.suffix]), command)
+        if not count:
+            return None
+        audio_data = self.run_command(command)[0]
+        return audio_utils.AudioFragment(data=audio_data, suffix=self.suffix)
+
     def __call__(self, region):
         try:
             start_ms, end_ms = region
@@ -57,38 +154,26 @@ class SplitIntoAudioPiece:  # pylint: disable=too-few-public-methods
                 start = start - self.include_before
             end += self.include_after
             if not self.is_keep or not self.output:
-                temp = tempfile.NamedTemporaryFile(suffix=self.suffix, delete=False)
-                command = self.cmd.format(start=start,
-                                          dura=end - start,
-                                          in_=self.source_path,
-                                          out_=temp.name)
-                prcs = subprocess.Popen(constants.cmd_conversion(command),
-                                        stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE)
-                prcs.communicate()
-                return temp.name
+                fragment = None
+                if self.suffix in PIPE_FORMATS:
+                    fragment = self.split_to_memory(start, end)
+                if fragment is None:
+                    temp = tempfile.NamedTemporaryFile(suffix=self.suffix, delete=False)
+                    self.run(start, end, temp.name)
+                    fragment = audio_utils.AudioFragment(path=temp.name, suffix=self.suffix)
+                elif len(fragment.data) <= 4:
+                    fragment = None
+                return fragment
 
             filename = self.output \
                 + "-{start:0>8.3f}-{end:0>8.3f}{suffix}".format(
                     start=start,
                     end=end,
                     suffix=self.suffix)
-            command = self.cmd.format(start=start,
-                                      dura=end - start,
-                                      in_=self.source_path,
-                                      out_=filename)
-            prcs = subprocess.Popen(constants.cmd_conversion(command),
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE)
-            err = prcs.communicate()[1]
-            if err:
-                return None
-            audio_file = open(filename, mode="rb")
-            audio_data = audio_file.read()
-            audio_file.close()
-            if len(audio_data) <= 4:
+            err = self.run(start, end, filename)[1]
+            if err or os.path.getsize(filename) <= 4:
                 return None
-            return filename
+            return audio_utils.AudioFragment(path=filename, suffix=self.suffix)
 
         except KeyboardInterrupt:
             return None
@@ -181,7 +266,7 @@ def audio_pre_prcs(  # pylint: disable=too-many-arguments, too-many-branches
     output_list = [filename, ]
     if not cmds:
         cmds = constants.DEFAULT_AUDIO_PRCS_CMDS
-        if not constants.FFMPEG_NORMALIZE_CMD:
+        if not constants.get_program_cmd("ffmpeg-normalize"):
             print(_("Warning: Dependency ffmpeg-normalize "
                     "not found on this machine. "
                     "Try default method."))
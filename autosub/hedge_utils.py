@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Defines autosub's hedged api request functionality.
+"""
+# Import built-in modules
+import collections
+import queue
+import threading
+import time
+
+# Import third-party modules
+
+
+# Any changes to the path and your own modules
+from autosub import constants
+from autosub import lazy_utils
+from autosub import metrics_utils
+
+requests = lazy_utils.lazy_import("requests")  # pylint: disable=invalid-name
+
+# the hedgers of each provider in this process
+HEDGERS = {}
+
+# latencies kept to estimate the hedging delay
+LATENCY_WINDOW = 1000
+
+# requests observed before any hedging
+MIN_SAMPLES = 10
+
+# seconds to wait for the response of a request thread
+MAX_WAIT_TIME = 300
+
+
+class Hedger:
+    """
+    Class for hedging the slow requests of a provider.
+    When a request takes longer than the observed latency percentile,
+    a duplicate one is sent and the first response wins.
+    The duplicates are not more than max_ratio of the requests.
+    """
+
+    def __init__(self,
+                 provider,
+                 max_ratio=constants.DEFAULT_HEDGE_RATIO,
+                 percentile=constants.DEFAULT_HEDGE_PERCENTILE):
+        self.provider = provider
+        self.max_ratio = max_ratio
+        self.percentile = percentile
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.hedges = 0
+        self.lock = threading.Lock()
+
+    def get_delay(self):
+        """
+        Return the delay before hedging a request, or None if it can't be hedged now.
+        """
+        with self.lock:
+            if len(self.latencies) < MIN_SAMPLES \
+                    or self.hedges + 1 > self.max_ratio * self.calls:
+                return None
+            return metrics_utils.percentile(sorted(self.latencies), self.percentile)
+
+    def observe(self, latency):
+        """
+        Add the latency of a finished request.
+        """
+        with self.lock:
+            self.latencies.append(latency)
+
+    def request(self, index, results, args, kwargs):
+        """
+        Send a request in a thread and put the response or the error to the results.
+        The latency is observed even if the other request has won
+        so that the slow ones are not left out.
+        """
+        start_time = time.perf_counter()
+        try:
+            response = requests.post(*args, **kwargs)
+        except Exception as error:  # pylint: disable=broad-except
+            # any error must reach the waiting caller
+            results.put((index, error))
+            return
+        self.observe(time.perf_counter() - start_time)
+        results.put((index, response))
+
+    @staticmethod
+    def wait(results, timeout=MAX_WAIT_TIME):
+        """
+        Return the next result of the request threads.
+        Raise requests.exceptions.ConnectionError if none arrives in time
+        so that the caller retries it like a lost connection.
+        """
+        try:
+            return results.get(timeout=timeout)
+        except queue.Empty:
+            raise requests.exceptions.ConnectionError(  # pylint: disable=raise-missing-from
+                "No response in {time} seconds.".format(time=timeout))
+
+    def post(self, *args, **kwargs):
+        """
+        Send a POST request like requests.post and hedge it if it is slow.
+        """
+        with self.lock:
+            self.calls += 1
+        delay = self.get_delay()
+        results = queue.Queue()
+        threading.Thread(target=self.request,
+                         args=(0, results, args, kwargs),
+                         daemon=True).start()
+        count = 1
+        try:
+            if delay is None:
+                index, response = self.wait(results)
+            else:
+                index, response = results.get(timeout=delay)
+        except queue.Empty:
+            with self.lock:
+                self.hedges += 1
+            threading.Thread(target=self.request,
+                             args=(1, results, args, kwargs),
+                             daemon=True).start()
+            count = 2
+            index, response = self.wait(results)
+
+        if isinstance(response, Exception) and count > 1:
+            # the other request may still succeed
+            index, response = self.wait(results)
+        if count > 1:
+            metrics_utils.record_hedge(self.provider, is_won=index == 1)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def post(provider, hedge_ratio, *args, **kwargs):
+    """
+    Send a POST request.
+    If hedge_ratio is positive, hedge it by the provider's hedger in this process.
+    """
+    if not hedge_ratio or hedge_ratio <= 0:
+        return requests.post(*args, **kwargs)
+    hedger = HEDGERS.get(provider)
+    if hedger is None or hedger.max_ratio != hedge_ratio:
+        hedger = Hedger(provider, max_ratio=hedge_ratio)
+        HEDGERS[provider] = hedger
+    return hedger.post(*args, **kwargs)
@@ -11,9 +11,10 @@ import wcwidth
 
 # Any changes to the path and your own modules
 from autosub import constants
+from autosub import lazy_utils
 
 if not constants.langcodes_:
-    from fuzzywuzzy import process
+    process = lazy_utils.lazy_import("fuzzywuzzy.process")  # pylint: disable=invalid-name
 else:
     process = None  # pylint: disable=invalid-name
 
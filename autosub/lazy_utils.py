@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Defines autosub's lazy import functionality.
+"""
+# Import built-in modules
+import importlib
+import importlib.util
+import types
+
+# Import third-party modules
+
+
+# Any changes to the path and your own modules
+
+
+class LazyModule(types.ModuleType):  # pylint: disable=too-few-public-methods
+    """
+    Class for a module which is imported at its first attribute access.
+    """
+
+    def __getattr__(self, attr):
+        # only called when the attribute isn't found in the proxy itself
+        module = importlib.import_module(self.__name__)
+        self.__dict__[attr] = getattr(module, attr)
+        return self.__dict__[attr]
+
+
+def lazy_import(name):
+    """
+    Give a module name and return a module proxy
+    which imports the module only when it is used.
+    """
+    return LazyModule(name)
+
+
+def is_module_available(name):
+    """
+    Check if a module can be imported without importing it.
+    """
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        # the parent package is missing
+        return False
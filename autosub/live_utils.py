@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Defines autosub's live/streaming subtitles functionality.
+"""
+# Import built-in modules
+import os
+import sys
+import gettext
+import collections
+import multiprocessing
+import subprocess
+import tempfile
+import threading
+import time
+
+# Import third-party modules
+import auditok
+
+# Any changes to the path and your own modules
+from autosub import audio_utils
+from autosub import constants
+from autosub import ffmpeg_utils
+
+LIVE_UTILS_TEXT = gettext.translation(domain=__name__,
+                                      localedir=constants.LOCALE_PATH,
+                                      languages=[constants.CURRENT_LOCALE],
+                                      fallback=True)
+
+_ = LIVE_UTILS_TEXT.gettext
+
+
+class PipeAudioSource(auditok.io.AudioSource):
+    """
+    Class for reading raw s16le PCM audio from a pipe,
+    e.g. the stdout of ffmpeg or the stdin of autosub.
+    """
+
+    def __init__(self,
+                 stream,
+                 sampling_rate=16000,
+                 sample_width=2,
+                 channels=1):
+        auditok.io.AudioSource.__init__(self, sampling_rate, sample_width, channels)
+        self.stream = stream
+        self._is_open = False
+
+    def is_open(self):
+        return self._is_open
+
+    def open(self):
+        self._is_open = True
+
+    def close(self):
+        self._is_open = False
+
+    def read(self, size):
+        if not self._is_open:
+            raise IOError("Stream is not open")
+
+        to_read = size * self.sample_width * self.channels
+        data = b""
+        while len(data) < to_read:
+            # a pipe may return less data than required
+            buf = self.stream.read(to_read - len(data))
+            if not buf:
+                break
+            data = data + buf
+
+        if len(data) < 1:
+            return None
+
+        return data
+
+
+def pcm_to_fragment(
+        pcm_data,
+        suffix,
+        sample_rate,
+        channel=1,
+        encode_cmd=constants.DEFAULT_LIVE_ENCODE_CMD):
+    """
+    Give a raw s16le PCM data and return an in-memory audio fragment
+    whose format depends on the suffix.
+    It is encoded in process if possible, otherwise by ffmpeg.
+    Return None if ffmpeg fails.
+    """
+    if audio_utils.is_native_suffix(suffix, sample_rate):
+        return audio_utils.AudioFragment(
+            data=audio_utils.encode_pcm(pcm_data=pcm_data,
+                                        suffix=suffix,
+                                        sample_rate=sample_rate,
+                                        channel=channel),
+            suffix=suffix)
+
+    if suffix == ".ogg":
+        codec = ffmpeg_utils.get_opus_codec_args()
+    else:
+        codec = ""
+    temp_name = None
+    if suffix in ffmpeg_utils.PIPE_FORMATS:
+        out_ = "pipe:1"
+    else:
+        # ffmpeg needs a seekable output or the extension to guess the format
+        temp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+        temp.close()
+        out_ = temp_name = temp.name
+    command = encode_cmd.format(
+        sample_rate=sample_rate,
+        channel=channel,
+        codec=codec,
+        out_=out_)
+    if not temp_name:
+        command = ffmpeg_utils.PIPE_OUTPUT_REGEX.sub(
+            "-f {fmt} pipe:1".format(fmt=ffmpeg_utils.PIPE_FORMATS[suffix]), command)
+    prcs = subprocess.Popen(constants.cmd_conversion(command),
+                            stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    audio_data = prcs.communicate(input=pcm_data)[0]
+    if temp_name:
+        with open(temp_name, "rb") as audio_file:
+            audio_data = audio_file.read()
+        os.remove(temp_name)
+    if prcs.returncode or not audio_data:
+        return None
+    return audio_utils.AudioFragment(data=audio_data, suffix=suffix)
+
+
+def recognize_pcm(recognizer,
+                  pcm_data,
+                  suffix,
+                  sample_rate):
+    """
+    Give a region's raw s16le PCM data, encode it into an audio fragment
+    and return the recognizer's result.
+    Return None if the region can't be encoded.
+    It runs in the worker processes so that encoding never blocks reading the stream.
+    """
+    audio_fragment = pcm_to_fragment(
+        pcm_data=pcm_data,
+        suffix=suffix,
+        sample_rate=sample_rate)
+    if audio_fragment is None:
+        print(_("Warning: A live region can't be encoded. Dropped."), file=sys.stderr)
+        return None
+    try:
+        return recognizer(audio_fragment)
+    finally:
+        audio_utils.remove_fragment(audio_fragment)
+
+
+def ms_to_vtt_timestamp(mili_sec):
+    """
+    Convert milliseconds into a WebVTT timestamp.
+    """
+    hours, mili_sec = divmod(int(mili_sec), 3600000)
+    minutes, mili_sec = divmod(mili_sec, 60000)
+    seconds, mili_sec = divmod(mili_sec, 1000)
+    return "{:02d}:{:02d}:{:02d}.{:03d}".format(hours, minutes, seconds, mili_sec)
+
+
+class LiveSubtitlesWriter:  # pylint: disable=too-few-public-methods
+    """
+    Class for emitting live subtitles events to stdout
+    and optionally to a rolling WebVTT file.
+    """
+
+    def __init__(self,
+                 vtt_path=None,
+                 window=constants.DEFAULT_LIVE_WINDOW,
+                 stream=None):
+        self.vtt_path = vtt_path
+        self.events = collections.deque(maxlen=window if window > 0 else None)
+        if stream:
+            self.stream = stream
+        else:
+            self.stream = sys.stdout
+
+    def __call__(self, start, end, text):
+        cue = "{start} --> {end}\n{text}".format(
+            start=ms_to_vtt_timestamp(start),
+            end=ms_to_vtt_timestamp(end),
+            text=text)
+        self.stream.write(cue + "\n\n")
+        self.stream.flush()
+
+        if self.vtt_path:
+            self.events.append(cue)
+            temp_path = self.vtt_path + ".tmp"
+            with open(temp_path, "wb") as vtt_file:
+                vtt_file.write(
+                    ("WEBVTT\n\n" + "\n\n".join(self.events) + "\n").encode(
+                        constants.DEFAULT_ENCODING))
+            # replace it at once so that players never read a partial file
+            os.replace(temp_path, self.vtt_path)
+
+
+def live_speech_to_text(  # pylint: disable=too-many-arguments, too-many-locals, too-many-statements
+        stream,
+        recognizer,
+        suffix,
+        writer,
+        sample_rate=16000,
+        concurrency=constants.DEFAULT_CONCURRENCY,
+        max_latency=constants.DEFAULT_LIVE_LATENCY,
+        energy_threshold=constants.DEFAULT_ENERGY_THRESHOLD,
+        min_region_size=constants.DEFAULT_MIN_REGION_SIZE,
+        max_region_size=constants.DEFAULT_MAX_REGION_SIZE,
+        max_continuous_silence=constants.DEFAULT_CONTINUOUS_SILENCE,
+        mode=auditok.StreamTokenizer.STRICT_MIN_LENGTH):
+    """
+    Give a raw s16le PCM stream, detect the speech regions continuously
+    and send every closed region to the speech-to-text api at once.
+    Results are emitted in timeline order. Results slower than max_latency
+    seconds are dropped to keep the end-to-end latency bounded.
+    """
+    asource = auditok.ADSFactory.ads(
+        audio_source=PipeAudioSource(
+            stream=stream,
+            sampling_rate=sample_rate),
+        block_dur=0.01)
+    validator = auditok.AudioEnergyValidator(
+        sample_width=asource.get_sample_width(),
+        energy_threshold=energy_threshold)
+    tokenizer = auditok.StreamTokenizer(
+        validator=validator,
+        min_length=int(min_region_size * 100),
+        max_length=int(max_region_size * 100),
+        max_continuous_silence=int(max_continuous_silence * 100),
+        mode=mode)
+
+    pool = multiprocessing.Pool(concurrency)
+    pending = collections.deque()
+    condition = threading.Condition()
+    is_finished = []
+
+    def dispatch(data, start, end):
+        task = pool.apply_async(recognize_pcm,
+                                args=(recognizer, b"".join(data), suffix, sample_rate))
+        with condition:
+            pending.append((start * 10, end * 10, task, time.time()))
+            condition.notify()
+
+    def emit():
+        while True:
+            with condition:
+                while not pending and not is_finished:
+                    condition.wait()
+                if not pending:
+                    return
+                start, end, task, dispatch_time = pending.popleft()
+            timeout = max_latency - (time.time() - dispatch_time)
+            try:
+                result = task.get(timeout=max(timeout, 0.0))
+            except multiprocessing.TimeoutError:
+                print(_("Warning: Region {start} --> {end} exceeds the latency limit. "
+                        "Dropped.").format(start=ms_to_vtt_timestamp(start),
+                                           end=ms_to_vtt_timestamp(end)),
+                      file=sys.stderr)
+                result = None
+            except Exception as error:  # pylint: disable=broad-except
+                print(error, file=sys.stderr)
+                result = None
+            if result:
+                writer(start, end, result)
+
+    emitter = threading.Thread(target=emit)
+    emitter.daemon = True
+    emitter.start()
+
+    try:
+        asource.open()
+        tokenizer.tokenize(asource, callback=dispatch)
+        asource.close()
+    except KeyboardInterrupt:
+        print(_("\nKeyboardInterrupt. Stop reading the stream."), file=sys.stderr)
+
+    with condition:
+        is_finished.append(True)
+        condition.notify()
+    try:
+        emitter.join()
+    except KeyboardInterrupt:
+        pass
+    pool.terminate()
+    pool.join()
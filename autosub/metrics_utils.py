@@ -0,0 +1,652 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Defines autosub's metrics functionality.
+"""
+# Import built-in modules
+import os
+import sys
+import json
+import collections
+import functools
+import threading
+import time
+
+# Import third-party modules
+
+
+# Any changes to the path and your own modules
+from autosub import audio_utils
+from autosub import constants
+from autosub import lazy_utils
+from autosub import metadata
+from autosub import profile_utils
+
+if lazy_utils.is_module_available("opentelemetry.trace"):
+    otel_trace = lazy_utils.lazy_import("opentelemetry.trace")  # pylint: disable=invalid-name
+else:
+    otel_trace = None  # pylint: disable=invalid-name
+
+try:
+    import resource
+except ImportError:
+    resource = None  # pylint: disable=invalid-name
+
+# upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# number of the latest values kept for the percentiles
+RECENT_SIZE = 10000
+
+# the metrics recorder of the current run, None when metrics are disabled
+RECORDER = None
+
+LOCAL_DATA = threading.local()
+
+
+def percentile(sorted_values, ratio):
+    """
+    Return the nearest-rank percentile of a sorted list.
+    """
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(ratio * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def get_peak_rss_kb():
+    """
+    Return the peak resident set size of this process and its reaped children in KiB.
+    """
+    if not resource:
+        return {"self": None, "children": None}
+    scale = 1024 if sys.platform == "darwin" else 1
+    return {"self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale}
+
+
+def get_children_cpu_time():
+    """
+    Return the cpu time of the reaped child processes.
+    """
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+class Histogram:
+    """
+    Class for a latency histogram with cumulative buckets
+    and the latest values for the percentiles.
+    """
+    __slots__ = ("count", "sum", "min", "max", "bucket_counts", "recent")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.recent = collections.deque(maxlen=RECENT_SIZE)
+
+    def observe(self, value):
+        """
+        Add a value.
+        """
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+        self.recent.append(value)
+
+    def summary(self):
+        """
+        Return the count, sum, min, max, p50, p95 and buckets as a dict.
+        """
+        sorted_values = sorted(self.recent)
+        buckets = {str(bound): count
+                   for bound, count in zip(LATENCY_BUCKETS, self.bucket_counts)}
+        buckets["+Inf"] = self.count
+        return {"count": self.count,
+                "sum": self.sum,
+                "min": self.min,
+                "max": self.max,
+                "p50": percentile(sorted_values, 0.5),
+                "p95": percentile(sorted_values, 0.95),
+                "buckets": buckets}
+
+
+class Metrics:  # pylint: disable=too-many-instance-attributes
+    """
+    Class for the stage, fragment, api and queue metrics of a run.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.start_perf = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.start_children_cpu = get_children_cpu_time()
+        self.stages = {}
+        self.fragments = {}
+        self.apis = {}
+        self.queues = {}
+        self.inflight = collections.Counter()
+
+    def get_stage(self, name):
+        """
+        Return a stage item. Call it with the lock acquired.
+        """
+        if name not in self.stages:
+            self.stages[name] = {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                 "children_cpu_s": 0.0, "bytes_in": 0, "bytes_out": 0}
+        return self.stages[name]
+
+    def add_stage(self, name, wall_time, cpu_time, children_cpu_time):
+        """
+        Add a stage call.
+        """
+        with self.lock:
+            item = self.get_stage(name)
+            item["calls"] += 1
+            item["wall_s"] += wall_time
+            item["cpu_s"] += cpu_time
+            item["children_cpu_s"] += children_cpu_time
+
+    def add_bytes(self, name, bytes_in=0, bytes_out=0):
+        """
+        Add the bytes read and written by a stage.
+        """
+        with self.lock:
+            item = self.get_stage(name)
+            item["bytes_in"] += bytes_in
+            item["bytes_out"] += bytes_out
+
+    def add_fragment(self, name, sample):
+        """
+        Add a fragment sample measured by a MeasuredCall.
+        """
+        with self.lock:
+            if name not in self.fragments:
+                self.fragments[name] = {"count": 0, "wall_s": Histogram(), "cpu_s": 0.0,
+                                        "bytes_in": 0, "bytes_out": 0,
+                                        "attempts": 0, "retries": 0, "failures": 0}
+            item = self.fragments[name]
+            item["count"] += 1
+            item["wall_s"].observe(sample["wall_s"])
+            item["cpu_s"] += sample["cpu_s"]
+            item["bytes_in"] += sample["bytes_in"]
+            item["bytes_out"] += sample["bytes_out"]
+            attempts = len(sample["calls"])
+            item["attempts"] += attempts
+            item["retries"] += max(0, attempts - 1)
+            if not sample["is_ok"]:
+                item["failures"] += 1
+            if name in self.queues and self.queues[name]["pending"] > 0:
+                self.queues[name]["pending"] -= 1
+
+    def get_api(self, provider):
+        """
+        Return an api item. Call it with the lock acquired.
+        """
+        if provider not in self.apis:
+            self.apis[provider] = {"calls": 0, "errors": 0, "codes": {},
+                                   "latency_s": Histogram(),
+                                   "bytes_out": 0, "bytes_in": 0,
+                                   "hedges": 0, "hedge_wins": 0}
+        return self.apis[provider]
+
+    def add_api_call(self,  # pylint: disable=too-many-arguments
+                     provider,
+                     latency,
+                     code=None,
+                     is_error=False,
+                     bytes_out=0,
+                     bytes_in=0):
+        """
+        Add an api request.
+        """
+        with self.lock:
+            item = self.get_api(provider)
+            item["calls"] += 1
+            if is_error:
+                item["errors"] += 1
+            if code is not None:
+                item["codes"][str(code)] = item["codes"].get(str(code), 0) + 1
+            item["latency_s"].observe(latency)
+            item["bytes_out"] += bytes_out
+            item["bytes_in"] += bytes_in
+
+    def add_hedge(self, provider, is_won=False):
+        """
+        Add a hedged duplicate request and whether it won.
+        """
+        with self.lock:
+            item = self.get_api(provider)
+            item["hedges"] += 1
+            if is_won:
+                item["hedge_wins"] += 1
+
+    def start_queue(self, name, total, workers, provider=None):
+        """
+        Add the pending fragments of a worker pool stage.
+        """
+        with self.lock:
+            if name in self.queues:
+                queue = self.queues[name]
+                queue["pending"] += total
+                queue["workers"] = max(queue["workers"], workers)
+                queue["provider"] = provider
+            else:
+                self.queues[name] = {"pending": total, "workers": workers, "provider": provider}
+
+    def set_queue_depth(self, name, depth):
+        """
+        Set the depth of a queue without workers, e.g. the batch files.
+        """
+        with self.lock:
+            self.queues[name] = {"pending": depth, "workers": 0, "provider": None}
+
+    def add_inflight(self, provider, value):
+        """
+        Change the count of the in-flight requests made by this process.
+        """
+        with self.lock:
+            self.inflight[provider] += value
+
+    def get_inflight(self):
+        """
+        Return the in-flight requests of each provider.
+        Requests in pool workers are estimated by the pending fragments and workers.
+        """
+        with self.lock:
+            result = dict(self.inflight)
+            for queue in self.queues.values():
+                if queue["provider"]:
+                    result[queue["provider"]] = result.get(queue["provider"], 0) + \
+                        min(queue["pending"], queue["workers"])
+            return result
+
+    def report(self):
+        """
+        Return the metrics as a json-serializable dict.
+        """
+        inflight_dict = self.get_inflight()
+        with self.lock:
+            fragments = {}
+            for name, item in self.fragments.items():
+                fragments[name] = dict(item)
+                fragments[name]["wall_s"] = item["wall_s"].summary()
+            apis = {}
+            for name, item in self.apis.items():
+                apis[name] = dict(item)
+                apis[name]["codes"] = dict(item["codes"])
+                apis[name]["latency_s"] = item["latency_s"].summary()
+            return {"autosub_version": metadata.VERSION,
+                    "argv": sys.argv[1:],
+                    "start_time": self.start_time,
+                    "wall_s": time.perf_counter() - self.start_perf,
+                    "cpu_s": time.process_time() - self.start_cpu,
+                    "children_cpu_s": get_children_cpu_time() - self.start_children_cpu,
+                    "peak_rss_kb": get_peak_rss_kb(),
+                    "stages": {name: dict(item) for name, item in self.stages.items()},
+                    "fragments": fragments,
+                    "apis": apis,
+                    "queues": {name: item["pending"] for name, item in self.queues.items()},
+                    "inflight": inflight_dict}
+
+    def write(self, path):
+        """
+        Write the report to a json file.
+        """
+        with open(path, "wb") as report_file:
+            report_file.write(json.dumps(
+                self.report(),
+                indent=4,
+                ensure_ascii=False).encode(constants.DEFAULT_ENCODING))
+
+
+def enable():
+    """
+    Start recording the metrics and return the recorder.
+    """
+    global RECORDER  # pylint: disable=global-statement
+    if RECORDER is None:
+        RECORDER = Metrics()
+    return RECORDER
+
+
+def disable():
+    """
+    Stop recording the metrics.
+    """
+    global RECORDER  # pylint: disable=global-statement
+    RECORDER = None
+
+
+class Stage:
+    """
+    Class for a context manager which records the wall and cpu time of a stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.start_perf = 0.0
+        self.start_cpu = 0.0
+        self.start_children_cpu = 0.0
+        self.span = None
+
+    def __enter__(self):
+        if otel_trace:
+            self.span = otel_trace.get_tracer("autosub").start_as_current_span(
+                "autosub." + self.name)
+            self.span.__enter__()
+        self.start_perf = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.start_children_cpu = get_children_cpu_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        recorder = RECORDER
+        if recorder:
+            recorder.add_stage(self.name,
+                               time.perf_counter() - self.start_perf,
+                               time.process_time() - self.start_cpu,
+                               get_children_cpu_time() - self.start_children_cpu)
+        if self.span:
+            self.span.__exit__(exc_type, exc_value, traceback)
+        return False
+
+
+class NullStage:
+    """
+    Class for a context manager which does nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+def stage(name):
+    """
+    Return a context manager which records a stage if metrics are enabled.
+    """
+    if RECORDER is None:
+        return NULL_STAGE
+    return Stage(name)
+
+
+def timed_stage(name):
+    """
+    Return a decorator which records the decorated function as a stage.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if RECORDER is None:
+                return func(*args, **kwargs)
+            with Stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_bytes(name, bytes_in=0, bytes_out=0):
+    """
+    Add the bytes read and written by a stage if metrics are enabled.
+    """
+    if RECORDER is not None:
+        RECORDER.add_bytes(name, bytes_in, bytes_out)
+
+
+class MeasuredResult:  # pylint: disable=too-few-public-methods
+    """
+    Class for a worker result with its metrics sample.
+    """
+    __slots__ = ("result", "sample")
+
+    def __init__(self, result, sample):
+        self.result = result
+        self.sample = sample
+
+
+class MeasuredCall:  # pylint: disable=too-few-public-methods
+    """
+    Class for a picklable wrapper which measures a call in a worker process.
+    """
+
+    def __init__(self, func, name):
+        self.func = func
+        self.name = name
+
+    def __call__(self, *args, **kwargs):
+        sample = {"name": self.name, "wall_s": 0.0, "cpu_s": 0.0,
+                  "bytes_in": 0, "bytes_out": 0, "calls": [], "hedges": [], "is_ok": False}
+        if args and isinstance(args[0], audio_utils.AudioFragment):
+            sample["bytes_in"] = len(args[0])
+        elif args and isinstance(args[0], str) and os.path.isfile(args[0]):
+            sample["bytes_in"] = os.path.getsize(args[0])
+        LOCAL_DATA.sample = sample
+        start_perf = time.perf_counter()
+        start_cpu = time.process_time() + get_children_cpu_time()
+        try:
+            result = self.func(*args, **kwargs)
+        finally:
+            LOCAL_DATA.sample = None
+            sample["wall_s"] = time.perf_counter() - start_perf
+            sample["cpu_s"] = time.process_time() + get_children_cpu_time() - start_cpu
+        if isinstance(result, audio_utils.AudioFragment):
+            sample["bytes_out"] = len(result)
+        elif isinstance(result, str) and os.path.isfile(result):
+            sample["bytes_out"] = os.path.getsize(result)
+        sample["is_ok"] = bool(result)
+        return MeasuredResult(result, sample)
+
+
+def measure(func, name, total=0, workers=0, provider=None):
+    """
+    Give a worker function and return a measured one if metrics are enabled,
+    which is also profiled if profiling is enabled.
+    If total is given, count the pending fragments of the stage,
+    and estimate the in-flight requests of the provider by the workers.
+    """
+    recorder = RECORDER
+    if recorder is None:
+        return profile_utils.wrap(func)
+    if total:
+        recorder.start_queue(name, total, workers, provider)
+    return profile_utils.wrap(MeasuredCall(func, name))
+
+
+def collect(result):
+    """
+    Give a worker result, record its sample if it has one and return the original result.
+    """
+    result = profile_utils.collect(result)
+    if not isinstance(result, MeasuredResult):
+        return result
+    recorder = RECORDER
+    if recorder is not None:
+        recorder.add_fragment(result.sample["name"], result.sample)
+        for call in result.sample["calls"]:
+            recorder.add_api_call(**call)
+        for provider, is_won in result.sample["hedges"]:
+            recorder.add_hedge(provider, is_won)
+    return result.result
+
+
+def record_call(provider,  # pylint: disable=too-many-arguments
+                latency,
+                code=None,
+                is_error=False,
+                bytes_out=0,
+                bytes_in=0):
+    """
+    Record an api request in the current fragment sample
+    or directly in the recorder.
+    """
+    call = {"provider": provider,
+            "latency": latency,
+            "code": code,
+            "is_error": is_error,
+            "bytes_out": bytes_out,
+            "bytes_in": bytes_in}
+    sample = getattr(LOCAL_DATA, "sample", None)
+    if sample is not None:
+        sample["calls"].append(call)
+    elif RECORDER is not None:
+        RECORDER.add_api_call(**call)
+
+
+def record_hedge(provider, is_won=False):
+    """
+    Record a hedged duplicate request in the current fragment sample
+    or directly in the recorder.
+    """
+    sample = getattr(LOCAL_DATA, "sample", None)
+    if sample is not None:
+        sample["hedges"].append((provider, is_won))
+    elif RECORDER is not None:
+        RECORDER.add_hedge(provider, is_won)
+
+
+class InflightCall:
+    """
+    Class for a context manager which counts an in-flight request made by this process.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    def __enter__(self):
+        if RECORDER is not None:
+            RECORDER.add_inflight(self.provider, 1)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if RECORDER is not None:
+            RECORDER.add_inflight(self.provider, -1)
+        return False
+
+
+def inflight(provider):
+    """
+    Return a context manager which counts an in-flight request if metrics are enabled.
+    """
+    if RECORDER is None:
+        return NULL_STAGE
+    return InflightCall(provider)
+
+
+def set_queue_depth(name, depth):
+    """
+    Set the depth of a queue if metrics are enabled.
+    """
+    if RECORDER is not None:
+        RECORDER.set_queue_depth(name, depth)
+
+
+def escape_label(value):
+    """
+    Escape a Prometheus label value.
+    """
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def render_prometheus(recorder):  # pylint: disable=too-many-locals
+    """
+    Give a recorder and return its metrics in the Prometheus text exposition format.
+    """
+    report = recorder.report()
+    lines = []
+
+    def add_samples(name, samples):
+        for labels, value in samples:
+            if labels:
+                label_str = "{" + ",".join(
+                    "{key}=\"{value}\"".format(key=key, value=escape_label(value))
+                    for key, value in labels) + "}"
+            else:
+                label_str = ""
+            lines.append("{name}{labels} {value}".format(name=name, labels=label_str,
+                                                         value=value))
+
+    def add(name, metric_type, help_text, samples):
+        lines.append("# HELP {name} {help}".format(name=name, help=help_text))
+        lines.append("# TYPE {name} {type}".format(name=name, type=metric_type))
+        add_samples(name, samples)
+
+    add("autosub_uptime_seconds", "gauge",
+        "Seconds since the metrics started.",
+        [((), report["wall_s"])])
+    add("autosub_process_cpu_seconds_total", "counter",
+        "CPU seconds of the main process.",
+        [((), report["cpu_s"])])
+    if report["peak_rss_kb"]["self"] is not None:
+        add("autosub_process_peak_rss_bytes", "gauge",
+            "Peak resident set size of the main process.",
+            [((), report["peak_rss_kb"]["self"] * 1024)])
+
+    stages = sorted(report["stages"].items())
+    add("autosub_stage_calls_total", "counter", "Calls of each stage.",
+        [((("stage", name), ), item["calls"]) for name, item in stages])
+    add("autosub_stage_seconds_total", "counter", "Wall seconds spent in each stage.",
+        [((("stage", name), ), item["wall_s"]) for name, item in stages])
+    add("autosub_stage_bytes_total", "counter", "Bytes read and written by each stage.",
+        [((("stage", name), ("direction", direction)), item["bytes_" + direction])
+         for name, item in stages for direction in ("in", "out")])
+
+    fragments = sorted(report["fragments"].items())
+    add("autosub_fragments_total", "counter", "Audio fragments processed by each stage.",
+        [((("stage", name), ), item["count"]) for name, item in fragments])
+    add("autosub_fragment_failures_total", "counter",
+        "Audio fragments without a result.",
+        [((("stage", name), ), item["failures"]) for name, item in fragments])
+    add("autosub_fragment_retries_total", "counter",
+        "Retried api requests of the audio fragments.",
+        [((("stage", name), ), item["retries"]) for name, item in fragments])
+
+    apis = sorted(report["apis"].items())
+    add("autosub_api_requests_total", "counter",
+        "Api requests by provider and result code "
+        "(HTTP status, Baidu err_no or Xun Fei Yun code).",
+        [((("provider", name), ("code", code)), count)
+         for name, item in apis for code, count in sorted(item["codes"].items())] +
+        [((("provider", name), ("code", "none")),
+          item["calls"] - sum(item["codes"].values()))
+         for name, item in apis if item["calls"] > sum(item["codes"].values())])
+    add("autosub_api_errors_total", "counter", "Failed api requests by provider.",
+        [((("provider", name), ), item["errors"]) for name, item in apis])
+    add("autosub_api_latency_seconds", "histogram", "Api request latency.", [])
+    for name, item in apis:
+        # the buckets, sum and count samples of a histogram share its family
+        labels = (("provider", name), )
+        add_samples("autosub_api_latency_seconds_bucket",
+                    [(labels + (("le", bound), ), count)
+                     for bound, count in item["latency_s"]["buckets"].items()])
+        add_samples("autosub_api_latency_seconds_sum", [(labels, item["latency_s"]["sum"])])
+        add_samples("autosub_api_latency_seconds_count",
+                    [(labels, item["latency_s"]["count"])])
+    add("autosub_api_hedged_requests_total", "counter",
+        "Hedged duplicate api requests by provider.",
+        [((("provider", name), ), item["hedges"]) for name, item in apis])
+    add("autosub_api_hedge_wins_total", "counter",
+        "Hedged duplicate api requests which answered first.",
+        [((("provider", name), ), item["hedge_wins"]) for name, item in apis])
+    add("autosub_api_inflight_requests", "gauge",
+        "In-flight api requests by provider. "
+        "Requests in pool workers are estimated by the pending fragments.",
+        [((("provider", name), ), value) for name, value in sorted(report["inflight"].items())])
+    add("autosub_queue_depth", "gauge", "Pending items of each queue.",
+        [((("queue", name), ), value) for name, value in sorted(report["queues"].items())])
+    return "\n".join(lines) + "\n"
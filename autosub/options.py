@@ -8,9 +8,6 @@ from __future__ import absolute_import, print_function, unicode_literals
 import argparse
 import gettext
 
-# Import third-party modules
-from googletrans import constants as gt_constants
-
 # Any changes to the path and your own modules
 from autosub import metadata
 from autosub import constants
@@ -88,6 +85,15 @@ def get_cmd_parser():  # pylint: disable=too-many-statements
     list_group = parser.add_argument_group(
         _('List Options'),
         _('List all available arguments.'))
+    live_group = parser.add_argument_group(
+        _('Live Options'),
+        _('Options to control live/streaming subtitles.'))
+    server_group = parser.add_argument_group(
+        _('Server Options'),
+        _('Options to control the local job server.'))
+    metrics_group = parser.add_argument_group(
+        _('Metrics Options'),
+        _('Options to control the run metrics.'))
 
     input_group.add_argument(
         '-i', '--input',
@@ -96,8 +102,24 @@ def get_cmd_parser():  # pylint: disable=too-many-statements
                "that needs to generate subtitles. "
                "When it is a subtitles file, "
                "the program will only translate it. "
+               "When it is a directory, a glob pattern "
+               "or a manifest file path prefixed with \"@\", "
+               "the program will process all the files in the batch mode. "
+               "Subtitles files in a directory are skipped. "
                "(arg_num = 1)"))
 
+    input_group.add_argument(
+        '-bc', '--batch-concurrency',
+        metavar='integer',
+        type=int,
+        default=constants.DEFAULT_BATCH_CONCURRENCY,
+        help=_("Number of input files processed at the same time "
+               "in the batch mode. All the files share the same "
+               "ffmpeg and Speech-to-Text worker pools "
+               "limited by \"-ac\"/\"--audio-concurrency\" "
+               "and \"-sc\"/\"--speech-concurrency\". "
+               "(arg_num = 1) (default: %(default)s)"))
+
     input_group.add_argument(
         '-er', '--ext-regions',
         metavar=_('path'),
@@ -197,6 +219,7 @@ def get_cmd_parser():  # pylint: disable=too-many-statements
     output_group.add_argument(
         '-F', '--format',
         metavar=_('format'),
+        nargs='+',
         help=_("Destination subtitles format. "
                "If not provided, use the extension "
                "in the \"-o\"/\"--output\" arg. "
@@ -204,7 +227,9 @@ def get_cmd_parser():  # pylint: disable=too-many-statements
                "the extension name, use \"{dft}\" instead. "
                "In this case, if \"-i\"/\"--input\" arg is a subtitles file, "
                "use the same extension from the subtitles file. "
-               "(arg_num = 1) (default: {dft})").format(
+               "Give more formats to output every file in all of them "
+               "from the same run. "
+               "(arg_num >= 1) (default: {dft})").format(
                    dft=constants.DEFAULT_SUBTITLES_FORMAT))
 
     output_group.add_argument(
@@ -310,6 +335,51 @@ def get_cmd_parser():  # pylint: disable=too-many-statements
         help=_("Drop any regions without speech recognition result. "
                "(arg_num = 0)"))
 
+    speech_group.add_argument(
+        '-pks', '--pack-size',
+        metavar='second',
+        type=float,
+        default=0.0,
+        help=_("Pack adjacent short speech regions into one Speech-to-Text request "
+               "not longer than this size, then split the transcript back "
+               "by the word timestamps or the text length. "
+               "Keep it under the API's audio length limit. "
+               "0 means disabled. "
+               "(arg_num = 1) (default: %(default)s)"))
+
+    speech_group.add_argument(
+        '-pkg', '--pack-gap',
+        metavar='second',
+        type=float,
+        default=constants.DEFAULT_PACK_GAP,
+        help=_("Maximum silence gap between the speech regions "
+               "packed by \"-pks\"/\"--pack-size\". "
+               "(arg_num = 1) (default: %(default)s)"))
+
+    speech_group.add_argument(
+        '-wt', '--word-timing',
+        nargs='?', metavar='second',
+        type=float,
+        const=constants.DEFAULT_WORD_SPLIT_GAP,
+        help=_("Refine the subtitles timing by the word timestamps "
+               "from the Speech-to-Text full result "
+               "and split the events at the word gaps not smaller than this size. "
+               "No extra audio decoding is needed. "
+               "Currently support: gcsv1, xfyun. "
+               "(arg_num = 0 or 1) (const: %(const)s)"))
+
+    speech_group.add_argument(
+        '-hdg', '--hedge',
+        nargs='*', metavar='[provider=]ratio',
+        help=_("Hedge the slow Speech-to-Text requests. "
+               "When a request takes longer than the observed p95 latency, "
+               "send a duplicate one and use the first response. "
+               "The ratio is the maximum extra requests ratio. "
+               "Give \"provider=ratio\" to set it for a specific api. "
+               "Currently support: gsv2, gcsv1 (API key), baidu. "
+               "If arg_num is 0, use the default ratio {ratio}. "
+               "(arg_num >= 0)").format(ratio=constants.DEFAULT_HEDGE_RATIO))
+
     speech_group.add_argument(
         '-sc', '--speech-concurrency',
         metavar='integer',
@@ -322,13 +392,30 @@ def get_cmd_parser():  # pylint: disable=too-many-statements
         '-tapi', '--translation-api',
         metavar=_('API_code'),
         default='pygt',
-        choices=["pygt", "man"],
+        choices=["pygt", "man", "http", "dict", "plugin"],
         help=_("Choose which translation API to use. "
                "Currently support: "
                "pygt: py-googletrans (https://py-googletrans.readthedocs.io/en/latest/). "
                "man: Manually translate the content by write a txt or docx file and then read it. "
+               "http: A LibreTranslate compatible machine translation service. "
+               "dict: Offline translation by a json dictionary of lines and words. "
+               "plugin: A python function like a local translation model. "
+               "The last three need \"-tconf\"/\"--translation-config\". "
                "(arg_num = 1) (default: %(default)s)"))
 
+    trans_group.add_argument(
+        '-tconf', '--translation-config',
+        nargs='?', metavar=_('path'),
+        const='trans_config.json',
+        help=_("Use a translator backend config file. "
+               "http: {\"api_url\": ..., \"api_key\": ...}. "
+               "dict: {\"dict_path\": ...} or {\"entries\": {...}}. "
+               "plugin: {\"module\": ..., \"function\": ...}, "
+               "the function gets a list of lines, src and dst "
+               "and returns the list of translated lines. "
+               "If arg_num is 0, use const path. "
+               "(arg_num = 0 or 1) (const: %(const)s)"))
+
     trans_group.add_argument(
         '-tf', '--translation-format',
         metavar=_('format'),
@@ -338,6 +425,17 @@ def get_cmd_parser():  # pylint: disable=too-many-statements
                "Currently support: docx, txt. "
                "(arg_num = 1) (default: %(default)s)"))
 
+    trans_group.add_argument(
+        '-tw', '--trans-watch',
+        action='store_true',
+        help=_("Export all the text with line ids at once for manual translation "
+               "and resume when the translated file "
+               "\"<output>.trans.done.<format>\" appears "
+               "instead of waiting for each request. "
+               "The file is polled with backoff. "
+               "Only affect \"-tapi man\". "
+               "(arg_num = 0)"))
+
     trans_group.add_argument(
         '-mts', '--max-trans-size',
         metavar='integer',
@@ -353,8 +451,26 @@ def get_cmd_parser():  # pylint: disable=too-many-statements
         default=constants.DEFAULT_SLEEP_SECONDS,
         help=_("(Experimental)Seconds for py-googletrans to sleep "
                "between two translation requests. "
+               "Used as the request rate limit "
+               "when \"-tqps\"/\"--trans-qps\" isn't given. "
                "(arg_num = 1) (default: %(default)s)"))
 
+    trans_group.add_argument(
+        '-tc', '--trans-concurrency',
+        metavar='integer',
+        type=int,
+        default=constants.DEFAULT_TRANS_CONCURRENCY,
+        help=_("Number of concurrent translation requests to make. "
+               "(arg_num = 1) (default: %(default)s)"))
+
+    trans_group.add_argument(
+        '-tqps', '--trans-qps',
+        metavar='float',
+        type=float,
+        help=_("Maximum translation requests per second. "
+               "0 means no limit. "
+               "(arg_num = 1) (default: 1 / \"-slp\"/\"--sleep-seconds\")"))
+
     trans_group.add_argument(
         '-surl', '--service-urls',
         metavar='URL',
@@ -367,8 +483,8 @@ def get_cmd_parser():  # pylint: disable=too-many-statements
     trans_group.add_argument(
         '-ua', '--user-agent',
         metavar='User-Agent headers',
-        default=gt_constants.DEFAULT_USER_AGENT,
         help=_("(Experimental)Customize py-googletrans User-Agent headers. "
+               "If not given, use the py-googletrans default one. "
                "Same docs above. "
                "(arg_num = 1)"))
 
@@ -568,6 +684,17 @@ def get_cmd_parser():  # pylint: disable=too-many-statements
                "Same attention above. "
                "(arg_num = 1) (default: %(default)s)"))
 
+    audio_prcs_group.add_argument(
+        '-dns', '--disable-native-split',
+        action='store_true',
+        help=_("Launch ffmpeg to split each audio fragment "
+               "even if the audio split command isn't modified. "
+               "By default, the input is decoded only once "
+               "and the fragments are sliced and encoded in process "
+               "when the API suffix is \".pcm\" or \".wav\", "
+               "or \".flac\" and \".ogg\" with the \"soundfile\" module installed. "
+               "(arg_num = 0)"))
+
     audio_prcs_group.add_argument(
         '-asf', '--api-suffix',
         metavar=_('file_suffix'),
@@ -700,4 +827,109 @@ def get_cmd_parser():  # pylint: disable=too-many-statements
                "Ref: https://cloud.google.com/speech-to-text/docs/languages "
                "(arg_num = 1) (default: %(default)s)"))
 
+    live_group.add_argument(
+        '-lv', '--live',
+        action='store_true',
+        help=_("Generate subtitles from a live stream in real time. "
+               "The arg of \"-i\"/\"--input\" can be any URL or file "
+               "that ffmpeg can read, e.g. RTMP/HLS, "
+               "or \"-\" for the raw s16le mono PCM from stdin "
+               "whose sample rate is the arg of \"-asr\"/\"--api-sample-rate\". "
+               "Subtitles events are written to stdout. "
+               "If \"-o\"/\"--output\" is given, "
+               "also write a rolling WebVTT file to it. "
+               "(arg_num = 0)"))
+
+    live_group.add_argument(
+        '-lvl', '--live-latency',
+        metavar=_('second'),
+        type=float,
+        default=constants.DEFAULT_LIVE_LATENCY,
+        help=_("Max seconds to wait for the speech-to-text result of a region "
+               "in the live mode. "
+               "A slower result will be dropped. "
+               "(arg_num = 1) (default: %(default)s)"))
+
+    live_group.add_argument(
+        '-lvw', '--live-window',
+        metavar='integer',
+        type=int,
+        default=constants.DEFAULT_LIVE_WINDOW,
+        help=_("Number of the latest events kept in the rolling WebVTT file "
+               "in the live mode. "
+               "0 means keeping all events. "
+               "(arg_num = 1) (default: %(default)s)"))
+
+    server_group.add_argument(
+        '-svr', '--server',
+        action='store_true',
+        help=_("Run as a long-running local job server "
+               "which keeps the worker pools warm between jobs. "
+               "Submit a job by \"POST /jobs\" with a json body "
+               "like {\"args\": [\"-i\", \"path\", \"-S\", \"en-US\"]}. "
+               "The audio command options, the server options "
+               "and the paths outside the current directory "
+               "are not allowed in a job. "
+               "Check it by \"GET /jobs/<id>\" "
+               "and fetch the output files by \"GET /jobs/<id>/result\". "
+               "Jobs run with the pools limited by "
+               "\"-ac\"/\"--audio-concurrency\" and \"-sc\"/\"--speech-concurrency\". "
+               "\"-bc\"/\"--batch-concurrency\" jobs run at the same time. "
+               "(arg_num = 0)"))
+
+    server_group.add_argument(
+        '-sva', '--server-address',
+        metavar='host:port',
+        default=constants.DEFAULT_SERVER_ADDRESS,
+        help=_("The address the job server listens on. "
+               "(arg_num = 1) (default: %(default)s)"))
+
+    server_group.add_argument(
+        '-svq', '--server-queue',
+        metavar=_('path'),
+        default=constants.DEFAULT_SERVER_QUEUE,
+        help=_("The json file to persist the job queue of the server. "
+               "Unfinished jobs in it are queued again after a restart. "
+               "(arg_num = 1) (default: %(default)s)"))
+
+    server_group.add_argument(
+        '-svt', '--server-token',
+        metavar='token',
+        help=_("The token the job server requires in the "
+               "\"Authorization: Bearer <token>\" header of each request. "
+               "If not given, a random one is generated and printed at the start. "
+               "(arg_num = 1)"))
+
+    metrics_group.add_argument(
+        '-mtj', '--metrics-json',
+        metavar=_('path'),
+        help=_("Write a JSON report of the run to the path when it ends. "
+               "It includes the wall time, CPU time and bytes of each stage, "
+               "the time, retries and failures of the audio fragments, "
+               "and the latency histograms and result codes of the API requests. "
+               "If OpenTelemetry is installed, the stages are also traced as spans. "
+               "(arg_num = 1)"))
+
+    metrics_group.add_argument(
+        '-mtp', '--metrics-port',
+        metavar='[host:]port',
+        help=_("Serve the live metrics in the Prometheus text exposition format "
+               "at http://host:port/metrics during the run, "
+               "e.g. fragments, API requests by result code, "
+               "in-flight API requests and queue depths. "
+               "The host is 127.0.0.1 if not given. "
+               "(arg_num = 1)"))
+
+    metrics_group.add_argument(
+        '-prf', '--profile',
+        metavar=_('path'),
+        help=_("Profile the run with cProfile, "
+               "including the worker processes of the auditok options optimization, "
+               "the audio conversion and the speech-to-text, "
+               "and write the merged stats to the path when it ends. "
+               "The stats can be read by the \"pstats\" module. "
+               "The folded stacks for flamegraph tools "
+               "are written to the same path with the \".folded\" extension. "
+               "(arg_num = 1)"))
+
     return parser
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Defines autosub's profiling functionality.
+"""
+# Import built-in modules
+import collections
+import os
+import sys
+import sysconfig
+import threading
+
+# Import third-party modules
+
+
+# Any changes to the path and your own modules
+from autosub import lazy_utils
+
+cProfile = lazy_utils.lazy_import("cProfile")  # pylint: disable=invalid-name
+pstats = lazy_utils.lazy_import("pstats")  # pylint: disable=invalid-name
+
+# the profiler of the current run, None when profiling is disabled
+PROFILER = None
+
+# stacks deeper than it are cut in the folded output
+MAX_STACK_DEPTH = 64
+
+# stacks walked at most for the folded output
+MAX_WALKED_STACKS = 1000000
+
+# the directory of the autosub package
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ProfiledResult:  # pylint: disable=too-few-public-methods
+    """
+    Class for a worker result with its profile stats.
+    It can be loaded by pstats.Stats directly.
+    """
+    __slots__ = ("result", "stats")
+
+    def __init__(self, result, stats):
+        self.result = result
+        self.stats = stats
+
+    def create_stats(self):
+        """
+        Do nothing. The stats are created in the worker.
+        """
+
+
+class ProfiledCall:  # pylint: disable=too-few-public-methods
+    """
+    Class for a picklable wrapper which profiles a call in a worker process.
+    """
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, *args, **kwargs):
+        profiler = cProfile.Profile()
+        try:
+            result = profiler.runcall(self.func, *args, **kwargs)
+        except ValueError:
+            # another profiler is active in this process
+            return ProfiledResult(self.func(*args, **kwargs), {})
+        profiler.create_stats()
+        return ProfiledResult(result, profiler.stats)
+
+
+class Profiler:
+    """
+    Class for profiling the main process, its threads and the worker results.
+    """
+
+    def __init__(self):
+        self.profilers = []
+        self.stats = pstats.Stats()
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Start profiling the current thread and the threads started later.
+        """
+        self.start_thread()
+        threading.setprofile(self.thread_hook)
+
+    def thread_hook(self, *args):  # pylint: disable=unused-argument
+        """
+        Start profiling a new thread on its first event.
+        """
+        sys.setprofile(None)
+        self.start_thread()
+
+    def start_thread(self):
+        """
+        Start profiling the current thread.
+        """
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # a single profiler already covers all the threads
+            return
+        with self.lock:
+            self.profilers.append(profiler)
+
+    def add(self, stats):
+        """
+        Merge the stats of a worker call.
+        """
+        if stats:
+            with self.lock:
+                self.stats.add(ProfiledResult(None, stats))
+
+    def stop(self):
+        """
+        Stop profiling and merge all the stats.
+        """
+        threading.setprofile(None)
+        with self.lock:
+            for profiler in self.profilers:
+                profiler.disable()
+                self.stats.add(profiler)
+            self.profilers = []
+
+    def write(self, path):
+        """
+        Write the stats in the pstats format to the path,
+        and the folded stacks for flamegraph tools next to it.
+        Return the folded stacks file path.
+        """
+        self.stop()
+        self.stats.dump_stats(path)
+        folded_path = os.path.splitext(path)[0] + ".folded"
+        if folded_path == path:
+            folded_path = path + ".folded"
+        with open(folded_path, "w", encoding="utf-8") as folded_file:
+            for stack, value in sorted(get_folded_stacks(self.stats.stats).items()):
+                folded_file.write("{stack} {value}\n".format(stack=stack, value=value))
+        return folded_path
+
+
+def func_label(func, shortened_paths=()):
+    """
+    Return a flamegraph frame label of a pstats function key.
+    The file path is shortened by the first matched path.
+    """
+    filename, line, name = func
+    if filename == "~":
+        label = name
+    else:
+        for path in shortened_paths:
+            if filename.startswith(path + os.sep):
+                filename = os.path.relpath(filename, path)
+                break
+        label = "{name} ({file}:{line})".format(name=name, file=filename, line=line)
+    return label.replace(";", ",")
+
+
+def get_call_graph(stats):
+    """
+    Give pstats stats and return the callees of each function
+    with the time of each call edge, and the functions without callers.
+    """
+    callees = {}
+    roots = []
+    for func, (_cc, _nc, _tt, _ct, callers) in stats.items():
+        has_caller = False
+        for caller, edge in callers.items():
+            if caller in stats and caller != func:
+                callees.setdefault(caller, []).append((func, edge[3]))
+                has_caller = True
+        if not has_caller:
+            roots.append(func)
+    return callees, roots
+
+
+def walk_stacks(stats, callees, roots, labels):
+    """
+    Give pstats stats, the call graph and the label of each function,
+    return a dict of the folded stacks and their self time in microseconds.
+    It walks every simple call path which keeps at least 1 microsecond.
+    The paths can grow exponentially on a dense call graph,
+    so it stops after MAX_WALKED_STACKS stacks.
+    """
+    folded = collections.Counter()
+    # depth-first walk with the stack labels, the visited functions and the time share
+    todo = [(func, [labels[func]], {func}, 1.0) for func in roots]
+    walked = 0
+    while todo and walked < MAX_WALKED_STACKS:
+        walked += 1
+        func, stack, visited, ratio = todo.pop()
+        self_time = stats[func][2] * ratio
+        if self_time >= 1e-6:
+            folded[";".join(stack)] += int(self_time * 1e6)
+        if len(stack) >= MAX_STACK_DEPTH:
+            continue
+        for callee, edge_time in callees.get(func, ()):
+            callee_time = stats[callee][3]
+            # the callee's time share on this stack is ratio * edge_time
+            if callee in visited or callee_time <= 0 or ratio * edge_time < 1e-6:
+                continue
+            todo.append((callee,
+                         stack + [labels[callee]],
+                         visited | {callee},
+                         ratio * edge_time / callee_time))
+    return folded
+
+
+def get_folded_stacks(stats):
+    """
+    Give pstats stats and return a dict of the folded stacks
+    and their self time in microseconds.
+    cProfile only records the callers of each function,
+    so a function's time is split among the stacks
+    in proportion to the time spent on each call edge.
+    """
+    paths = sysconfig.get_paths()
+    shortened_paths = sorted({PACKAGE_PATH, paths["purelib"], paths["platlib"], paths["stdlib"]},
+                             key=len, reverse=True)
+    labels = {func: func_label(func, shortened_paths) for func in stats}
+    callees, roots = get_call_graph(stats)
+    folded = walk_stacks(stats, callees, roots, labels)
+    return {key: value for key, value in folded.items() if value > 0}
+
+
+def enable():
+    """
+    Start profiling and return the profiler.
+    """
+    global PROFILER  # pylint: disable=global-statement
+    if PROFILER is None:
+        PROFILER = Profiler()
+        PROFILER.start()
+    return PROFILER
+
+
+def wrap(func):
+    """
+    Give a worker function and return a profiled one if profiling is enabled.
+    """
+    if PROFILER is None:
+        return func
+    return ProfiledCall(func)
+
+
+def collect(result):
+    """
+    Give a worker result, merge its stats if it has them and return the original result.
+    """
+    if not isinstance(result, ProfiledResult):
+        return result
+    profiler = PROFILER
+    if profiler is not None:
+        profiler.add(result.stats)
+    return result.result
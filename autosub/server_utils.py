@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Defines autosub's local job server functionality.
+"""
+# Import built-in modules
+import os
+import sys
+import gettext
+import hmac
+import ipaddress
+import json
+import collections
+import multiprocessing
+import secrets
+import threading
+import time
+import uuid
+import socketserver
+from http import server
+
+# Any changes to the path and your own modules
+from autosub import api_baidu
+from autosub import cmdline_utils
+from autosub import core
+from autosub import options
+from autosub import constants
+from autosub import exceptions
+from autosub import lazy_utils
+from autosub import metrics_utils
+from autosub import sub_utils
+
+pysubs2 = lazy_utils.lazy_import("pysubs2")  # pylint: disable=invalid-name
+
+SERVER_UTILS_TEXT = gettext.translation(domain=__name__,
+                                        localedir=constants.LOCALE_PATH,
+                                        languages=[constants.CURRENT_LOCALE],
+                                        fallback=True)
+
+_ = SERVER_UTILS_TEXT.gettext
+
+# options a job can set, the others must be left as default
+JOB_OPTIONS = frozenset((
+    "input", "ext_regions", "styles", "style_name",
+    "speech_language", "src_language", "dst_language", "best_match", "min_score",
+    "output", "format", "yes", "output_files", "sub_fps",
+    "speech_api", "speech_key", "speech_config", "min_confidence",
+    "drop_empty_regions", "pack_size", "pack_gap", "word_timing", "hedge",
+    "translation_api", "translation_config", "translation_format", "trans_watch",
+    "max_trans_size", "sleep_seconds", "trans_concurrency", "trans_qps",
+    "service_urls", "user_agent", "drop_override_codes", "trans_delete_chars",
+    "max_join_size", "max_delta_time", "delimiters", "stop_words_1", "stop_words_2",
+    "dont_split", "join_control", "http_speech_api",
+    "audio_process", "keep", "disable_native_split",
+    "api_suffix", "api_sample_rate", "api_audio_channel",
+    "energy_threshold", "min_region_size", "max_region_size", "max_continuous_silence",
+    "not_strict_min_length", "drop_trailing_silence", "auditok_config"))
+
+# job options of paths which must be inside the server directory
+JOB_PATH_OPTIONS = ("input", "ext_regions", "styles", "output",
+                    "speech_config", "translation_config", "auditok_config")
+
+# option values a job can't use, the plugin backend imports and runs any python code
+JOB_REFUSED_VALUES = {"translation_api": frozenset(("plugin", ))}
+
+
+def check_job_args(parser, argv, root):
+    """
+    Give the cmd parser, the job args and the server directory,
+    return the error message if the job isn't allowed or None.
+    """
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit:
+        return _("Error: Job args are wrong.")
+
+    for dest, value in sorted(vars(args).items()):
+        if dest not in JOB_OPTIONS and value != parser.get_default(dest):
+            return _("Error: Option \"--{option}\" is not allowed in a job.").format(
+                option=dest.replace("_", "-"))
+
+    for dest, values in sorted(JOB_REFUSED_VALUES.items()):
+        if getattr(args, dest) in values:
+            return _("Error: \"--{option} {value}\" is not allowed in a job.").format(
+                option=dest.replace("_", "-"), value=getattr(args, dest))
+
+    for dest in JOB_PATH_OPTIONS:
+        path = getattr(args, dest)
+        if not path or not path.strip():
+            continue
+        path = os.path.realpath(os.path.join(root, path))
+        try:
+            is_inside = os.path.commonpath([root, path]) == root
+        except ValueError:
+            # on different drives
+            is_inside = False
+        if not is_inside:
+            return _("Error: Path of \"--{option}\" is outside "
+                     "the server directory.").format(option=dest.replace("_", "-"))
+    return None
+
+
+def is_loopback(host):
+    """
+    Return whether a host is a loopback address.
+    """
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class JobQueue:
+    """
+    Class for a job queue persisted to a json file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.jobs = collections.OrderedDict()
+        self.condition = threading.Condition()
+        self.is_stopped = False
+        if os.path.isfile(path):
+            try:
+                with open(path, encoding=constants.DEFAULT_ENCODING) as queue_file:
+                    for job in json.load(queue_file):
+                        if job["status"] in ("queued", "running"):
+                            # interrupted by the last shutdown
+                            job["status"] = "queued"
+                        self.jobs[job["id"]] = job
+            except (OSError, ValueError, KeyError, TypeError):
+                self.jobs.clear()
+                backup_path = path + ".bak"
+                os.replace(path, backup_path)
+                print(_("Warning: The job queue file is broken. "
+                        "Start with an empty queue and "
+                        "move the file to \"{path}\".").format(path=backup_path))
+
+    def save(self):
+        """
+        Write the jobs to the json file. Call it with the condition acquired.
+        """
+        metrics_utils.set_queue_depth(
+            "jobs", sum(1 for job in self.jobs.values() if job["status"] == "queued"))
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as queue_file:
+            queue_file.write(json.dumps(
+                list(self.jobs.values()),
+                indent=4,
+                ensure_ascii=False).encode(constants.DEFAULT_ENCODING))
+        os.replace(temp_path, self.path)
+
+    def submit(self, argv):
+        """
+        Add a job and return it.
+        """
+        job = {"id": uuid.uuid4().hex,
+               "args": argv,
+               "status": "queued",
+               "message": "",
+               "files": [],
+               "submit_time": time.time(),
+               "finish_time": None}
+        with self.condition:
+            self.jobs[job["id"]] = job
+            self.save()
+            self.condition.notify()
+            return dict(job)
+
+    def get(self, job_id):
+        """
+        Return a copy of the job or None.
+        """
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job:
+                return dict(job)
+            return None
+
+    def list(self):
+        """
+        Return copies of all the jobs.
+        """
+        with self.condition:
+            return [dict(job) for job in self.jobs.values()]
+
+    def take(self):
+        """
+        Wait for a queued job, mark it running and return it.
+        Return None when the queue is stopped.
+        """
+        with self.condition:
+            while not self.is_stopped:
+                for job in self.jobs.values():
+                    if job["status"] == "queued":
+                        job["status"] = "running"
+                        self.save()
+                        return dict(job)
+                self.condition.wait()
+            return None
+
+    def finish(self, job_id, status, message, files):
+        """
+        Record the result of a job.
+        """
+        with self.condition:
+            if self.is_stopped:
+                # keep it running in the file and queue it again after a restart
+                return
+            job = self.jobs[job_id]
+            job["status"] = status
+            job["message"] = message
+            job["files"] = files
+            job["finish_time"] = time.time()
+            self.save()
+
+    def stop(self):
+        """
+        Wake up all the waiting workers and let them exit.
+        """
+        with self.condition:
+            self.is_stopped = True
+            self.condition.notify_all()
+
+
+class JobRunner:  # pylint: disable=too-few-public-methods, too-many-instance-attributes
+    """
+    Class for running jobs with warm worker pools and caches.
+    """
+
+    def __init__(self,
+                 audio_concurrency=constants.DEFAULT_CONCURRENCY,
+                 speech_concurrency=constants.DEFAULT_CONCURRENCY):
+        self.parser = options.get_cmd_parser()
+        self.root = os.path.realpath(os.getcwd())
+        self.audio_concurrency = audio_concurrency
+        self.speech_concurrency = speech_concurrency
+        self.audio_pool = multiprocessing.Pool(audio_concurrency)
+        # speech pools by their sizes for the jobs which lower the concurrency
+        self.speech_pools = {speech_concurrency: multiprocessing.Pool(speech_concurrency)}
+        self.token_dict = {}
+        self.lock = threading.Lock()
+
+    def get_speech_pool(self, concurrency):
+        """
+        Return a warm speech pool of the concurrency.
+        """
+        with self.lock:
+            if concurrency not in self.speech_pools:
+                self.speech_pools[concurrency] = multiprocessing.Pool(concurrency)
+            return self.speech_pools[concurrency]
+
+    def get_baidu_token(self, config):
+        """
+        Return a cached Baidu ASR token.
+        """
+        key = (config["api_key"], config["api_secret"])
+        with self.lock:
+            if key not in self.token_dict:
+                self.token_dict[key] = \
+                    api_baidu.get_baidu_token(api_secret=config["api_secret"],
+                                              api_key=config["api_key"])
+            return self.token_dict[key]
+
+    def __call__(self, argv):  # pylint: disable=too-many-branches
+        """
+        Run a job and return its status, message and output files.
+        """
+        # check it again for the jobs queued before a restart
+        message = check_job_args(self.parser, argv, self.root)
+        if message:
+            return "failed", message, []
+
+        args = self.parser.parse_args(argv)
+        if cmdline_utils.is_batch_input(args.input):
+            return "failed", _("Error: Submit one job for each input file."), []
+        args.audio_concurrency = self.audio_concurrency
+        args.speech_concurrency = self.speech_concurrency
+
+        sub_utils.start_recording()
+        try:
+            if args.speech_config:
+                cmdline_utils.validate_speech_config(args)
+            if args.auditok_config:
+                args.auditok_config = \
+                    cmdline_utils.validate_json_config(args.auditok_config)
+            if args.speech_api == "baidu" and args.speech_config \
+                    and "token" not in args.speech_config["config"]:
+                args.speech_config["config"]["token"] = \
+                    self.get_baidu_token(args.speech_config)
+            # the speech config may lower the concurrency like the Baidu ASR QPS limit
+            cmdline_utils.input_prcs(args,
+                                     input_m=None,
+                                     audio_pool=self.audio_pool,
+                                     speech_pool=self.get_speech_pool(args.speech_concurrency))
+            message = _("All works done.")
+            is_failed = False
+        except pysubs2.exceptions.Pysubs2Error:
+            message = _("Error: pysubs2.exceptions. Check your file format.")
+            is_failed = True
+        except (exceptions.ConversionException,
+                exceptions.SpeechToTextException) as err_msg:
+            message = str(err_msg).strip()
+            is_failed = True
+        except exceptions.AutosubException as err_msg:
+            message = str(err_msg).strip()
+            is_failed = False
+        except Exception as error:  # pylint: disable=broad-except
+            message = repr(error)
+            is_failed = True
+        finally:
+            written_paths = sub_utils.stop_recording()
+
+        # only the files written by this job, the temporary ones are removed already
+        files = sorted({os.path.abspath(path) for path in written_paths
+                        if os.path.isfile(path)})
+
+        if is_failed or not files:
+            return "failed", message, files
+        return "done", message, files
+
+    def close(self):
+        """
+        Terminate the worker pools.
+        """
+        core.release_pool(self.audio_pool)
+        for pool in self.speech_pools.values():
+            core.release_pool(pool)
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, server.HTTPServer):
+    """
+    Class for a multi-threaded http server.
+    """
+    daemon_threads = True
+
+
+class JobRequestHandler(server.BaseHTTPRequestHandler):
+    """
+    Class for handling the job api requests.
+    """
+    job_queue = None
+    parser = None
+    root = None
+    token = None
+
+    def send_json(self, code, obj):
+        """
+        Send a json response.
+        """
+        body = json.dumps(obj, ensure_ascii=False).encode(constants.DEFAULT_ENCODING)
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def is_authorized(self):
+        """
+        Check the token in the Authorization header.
+        Send 401 and return False if it's wrong.
+        """
+        auth = self.headers.get("Authorization", "")
+        if hmac.compare_digest(auth.encode(constants.DEFAULT_ENCODING),
+                               "Bearer {token}".format(
+                                   token=self.token).encode(constants.DEFAULT_ENCODING)):
+            return True
+        self.send_json(401, {"error": "Unauthorized."})
+        return False
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Submit a job.
+        """
+        if self.path.rstrip("/") != "/jobs":
+            self.send_json(404, {"error": "Not found."})
+            return
+        if not self.is_authorized():
+            return
+        if self.headers.get_content_type() != "application/json":
+            # refuse the simple requests a web page can send without CORS
+            self.send_json(415, {"error": "Content-Type must be application/json."})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length).decode(constants.DEFAULT_ENCODING))
+            if isinstance(body, dict):
+                argv = body["args"]
+            else:
+                argv = body
+            if not isinstance(argv, list) or \
+                    not all(isinstance(arg, str) for arg in argv):
+                raise ValueError
+        except (ValueError, KeyError):
+            self.send_json(400, {"error": "Job args must be a list of strings."})
+            return
+        message = check_job_args(self.parser, argv, self.root)
+        if message:
+            self.send_json(400, {"error": message})
+            return
+        self.send_json(201, self.job_queue.submit(argv))
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Check the jobs or fetch a job result.
+        """
+        if not self.is_authorized():
+            return
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+        if parts == ["jobs"]:
+            self.send_json(200, self.job_queue.list())
+            return
+        if len(parts) < 2 or len(parts) > 3 or parts[0] != "jobs" \
+                or (len(parts) == 3 and parts[2] != "result"):
+            self.send_json(404, {"error": "Not found."})
+            return
+        job = self.job_queue.get(parts[1])
+        if not job:
+            self.send_json(404, {"error": "Job not found."})
+            return
+        if len(parts) == 2:
+            self.send_json(200, job)
+            return
+        if job["status"] in ("queued", "running"):
+            self.send_json(409, job)
+            return
+        result_files = {}
+        for path in job["files"]:
+            if os.path.isfile(path):
+                with open(path, encoding=constants.DEFAULT_ENCODING,
+                          errors="replace") as result_file:
+                    result_files[path] = result_file.read()
+        job["files"] = result_files
+        self.send_json(200, job)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        print("{addr} {msg}".format(addr=self.address_string(), msg=format % args),
+              file=sys.stderr)
+
+
+class MetricsRequestHandler(server.BaseHTTPRequestHandler):
+    """
+    Class for serving the metrics in the Prometheus text exposition format.
+    """
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Send the metrics.
+        """
+        recorder = metrics_utils.RECORDER
+        if self.path.split("?")[0].rstrip("/") not in ("", "/metrics") or recorder is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = metrics_utils.render_prometheus(recorder).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        return
+
+
+def serve_metrics(address):
+    """
+    Give a "[host:]port" address, enable the metrics
+    and serve them over http in a daemon thread.
+    Return the http server.
+    """
+    host, _sep, port = address.rpartition(":")
+    host = host or "127.0.0.1"
+    try:
+        httpd = ThreadingHTTPServer((host, int(port)), MetricsRequestHandler)
+    except (ValueError, OSError):
+        raise exceptions.AutosubException(  # pylint: disable=raise-missing-from
+            _("Error: arg of \"-mtp\"/\"--metrics-port\" isn't valid "
+              "or the port is in use."))
+    metrics_utils.enable()
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    print(_("Metrics served at http://{host}:{port}/metrics.").format(
+        host=host, port=httpd.server_address[1]))
+    return httpd
+
+
+def serve(args):
+    """
+    Give args and run the local job server until KeyboardInterrupt.
+    """
+    host, _sep, port = args.server_address.rpartition(":")
+    try:
+        port = int(port)
+    except ValueError:
+        raise exceptions.AutosubException(  # pylint: disable=raise-missing-from
+            _("Error: arg of \"-sva\"/\"--server-address\" isn't valid."))
+    if args.batch_concurrency < 1:
+        raise exceptions.AutosubException(
+            _("Error: \"-bc\"/\"--batch-concurrency\" arg is illegal."))
+
+    job_queue = JobQueue(args.server_queue)
+    runner = JobRunner(audio_concurrency=args.audio_concurrency,
+                       speech_concurrency=args.speech_concurrency)
+
+    def worker():
+        while True:
+            job = job_queue.take()
+            if not job:
+                return
+            status, message, files = runner(job["args"])
+            job_queue.finish(job["id"], status, message, files)
+
+    workers = []
+    for _i in range(args.batch_concurrency):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        workers.append(thread)
+
+    host = host or "127.0.0.1"
+    token = args.server_token or secrets.token_urlsafe(16)
+    handler = type("BoundJobRequestHandler",
+                   (JobRequestHandler, ),
+                   {"job_queue": job_queue,
+                    "parser": runner.parser,
+                    "root": runner.root,
+                    "token": token})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    if not is_loopback(host):
+        print(_("Warning: The job server is reachable from other hosts. "
+                "Anyone with the token can run jobs on this machine."))
+    print(_("Job server listening on http://{host}:{port}/jobs. "
+            "Press Ctrl+C to stop.").format(host=host, port=port))
+    if not args.server_token:
+        print(_("Job server token: {token}").format(token=token))
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print(_("\nKeyboardInterrupt. Stop the job server."))
+    finally:
+        httpd.server_close()
+        job_queue.stop()
+        runner.close()
@@ -7,18 +7,22 @@ Defines subtitle formatters used by autosub.
 # Import built-in modules
 import wave
 import json
+import functools
 import gettext
+import itertools
 import os
 import string
-import copy
 import re
-
-# Import third-party modules
-import pysubs2
-from fuzzywuzzy import fuzz
+import threading
 
 # Any changes to the path and your own modules
 from autosub import constants
+from autosub import event_utils
+from autosub import lazy_utils
+from autosub import metrics_utils
+
+pysubs2 = lazy_utils.lazy_import("pysubs2")  # pylint: disable=invalid-name
+fuzz = lazy_utils.lazy_import("fuzzywuzzy.fuzz")  # pylint: disable=invalid-name
 
 SUB_UTILS_TEXT = gettext.translation(domain=__name__,
                                      localedir=constants.LOCALE_PATH,
@@ -27,6 +31,28 @@ SUB_UTILS_TEXT = gettext.translation(domain=__name__,
 
 _ = SUB_UTILS_TEXT.gettext
 
+# the paths written by str_to_file in the current thread when recording
+LOCAL_DATA = threading.local()
+
+# ass style reset codes like "{\rStyle}"
+STYLE_RESET_REGEX = re.compile(r"{\\r(.*?)}")
+
+
+def start_recording():
+    """
+    Start recording the paths written by str_to_file in the current thread.
+    """
+    LOCAL_DATA.written_paths = []
+
+
+def stop_recording():
+    """
+    Stop recording and return the paths written in the current thread.
+    """
+    written_paths = getattr(LOCAL_DATA, "written_paths", None) or []
+    LOCAL_DATA.written_paths = None
+    return written_paths
+
 
 def str_to_file(
         str_,
@@ -59,8 +85,14 @@ def str_to_file(
             dest = "{base}{ext}".format(base=dest,
                                         ext=ext)
 
-    with open(dest, 'wb') as output_file:
-        output_file.write(str_.encode(encoding))
+    with metrics_utils.stage("write"):
+        data = str_.encode(encoding)
+        with open(dest, 'wb') as output_file:
+            output_file.write(data)
+    metrics_utils.add_bytes("write", bytes_out=len(data))
+    written_paths = getattr(LOCAL_DATA, "written_paths", None)
+    if written_paths is not None:
+        written_paths.append(dest)
     return dest
 
 
@@ -68,6 +100,7 @@ class VTTWord:  # pylint: disable=too-few-public-methods
     """
     Class for youtube WebVTT word and word-level timestamp.
     """
+    __slots__ = ("start", "end", "word")
 
     def __init__(self,
                  start=0,
@@ -112,6 +145,16 @@ class VTTWord:  # pylint: disable=too-few-public-methods
         self.duration = len(self.word) * 1000 // char_per_sec
 
 
+def vtt_timestamp_to_ms(groups):
+    """
+    Convert the hours, minutes, seconds and fraction groups of a timestamp to milliseconds.
+    """
+    hours, minutes, seconds, fraction = groups
+    if len(fraction) < 3:
+        fraction = fraction.ljust(3, "0")
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(fraction)
+
+
 def split_vtt_word(vtt_word):
     """
     Strip space in word and return a list of VTTWord
@@ -203,77 +246,80 @@ class YTBWebVTT:  # pylint: disable=too-many-nested-blocks, too-many-branches, t
         """
         subs = cls()
         subs.path = path
-        last_timestamp = None
-        j = 0
-        file_p = open(path, encoding=encoding)
-        line_list = file_p.readlines()
-        line_list = line_list[4:]
-        file_p.close()
+        vtt_words = subs.vtt_words
+        last_ms = None
         is_content_outside_angle = True
         word = ""
-        for line in line_list:
-            line = line.rstrip()
-            if not line:
-                continue
-            stamps = constants.VTT_TIMESTAMP.findall(line)
-            if len(stamps) == 1 and len(stamps[0]) == 2:
-                # youtube WebVTT sentence timestamp line
-                last_timestamp = pysubs2.time.TIMESTAMP.findall(stamps[0][0])[0]
-            else:
-                stamps = constants.VTT_WORD_TIMESTAMP.findall(line)
+        with open(path, encoding=encoding) as file_p:
+            for line in itertools.islice(file_p, 4, None):
+                line = line.rstrip()
+                if not line:
+                    continue
+                if "-->" in line:
+                    stamps = constants.VTT_TIMESTAMP.findall(line)
+                    if len(stamps) == 1 and len(stamps[0]) == 2:
+                        # youtube WebVTT sentence timestamp line
+                        last_ms = vtt_timestamp_to_ms(
+                            pysubs2.time.TIMESTAMP.findall(stamps[0][0])[0])
+                        continue
+                stamps = constants.VTT_WORD_TIMESTAMP.findall(line) if "<" in line else None
                 if stamps:  # youtube WebVTT word-level timestamp
-                    stamps.insert(0, last_timestamp)
-                    stamp_ms = []
-                    for stamp in stamps:
-                        stamp_ms.append(pysubs2.time.timestamp_to_ms(stamp))
-                    if subs.vtt_words:
-                        subs.vtt_words[-1].end = stamp_ms[0]
-                    try:
-                        # todo2: need regex
-                        j = 0
-                        for char in line:
-                            if char == '>':
-                                is_content_outside_angle = True
+                    stamp_ms = [last_ms]
+                    stamp_ms.extend(map(vtt_timestamp_to_ms, stamps))
+                    if vtt_words:
+                        vtt_words[-1].end = stamp_ms[0]
+                    if not is_content_outside_angle:
+                        # the tag from the last line goes on
+                        if ">" not in line:
+                            continue
+                        line = line[line.find(">") + 1:]
+                    # the texts outside the tags
+                    # a word ends where a tag starts
+                    parts = constants.VTT_TAG.split(line)
+                    is_content_outside_angle = line.rfind("<") <= line.rfind(">")
+                    parts[0] = word + parts[0]
+                    word = parts.pop()
+                    if ">" in word:
+                        word = word.replace(">", "")
+                    j = 0
+                    last_j = len(stamp_ms) - 1
+                    for part in filter(None, parts):
+                        if ">" in part:
+                            part = part.replace(">", "")
+                            if not part:
                                 continue
-                            if char == '<':
-                                is_content_outside_angle = False
-                                if word:
-                                    start = stamp_ms[j]
-                                    if j < len(stamp_ms) - 1:
-                                        end = stamp_ms[j + 1]
-                                    else:
-                                        end = 0
-                                    subs.vtt_words.extend(split_vtt_word(VTTWord(
-                                        word=word.lstrip().rstrip(), start=start, end=end)))
-                                    j = j + 1
-                                    word = ""
-                                continue
-                            if is_content_outside_angle:
-                                word = word + char
-                    except ValueError:
-                        pass
+                        if j < last_j:
+                            end = stamp_ms[j + 1]
+                        else:
+                            end = 0
+                        words = part.split()
+                        if len(words) == 1:
+                            vtt_words.append(VTTWord(start=stamp_ms[j], end=end, word=words[0]))
+                        else:
+                            vtt_words.extend(split_vtt_word(VTTWord(
+                                word=part.strip(), start=stamp_ms[j], end=end)))
+                        j = j + 1
                 else:
                     text = line.split()
                     if len(text) == 1:
-                        if subs.vtt_words:
-                            if text[0] != subs.vtt_words[-1].word:
-                                vtt_word = VTTWord(word=text[0].lstrip().rstrip())
-                                if not subs.vtt_words[-1].end:
-                                    subs.vtt_words[-1].end = \
-                                        pysubs2.time.timestamp_to_ms(last_timestamp)
-                                vtt_word.start = subs.vtt_words[-1].end
-                                vtt_word.speed = subs.vtt_words[-1].speed
-                                subs.vtt_words.append(vtt_word)
+                        if vtt_words:
+                            if text[0] != vtt_words[-1].word:
+                                vtt_word = VTTWord(word=text[0])
+                                if not vtt_words[-1].end:
+                                    vtt_words[-1].end = last_ms
+                                vtt_word.start = vtt_words[-1].end
+                                vtt_word.speed = vtt_words[-1].speed
+                                vtt_words.append(vtt_word)
                         else:
-                            vtt_word = VTTWord(word=text[0].lstrip().rstrip())
-                            vtt_word.start = pysubs2.time.timestamp_to_ms(last_timestamp)
+                            vtt_word = VTTWord(word=text[0], start=last_ms)
                             vtt_word.speed = 10
-                            subs.vtt_words.append(vtt_word)
-        if len(subs.vtt_words) > 1:
-            last_speed = subs.vtt_words[-2].speed
-        else:
-            last_speed = 10
-        subs.vtt_words[-1].speed = last_speed
+                            vtt_words.append(vtt_word)
+        if vtt_words:
+            if len(vtt_words) > 1:
+                last_speed = vtt_words[-2].speed
+            else:
+                last_speed = 10
+            vtt_words[-1].speed = last_speed
         return subs
 
     def text_to_ass_events(self,
@@ -732,6 +778,95 @@ def pysubs2_ssa_event_add(  # pylint: disable=too-many-branches, too-many-statem
             i = i + 1
 
 
+class EventModel:
+    """
+    Class for the subtitles events of a run shared by all the output modes.
+    The source events are built once and every output mode
+    is built from them and the translated text list in one pass.
+    """
+    # the same event types as pysubs2_ssa_event_add
+    MODE_EVENT_TYPES = {"bilingual": 0, "dst": 0, "dst-lf-src": 1, "src-lf-dst": 2}
+
+    def __init__(self,
+                 src_ssafile,
+                 dst_text_list=None,
+                 is_empty_dropped=False):
+        self.src_ssafile = src_ssafile
+        self.dst_text_list = dst_text_list
+        self.is_empty_dropped = is_empty_dropped
+
+    @classmethod
+    def from_timed_text(cls,
+                        timed_text,
+                        style_name='Default',
+                        styles=None,
+                        is_empty_dropped=False):
+        """
+        Build the source events from a timed text list.
+        """
+        ssafile = pysubs2.SSAFile()
+        if styles:
+            ssafile.styles = styles
+        pysubs2_ssa_event_add(
+            src_ssafile=None,
+            dst_ssafile=ssafile,
+            text_list=timed_text,
+            style_name=style_name)
+        return cls(ssafile, is_empty_dropped=is_empty_dropped)
+
+    def get_ssafile(self,
+                    mode,
+                    style_name='Default'):
+        """
+        Return the SSAFile of an output mode:
+        src, dst, bilingual, dst-lf-src or src-lf-dst.
+        The source events are shared rather than copied.
+        """
+        ssafile = pysubs2.SSAFile()
+        ssafile.styles = self.src_ssafile.styles
+        ssafile.info = self.src_ssafile.info
+        src_events = self.src_ssafile.events
+        if mode == "dst":
+            pairs = list(zip(src_events, self.dst_text_list))
+        elif self.is_empty_dropped:
+            pairs = [(event, text) for event, text in zip(
+                src_events, self.dst_text_list or [""] * len(src_events)) if event.text]
+        else:
+            pairs = list(zip(src_events, self.dst_text_list or [""] * len(src_events)))
+
+        if mode == "src":
+            ssafile.events = [event for event, _text in pairs]
+            return ssafile
+
+        same_event_type = self.MODE_EVENT_TYPES[mode]
+        if mode == "bilingual":
+            ssafile.events = [event for event, _text in pairs]
+        is_same_style = not style_name or not pairs or pairs[0][0].style == style_name
+        for src_event, text in pairs:
+            event = pysubs2.SSAEvent()
+            event.start = src_event.start
+            event.end = src_event.end
+            event.is_comment = src_event.is_comment
+            if same_event_type == 0:
+                event.text = text
+                event.style = style_name if style_name else src_event.style
+            else:
+                if same_event_type == 1:
+                    first_text, second_text = text, src_event.text
+                    second_style = src_event.style
+                else:
+                    first_text, second_text = src_event.text, text
+                    second_style = style_name
+                if is_same_style:
+                    event.text = first_text + "\\N" + second_text
+                else:
+                    event.text = "{first}\\N{{\\r{style_name}}}{second}".format(
+                        first=first_text, style_name=second_style, second=second_text)
+                event.style = style_name
+            ssafile.events.append(event)
+        return ssafile
+
+
 def list_to_vtt_str(subtitles):
     """
     Serialize a list of subtitles according to the VTT format.
@@ -855,60 +990,49 @@ def split_dst_lf_src_assfile(  # pylint: disable=too-many-locals, too-many-branc
     """
     Split bilingual subtitles file's events automatically.
     """
-    style_events = {}
-    event_pos = {}
-    i = 0
-    for event in subtitles.events:
-        if event.style not in style_events:
-            style_events[event.style] = [event]
-            event_pos[event.style] = i
-        else:
-            style_events[event.style].append(event)
-        i = i + 1
+    table = event_utils.EventTable.from_events(subtitles.events)
+    style_rows = table.group_by_style()[0]
 
-    sorted_events_list = sorted(style_events.values(), key=len)
-    events_1 = sorted_events_list.pop()
+    sorted_rows_list = sorted(style_rows.values(), key=len)
+    rows_1 = sorted_rows_list.pop()
 
     new_ssafile = pysubs2.SSAFile()
     new_ssafile.styles = subtitles.styles
     new_ssafile.info = subtitles.info
 
-    new_events_1 = []
-    new_events_2 = []
+    new_rows_1 = []
+    new_rows_2 = []
 
-    if len(style_name) == 1:
+    if not style_name:
+        style_name = [table.get_style(rows_1[0]), table.get_style(rows_1[0])]
+    elif len(style_name) == 1:
         style_name = [style_name[0], style_name[0]]
-    elif not style_name:
-        style_name = [events_1[0].style, events_1[0].style]
-
-    for event in events_1:
-        new_text_list = event.text.split(r'\N')
-        new_events_1.append(copy.deepcopy(event))
-        if len(new_text_list) == 2:
-            new_events_1[-1].text = new_text_list[0]
-            styles = re.compile(r"{\\r(.*?)}").findall(new_text_list[1])
-            new_events_1[-1].style = style_name[0]
-            new_events_2.append(copy.deepcopy(event))
-            if styles:
-                styles = styles[0].split("\\")
-                if len(styles) > 1:
-                    new_events_2[-1].text = "{\\" + new_text_list[1][4 + len(styles[0]):]
-                else:
-                    new_events_2[-1].text = new_text_list[1][4 + len(styles[0]):]
-                new_events_2[-1].style = styles[0]
+
+    for row in rows_1:
+        new_text_list = table.get_text(row).split(r'\N')
+        if len(new_text_list) != 2:
+            new_rows_1.append(row)
+            continue
+        new_rows_1.append(table.append_row(row, style=style_name[0], text=new_text_list[0]))
+        styles = STYLE_RESET_REGEX.findall(new_text_list[1])
+        if styles:
+            styles = styles[0].split("\\")
+            if len(styles) > 1:
+                text = "{\\" + new_text_list[1][4 + len(styles[0]):]
             else:
-                new_events_2[-1].text = new_text_list[1]
-                new_events_2[-1].style = style_name[1]
+                text = new_text_list[1][4 + len(styles[0]):]
+            new_rows_2.append(table.append_row(row, style=styles[0], text=text))
+        else:
+            new_rows_2.append(table.append_row(row, style=style_name[1], text=new_text_list[1]))
 
     if order:
-        new_events = new_events_1 + new_events_2
+        new_rows = new_rows_1 + new_rows_2
     else:
-        new_events = new_events_2 + new_events_1
+        new_rows = new_rows_2 + new_rows_1
 
-    sorted_events_list.append(new_events)
+    sorted_rows_list.append(new_rows)
 
-    for events in sorted_events_list:
-        new_ssafile.events = new_ssafile.events + events
+    new_ssafile.events = table.to_events([row for rows in sorted_rows_list for row in rows])
 
     return new_ssafile
 
@@ -920,146 +1044,228 @@ def merge_bilingual_assfile(
     """
     Merge bilingual subtitles file's events automatically.
     """
-    style_events = {}
-    event_pos = {}
-
-    i = 0
-    for event in subtitles.events:
-        if event.style not in style_events:
-            style_events[event.style] = [event]
-            event_pos[event.style] = i
-        else:
-            style_events[event.style].append(event)
-        i = i + 1
-
-    sorted_events_list = sorted(style_events.values(), key=len)
-    events_1 = sorted_events_list.pop()
-    events_2 = sorted_events_list.pop()
-
-    dst_ssafile = pysubs2.SSAFile()
-    src_ssafile = pysubs2.SSAFile()
-
-    if event_pos[events_1[0].style] > event_pos[events_2[0].style] and order:
+    table = event_utils.EventTable.from_events(subtitles.events)
+    style_rows, first_rows = table.group_by_style()
+    starts = table.starts
+    ends = table.ends
+    style_ids = table.style_ids
+    flags = table.flags
+
+    sorted_rows_list = sorted(style_rows.values(), key=len)
+    rows_1 = sorted_rows_list.pop()
+    rows_2 = sorted_rows_list.pop()
+
+    if first_rows[style_ids[rows_1[0]]] > first_rows[style_ids[rows_2[0]]] and order:
         # destination language events are behind source language events in a bilingual subtitles
-        dst_ssafile.events = events_1
-        src_ssafile.events = events_2
+        dst_rows = table.sort_rows(rows_1)
+        src_rows = table.sort_rows(rows_2)
     else:
-        dst_ssafile.events = events_2
-        src_ssafile.events = events_1
-
-    dst_ssafile.sort()
-    src_ssafile.sort()
+        dst_rows = table.sort_rows(rows_2)
+        src_rows = table.sort_rows(rows_1)
 
     new_ssafile = pysubs2.SSAFile()
     new_ssafile.styles = subtitles.styles
     new_ssafile.info = subtitles.info
 
     # default in dst-lf-src order
-    dst_length = len(dst_ssafile.events)
-    src_length = len(src_ssafile.events)
+    dst_length = len(dst_rows)
+    src_length = len(src_rows)
     i = 0
     j = 0
 
     start = 0
     end = 0
 
-    events_0 = []
+    new_rows = []
+    rows_0 = []
     while i < dst_length and j < src_length:
-        if dst_ssafile.events[i].is_comment != src_ssafile.events[j].is_comment:
-            if dst_ssafile.events[i].is_comment:
-                events_0.append(dst_ssafile.events[i])
+        dst_row = dst_rows[i]
+        src_row = src_rows[j]
+        if flags[dst_row] != flags[src_row]:
+            if flags[dst_row]:
+                rows_0.append(dst_row)
                 i = i + 1
                 continue
-            events_0.append(src_ssafile.events[j])
+            rows_0.append(src_row)
             j = j + 1
             continue
-        if dst_ssafile.events[i].start == src_ssafile.events[j].start or \
-                dst_ssafile.events[i].end == src_ssafile.events[j].end:
-            start = dst_ssafile.events[i].start
-            end = dst_ssafile.events[i].end
-        elif dst_ssafile.events[i].start >= src_ssafile.events[j].end:
-            events_0.append(src_ssafile.events[j])
+        if starts[dst_row] == starts[src_row] or ends[dst_row] == ends[src_row]:
+            start = starts[dst_row]
+            end = ends[dst_row]
+        elif starts[dst_row] >= ends[src_row]:
+            rows_0.append(src_row)
             j = j + 1
             continue
-        elif src_ssafile.events[j].start >= dst_ssafile.events[i].end:
-            events_0.append(dst_ssafile.events[i])
+        elif starts[src_row] >= ends[dst_row]:
+            rows_0.append(dst_row)
             i = i + 1
             continue
-        elif src_ssafile.events[j].start < dst_ssafile.events[i].start:
-            event = pysubs2.SSAEvent()
-            event.start = src_ssafile.events[j].start
-            event.end = dst_ssafile.events[i].start
-            event.is_comment = src_ssafile.events[j].is_comment
-            event.text = src_ssafile.events[j].text
-            event.style = src_ssafile.events[j].style
-            events_0.append(event)
-            start = dst_ssafile.events[i].start
-
-            if src_ssafile.events[j].end > dst_ssafile.events[i].end:
-                event = pysubs2.SSAEvent()
-                event.start = dst_ssafile.events[i].end
-                event.end = src_ssafile.events[j].end
-                event.is_comment = src_ssafile.events[j].is_comment
-                event.text = src_ssafile.events[j].text
-                event.style = src_ssafile.events[j].style
-                events_0.append(event)
-                end = dst_ssafile.events[i].end
+        elif starts[src_row] < starts[dst_row]:
+            rows_0.append(table.append_row(src_row,
+                                           end=starts[dst_row],
+                                           keep_source=False))
+            start = starts[dst_row]
+
+            if ends[src_row] > ends[dst_row]:
+                rows_0.append(table.append_row(src_row,
+                                               start=ends[dst_row],
+                                               keep_source=False))
+                end = ends[dst_row]
             else:
-                end = src_ssafile.events[j].end
-
-        elif dst_ssafile.events[i].start < src_ssafile.events[j].start:
-            event = pysubs2.SSAEvent()
-            event.start = dst_ssafile.events[i].start
-            event.end = src_ssafile.events[j].start
-            event.is_comment = dst_ssafile.events[i].is_comment
-            event.text = dst_ssafile.events[i].text
-            event.style = dst_ssafile.events[i].style
-            events_0.append(event)
-            start = src_ssafile.events[j].start
-
-            if dst_ssafile.events[i].end > src_ssafile.events[j].end:
-                event = pysubs2.SSAEvent()
-                event.start = src_ssafile.events[j].end
-                event.end = dst_ssafile.events[i].end
-                event.is_comment = dst_ssafile.events[i].is_comment
-                event.text = dst_ssafile.events[i].text
-                event.style = dst_ssafile.events[i].style
-                events_0.append(event)
-                end = src_ssafile.events[j].end
+                end = ends[src_row]
+
+        elif starts[dst_row] < starts[src_row]:
+            rows_0.append(table.append_row(dst_row,
+                                           end=starts[src_row],
+                                           keep_source=False))
+            start = starts[src_row]
+
+            if ends[dst_row] > ends[src_row]:
+                rows_0.append(table.append_row(dst_row,
+                                               start=ends[src_row],
+                                               keep_source=False))
+                end = ends[src_row]
             else:
-                end = dst_ssafile.events[i].end
-
-        event = pysubs2.SSAEvent()
-        event.start = start
-        event.end = end
-        event.is_comment = dst_ssafile.events[i].is_comment
-        event.text = \
-            dst_ssafile.events[i].text + \
-            "\\N{{\\r{style_name}}}".format(
-                style_name=src_ssafile.events[j].style) + \
-            src_ssafile.events[j].text
-        event.style = dst_ssafile.events[i].style
-        new_ssafile.events.append(event)
+                end = ends[dst_row]
+
+        new_rows.append(table.append_row(
+            dst_row,
+            start=start,
+            end=end,
+            text="{dst_text}\\N{{\\r{style_name}}}{src_text}".format(
+                dst_text=table.get_text(dst_row),
+                style_name=table.get_style(src_row),
+                src_text=table.get_text(src_row)),
+            keep_source=False))
         i = i + 1
         j = j + 1
 
     if i < dst_length:
-        new_ssafile.events = new_ssafile.events + events_0 + dst_ssafile.events[i:]
+        new_rows = new_rows + rows_0 + dst_rows[i:]
     else:
-        new_ssafile.events = new_ssafile.events + events_0 + src_ssafile.events[j:]
+        new_rows = new_rows + rows_0 + src_rows[j:]
 
-    for events in sorted_events_list:
-        if event_pos[events[0].style] > event_pos[new_ssafile.events[0].style]:
-            new_ssafile.events = new_ssafile.events + events
+    for rows in sorted_rows_list:
+        if first_rows[style_ids[rows[0]]] > first_rows[style_ids[new_rows[0]]]:
+            new_rows = new_rows + rows
         else:
-            new_ssafile.events = events + new_ssafile.events
+            new_rows = rows + new_rows
+
+    new_ssafile.events = table.to_events(new_rows)
 
     return new_ssafile
 
 
-def merge_src_assfile(  # pylint: disable=too-many-locals, too-many-nested-blocks,
-        # pylint: disable=too-many-statements, too-many-branches, too-many-arguments
-        # pylint: disable=too-many-boolean-expressions
+class JoinedEvent:
+    """
+    Class for the last event joined by merge_src_assfile.
+    Its text is kept as parts until it is needed as a whole.
+    """
+    __slots__ = ("row", "start", "end", "parts", "length", "tail", "is_changed")
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 row,
+                 start,
+                 end,
+                 text,
+                 is_changed=False):
+        self.row = row
+        self.start = start
+        self.end = end
+        self.parts = [text]
+        self.length = len(text)
+        self.tail = text.rstrip(" ")[-1:]
+        self.is_changed = is_changed
+
+    def join(self, end, text):
+        """
+        Join a text after the event's text.
+        """
+        if not self.parts[-1].endswith(" "):
+            self.parts.append(" ")
+            self.length = self.length + 1
+        self.parts.append(text)
+        self.length = self.length + len(text)
+        self.tail = text.rstrip(" ")[-1:]
+        self.end = end
+        self.is_changed = True
+
+    def can_join(self, table, row, max_delta_time, delimiters):
+        """
+        Return whether an event row in the table can be joined after the event.
+        """
+        # a blank text has no edge char and "" is in any delimiters
+        return not table.flags[self.row] \
+            and not table.flags[row] \
+            and table.style_ids[self.row] == table.style_ids[row] \
+            and table.starts[row] - self.end < max_delta_time \
+            and self.tail not in delimiters \
+            and table.get_text(row).lstrip(" ")[:1] not in delimiters
+
+    def get_text(self):
+        """
+        Return the event's text.
+        """
+        if len(self.parts) > 1:
+            self.parts = ["".join(self.parts)]
+        return self.parts[0]
+
+    def to_row(self, table):
+        """
+        Return the event's row in the table.
+        """
+        if not self.is_changed:
+            return self.row
+        return table.append_row(self.row, start=self.start, end=self.end, text=self.get_text())
+
+
+def split_long_piece(
+        piece,
+        stop_words_set_1,
+        stop_words_set_2,
+        max_join_size,
+        delimiters):
+    """
+    Give a piece of start, end and text,
+    split it until each piece is shorter than max_join_size and return the pieces.
+    Return an empty list if it can't be split.
+    """
+    pieces = []
+    while True:
+        position = find_event_split_position(
+            piece[2],
+            stop_words_set_1=stop_words_set_1,
+            stop_words_set_2=stop_words_set_2,
+            delimiters=delimiters)
+        if not 0 < position < max_join_size:
+            return []
+        split_pieces = split_event_piece(piece, position)
+        if len(piece[2]) - position < max_join_size:
+            pieces.extend(split_pieces)
+            return pieces
+        pieces.append(split_pieces[0])
+        piece = split_pieces[1]
+
+
+def join_short_pieces(pieces, max_join_size):
+    """
+    Join the adjacent pieces in place if their joint text is shorter than max_join_size.
+    Return the join count.
+    """
+    merge_count = 0
+    count = 0
+    while count < len(pieces) - 1:
+        joint_text = pieces[count][2] + " " + pieces[count + 1][2]
+        if len(joint_text) < max_join_size:
+            pieces[count] = (pieces[count][0], pieces[count + 1][1], joint_text)
+            del pieces[count + 1]
+            merge_count = merge_count + 1
+        count = count + 1
+    return merge_count
+
+
+def merge_src_assfile(  # pylint: disable=too-many-locals, too-many-arguments
+        # pylint: disable=too-many-statements, too-many-branches
         subtitles,
         stop_words_set_1,
         stop_words_set_2,
@@ -1073,130 +1279,80 @@ def merge_src_assfile(  # pylint: disable=too-many-locals, too-many-nested-block
     new_ssafile = pysubs2.SSAFile()
     new_ssafile.styles = subtitles.styles
     new_ssafile.info = subtitles.info
-    style_events = {}
 
-    for event in subtitles.events:
-        event.text = event.text.replace("\\N", " ")
-        if event.style not in style_events:
-            style_events[event.style] = [event]
+    table = event_utils.EventTable.from_events(subtitles.events)
+    rows = []
+    for row in range(len(table)):
+        text = table.get_text(row)
+        if "\\N" in text:
+            rows.append(table.append_row(row, text=text.replace("\\N", " ")))
         else:
-            style_events[event.style].append(event)
+            rows.append(row)
 
-    sorted_events_list = sorted(style_events.values(), key=len)
-    events_1 = sorted_events_list.pop()
+    style_rows = table.group_by_style(rows)[0]
+    sorted_rows_list = sorted(style_rows.values(), key=len)
+    rows_1 = table.sort_rows(sorted_rows_list.pop())
 
-    temp_ssafile = pysubs2.SSAFile()
-    temp_ssafile.events = events_1
-    temp_ssafile.sort()
+    starts = table.starts
+    ends = table.ends
+    texts = table.texts
+    text_ids = table.text_ids
 
-    sub_length = len(temp_ssafile.events)
+    sub_length = len(rows_1)
     event_count = 1
     merge_count = 0
     split_count = 0
 
-    new_ssafile.events.append(temp_ssafile.events[0])
+    new_rows = []
+    last_event = JoinedEvent(rows_1[0], starts[rows_1[0]], ends[rows_1[0]],
+                             table.get_text(rows_1[0]))
 
     while event_count < sub_length:
-        if not new_ssafile.events[-1].is_comment \
-                and not temp_ssafile.events[event_count].is_comment \
-                and new_ssafile.events[-1].style == temp_ssafile.events[event_count].style \
-                and temp_ssafile.events[event_count].start \
-                - new_ssafile.events[-1].end < max_delta_time \
-                and new_ssafile.events[-1].text.rstrip(" ")[-1] not in delimiters \
-                and temp_ssafile.events[event_count].text.lstrip(" ")[0] not in delimiters:
-            if len(new_ssafile.events[-1].text) + \
-                    len(temp_ssafile.events[event_count].text) < max_join_size:
-                new_ssafile.events[-1].end = temp_ssafile.events[event_count].end
-                if new_ssafile.events[-1].text[-1] != " ":
-                    new_ssafile.events[-1].text = new_ssafile.events[-1].text + " " + \
-                                                  temp_ssafile.events[event_count].text
-                else:
-                    new_ssafile.events[-1].text = \
-                        new_ssafile.events[-1].text + temp_ssafile.events[event_count].text
+        row = rows_1[event_count]
+        text = texts[text_ids[row]]
+        if last_event.can_join(table, row, max_delta_time, delimiters):
+            if last_event.length + len(text) < max_join_size:
+                last_event.join(ends[row], text)
                 merge_count = merge_count + 1
                 event_count = event_count + 1
                 continue
 
             if not avoid_split:
-                if len(new_ssafile.events[-1].text) \
-                        > len(temp_ssafile.events[event_count].text) * 1.4 and \
-                        len(new_ssafile.events[-1].text) > max_join_size * 0.8:
-                    joint_event = new_ssafile.events[-1]
+                if last_event.length > len(text) * 1.4 and \
+                        last_event.length > max_join_size * 0.8:
+                    is_joined = False
+                    piece = (last_event.start, last_event.end, last_event.get_text())
                 else:
-                    joint_event = join_event(new_ssafile.events[-1],
-                                             temp_ssafile.events[event_count])
-                event_list = []
-                while True:
-                    word_dict = get_slice_pos_dict(joint_event.text, delimiters=delimiters)
-                    total_length = len(joint_event.text)
-                    # use punctuations to split the sentence first
-                    stop_word_set = set(word_dict.keys())
-                    last_index = find_split_index(
-                        total_length=total_length,
-                        stop_word_set=stop_word_set,
-                        word_dict=word_dict,
-                        min_range_ratio=0.1
-                    )
-
-                    if len(word_dict) < 2 or not last_index:
-                        # then use stop words
-                        word_dict = get_slice_pos_dict(joint_event.text)
-                        stop_word_set = stop_words_set_1 & \
-                                        set(word_dict.keys())
-                        last_index = find_split_index(
-                            total_length=total_length,
-                            stop_word_set=stop_word_set,
-                            word_dict=word_dict,
-                            min_range_ratio=0.1
-                        )
-                        if not last_index:
-                            stop_word_set = stop_words_set_2 & \
-                                            set(word_dict.keys())
-                            last_index = find_split_index(
-                                total_length=total_length,
-                                stop_word_set=stop_word_set,
-                                word_dict=word_dict,
-                                min_range_ratio=0.1
-                            )
-
-                    if 0 < last_index < max_join_size:
-                        if total_length - last_index < max_join_size:
-                            event_list.extend(split_event(joint_event, last_index))
-                            if joint_event.text in new_ssafile.events[-1].text:
-                                last_index = -2
-                            else:
-                                last_index = -1
-                            new_ssafile.events.pop()
-                            if len(event_list) > 2:
-                                count = 0
-                                while count < len(event_list) - 1:
-                                    joint_event = join_event(
-                                        event_list[count],
-                                        event_list[count + 1])
-                                    if len(joint_event.text) < max_join_size:
-                                        del event_list[count + 1]
-                                        event_list[count] = joint_event
-                                        merge_count = merge_count + 1
-                                    count = count + 1
-                            new_ssafile.events.extend(event_list)
-                            split_count = split_count + len(event_list)
-                            break
-                        split_events = split_event(joint_event, last_index)
-                        event_list.append(split_events[0])
-                        joint_event = split_events[1]
-                    else:
-                        break
-
-                if last_index < 0:
-                    if last_index > -2:
+                    is_joined = True
+                    piece = (last_event.start, ends[row],
+                             last_event.get_text() + " " + text)
+                pieces = split_long_piece(piece,
+                                          stop_words_set_1=stop_words_set_1,
+                                          stop_words_set_2=stop_words_set_2,
+                                          max_join_size=max_join_size,
+                                          delimiters=delimiters)
+                if pieces:
+                    if len(pieces) > 2:
+                        merge_count = merge_count + join_short_pieces(pieces, max_join_size)
+                    for new_piece in pieces[:-1]:
+                        new_rows.append(table.append_row(last_event.row,
+                                                         start=new_piece[0],
+                                                         end=new_piece[1],
+                                                         text=new_piece[2]))
+                    last_event = JoinedEvent(last_event.row, *pieces[-1], is_changed=True)
+                    split_count = split_count + len(pieces)
+                    if is_joined:
                         event_count = event_count + 1
                     continue
 
-        new_ssafile.events.append(temp_ssafile.events[event_count])
+        new_rows.append(last_event.to_row(table))
+        last_event = JoinedEvent(row, starts[row], ends[row], text)
         event_count = event_count + 1
 
-    for events in sorted_events_list:
-        new_ssafile.events = events + new_ssafile.events
+    new_rows.append(last_event.to_row(table))
+
+    other_rows = [row for rows in reversed(sorted_rows_list) for row in rows]
+    new_ssafile.events = table.to_events(other_rows + new_rows, is_reused=True)
 
     print(_("Merge {count} times.").format(count=merge_count))
     print(_("Split {count} times.").format(count=split_count))
@@ -1209,105 +1365,107 @@ def merge_src_assfile(  # pylint: disable=too-many-locals, too-many-nested-block
     return new_ssafile
 
 
-def find_split_index(
+def find_split_position(
         total_length,
-        stop_word_set,
-        word_dict,
-        min_range_ratio
+        positions,
+        flags=None,
+        min_range_ratio=0.1
 ):
     """
-    Find index to split.
+    Find the position nearest to the middle to split in a single scan of the sorted positions.
+    Only the positions whose flags are true count if flags are given.
+    Return 0 if there's none.
     """
     half_pos = int(total_length / 2)
     min_range = int(min_range_ratio * total_length)
     max_range = total_length - min_range
     last_index = 0
-    last_delta = half_pos - last_index
-    if stop_word_set:
-        for stop_word in stop_word_set:
-            for index in word_dict[stop_word]:
-                if min_range < index < max_range:
-                    delta = abs(index - half_pos)
-                    if delta < last_delta:
-                        last_index = index
-                        last_delta = delta
+    last_delta = half_pos
+    for i, index in enumerate(positions):
+        if index - half_pos >= last_delta:
+            break
+        if min_range < index < max_range and (flags is None or flags[i]):
+            delta = abs(index - half_pos)
+            if delta < last_delta:
+                last_index = index
+                last_delta = delta
 
     return last_index
 
 
-def get_slice_pos_dict(
+@functools.lru_cache(maxsize=None)
+def get_slice_regex(delimiters):
+    """
+    Return the regex of the slices between the delimiters.
+    """
+    if not delimiters:
+        return re.compile(r".+", re.DOTALL)
+    return re.compile("[^{delimiters}]+".format(delimiters=re.escape(delimiters)))
+
+
+def get_slice_positions(
         sentence,
         delimiters=" "
 ):
     """
-    Get word position dictionary from sentence.
+    Get the start positions and the words of the non-blank slices
+    between the delimiters of a sentence.
     """
-    i = 0
-    j = 0
-    result_dict = {}
-    length = len(sentence)
-    while i < length:
-        if sentence[i] in delimiters:
-            if i != j and sentence[j:i].strip(" "):
-                slice_ = sentence[j:i].lstrip(" ")
-                index = result_dict.get(slice_)
-                if not index:
-                    result_dict[slice_] = [j]
-                else:
-                    result_dict[slice_].append(j)
-            j = i + 1
-        i = i + 1
-
-    if i != j and sentence[j:i].strip(" "):
-        slice_ = sentence[j:i].lstrip(" ")
-        index = result_dict.get(slice_)
-        if not index:
-            result_dict[slice_] = [j]
-        else:
-            result_dict[slice_].append(j)
+    positions = []
+    words = []
+    for match in get_slice_regex(delimiters).finditer(sentence):
+        word = match.group().lstrip(" ")
+        if word:
+            positions.append(match.start())
+            words.append(word)
 
-    return result_dict
+    return positions, words
 
 
-def join_event(
-        event1,
-        event2
+def find_event_split_position(
+        text,
+        stop_words_set_1,
+        stop_words_set_2,
+        delimiters=constants.DEFAULT_EVENT_DELIMITERS
 ):
     """
-    Join two events.
+    Find the position to split an event's text.
+    Use the delimiters first and then the stop words.
     """
-    joint_event = event1.copy()
-    joint_event.start = event1.start
-    joint_event.end = event2.end
-    joint_event.text = event1.text + " " + event2.text
+    total_length = len(text)
+    positions, words = get_slice_positions(text, delimiters=delimiters)
+    last_index = 0
+    if len(set(words)) > 1:
+        last_index = find_split_position(total_length=total_length, positions=positions)
+
+    if not last_index:
+        positions, words = get_slice_positions(text)
+        last_index = find_split_position(
+            total_length=total_length,
+            positions=positions,
+            flags=[word in stop_words_set_1 for word in words])
+        if not last_index:
+            last_index = find_split_position(
+                total_length=total_length,
+                positions=positions,
+                flags=[word in stop_words_set_2 for word in words])
 
-    return joint_event
+    return last_index
 
 
-def split_event(
-        event,
-        position,
-        without_mark=False
+def split_event_piece(
+        piece,
+        position
 ):
     """
-    Split an event based on position.
+    Split an event's start, end and text based on position.
     """
-    ratio = position / len(event.text)
-    first_event = event.copy()
-    first_event.start = event.start
-    first_event.end = int((event.end - event.start) * ratio) + event.start
-
-    second_event = event.copy()
-    second_event.end = event.end
-    second_event.start = first_event.end
-    if not without_mark:
-        if not first_event.text.startswith("{\\r}"):
-            first_event.text = "{\\r}" + event.text[:position].rstrip(" ")
-        else:
-            first_event.text = event.text[:position].rstrip(" ")
-        if not second_event.text.startswith("{\\r}"):
-            second_event.text = "{\\r}" + event.text[position:].lstrip(" ")
-        else:
-            second_event.text = event.text[position:].lstrip(" ")
+    start, end, text = piece
+    middle = int((end - start) * (position / len(text))) + start
+    if text.startswith("{\\r}"):
+        mark = ""
+    else:
+        mark = "{\\r}"
 
-    return [first_event, second_event]
+    return [(start, middle, mark + text[:position].rstrip(" ")),
+            (middle, end, mark + text[position:].lstrip(" "))]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Defines autosub's text size functionality.
+"""
+# Import built-in modules
+import bisect
+import collections
+import functools
+import itertools
+
+# Import third-party modules
+import wcwidth
+
+# Any changes to the path and your own modules
+
+
+# the size metrics of a text
+TextMetrics = collections.namedtuple("TextMetrics", ["chars", "bytes", "width", "trans"])
+
+# the metrics cached for the texts seen in this process
+METRICS_CACHE_SIZE = 65536
+
+
+@functools.lru_cache(maxsize=METRICS_CACHE_SIZE)
+def get_text_metrics(text):
+    """
+    Return the char count, utf-8 byte count, display width
+    and translation request size of a text.
+    The width is -1 if the text has non-printable chars like wcwidth.
+    """
+    if not text:
+        return TextMetrics(chars=0, bytes=0, width=0, trans=0)
+    byte_count = len(text.encode("utf-8"))
+    if byte_count == len(text) and text.isprintable():
+        # printable ascii chars are all half-wide
+        width = len(text)
+    else:
+        width = wcwidth.wcswidth(text)
+    if width * 10 / len(text) >= 10:
+        # If text contains full-wide char,
+        # count its length about 4 times than the ordinary text.
+        # Avoid weird problem when text has full-wide char.
+        # In this case Google will count a full-wide char
+        # at least 2 times larger than a half-wide char.
+        # It will certainly exceed the limit of the size_per_trans.
+        # Causing a googletrans internal jsondecode error.
+        trans_size = width * 2
+    else:
+        trans_size = len(text)
+    return TextMetrics(chars=len(text), bytes=byte_count, width=width, trans=trans_size)
+
+
+class TextWidthIndex:
+    """
+    Class for the size metrics of a text list and their prefix sums.
+    The size of any slice is got in constant time
+    and the list is partitioned into size-limited chunks by binary searches.
+    """
+
+    def __init__(self, text_list):
+        self.text_list = text_list
+        self.metrics = [get_text_metrics(text) for text in text_list]
+        self.prefix_sums = {}
+
+    def __len__(self):
+        return len(self.text_list)
+
+    def get_prefix_sums(self, key="trans", extra_size=0):
+        """
+        Return the prefix sums of a metric.
+        Each non-empty text counts extra_size more.
+        """
+        prefix_sums = self.prefix_sums.get((key, extra_size))
+        if prefix_sums is None:
+            sizes = (max(getattr(metrics, key), 0) + extra_size if metrics.chars else 0
+                     for metrics in self.metrics)
+            prefix_sums = [0] + list(itertools.accumulate(sizes))
+            self.prefix_sums[(key, extra_size)] = prefix_sums
+        return prefix_sums
+
+    def get_size(self, start, end, key="trans", extra_size=0):
+        """
+        Return the total size of the texts from start to end.
+        """
+        prefix_sums = self.get_prefix_sums(key, extra_size)
+        return prefix_sums[end] - prefix_sums[start]
+
+    def partition(self, max_size, key="trans", extra_size=0):
+        """
+        Split the text list into the fewest chunks of the text positions
+        whose sizes are not bigger than max_size.
+        A text bigger than max_size takes a chunk alone.
+        Empty texts go with the chunk before them.
+        Return a list of the chunks' start and end positions.
+        """
+        prefix_sums = self.get_prefix_sums(key, extra_size)
+        if max_size <= 0:
+            max_size = float("inf")
+        chunks = []
+        start = 0
+        total = prefix_sums[-1]
+        while prefix_sums[start] < total:
+            end = bisect.bisect_right(prefix_sums, prefix_sums[start] + max_size, lo=start) - 1
+            if prefix_sums[end] == prefix_sums[start]:
+                # the next non-empty text is too big
+                end = bisect.bisect_right(prefix_sums, prefix_sums[start], lo=start)
+                while end < len(prefix_sums) - 1 and prefix_sums[end + 1] == prefix_sums[end]:
+                    end = end + 1
+            chunks.append((start, end))
+            start = end
+        if chunks:
+            chunks[-1] = (chunks[-1][0], len(self.text_list))
+        return chunks
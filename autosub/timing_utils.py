@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Defines autosub's speech region packing and word timing functionality.
+"""
+# Import built-in modules
+
+
+# Import third-party modules
+
+
+# Any changes to the path and your own modules
+
+
+def pack_regions(regions, max_size, max_gap):
+    """
+    Give a list of speech regions in milliseconds
+    and pack the adjacent ones whose silence gaps are not bigger than max_gap
+    into one region not longer than max_size.
+    Return the packed regions and the region indexes of each packed one.
+    """
+    packed_regions = []
+    groups = []
+    for i, (start, end) in enumerate(regions):
+        if packed_regions:
+            last_start, last_end = packed_regions[-1]
+            if 0 <= start - last_end <= max_gap and end - last_start <= max_size:
+                packed_regions[-1] = (last_start, end)
+                groups[-1].append(i)
+                continue
+        packed_regions.append((start, end))
+        groups.append([i])
+    return packed_regions, groups
+
+
+def time_to_ms(time_str):
+    """
+    Give a Google Cloud duration like "1.200s" or a dict of seconds and nanos
+    and return the milliseconds.
+    """
+    if isinstance(time_str, dict):
+        return int(time_str.get("seconds", 0)) * 1000 \
+            + int(time_str.get("nanos", 0)) // 1000000
+    return int(float(str(time_str).rstrip("s")) * 1000)
+
+
+def get_words(result):
+    """
+    Give a full Speech-to-Text result
+    and return a list of its words' start, end in milliseconds and text.
+    The time is relative to the audio fragment. The end can be None.
+    Return an empty list if the result has no word timestamps.
+    """
+    words = []
+    try:
+        if isinstance(result, dict):
+            # Google Cloud Speech-to-Text with word time offsets
+            for item in result.get("results", []):
+                for word in item["alternatives"][0].get("words", []):
+                    start = word.get("startTime", word.get("start_time", 0))
+                    end = word.get("endTime", word.get("end_time"))
+                    words.append((time_to_ms(start),
+                                  time_to_ms(end) if end is not None else None,
+                                  word["word"]))
+        elif isinstance(result, list):
+            # Xun Fei Yun Speech-to-Text WebSocket messages
+            # "bg" is the word start in 10 milliseconds
+            for message in result:
+                for item in message["data"]["result"]["ws"]:
+                    words.append((int(item.get("bg", 0)) * 10,
+                                  None,
+                                  item["cw"][0]["w"]))
+    except (KeyError, IndexError, TypeError, ValueError, AttributeError):
+        return []
+    return words
+
+
+def get_timed_tokens(
+        transcript,
+        words):
+    """
+    Give a transcript and its recognized words
+    and return the transcript tokens with their start and end times and the token separator.
+    A token is a word if the transcript has spaces, otherwise a character.
+    If the transcript can't be matched with the words,
+    the tokens are mapped to the words in proportion to keep the transcript.
+    Return None as the tokens if there are no words.
+    """
+    if " " in transcript:
+        tokens = transcript.split()
+        separator = " "
+        units = [len(word[2].split()) for word in words]
+    else:
+        tokens = list(transcript)
+        separator = ""
+        units = [len(word[2]) for word in words]
+    if not words:
+        return None, separator
+    if sum(units) != len(tokens):
+        spans = [words[k * len(words) // len(tokens)][:2] for k in range(len(tokens))]
+    else:
+        spans = []
+        for (start, end, _text), unit in zip(words, units):
+            spans.extend([(start, end)] * unit)
+    return [(start, end, token) for (start, end), token in zip(spans, tokens)], separator
+
+
+def assign_tokens(
+        timed_tokens,
+        sub_regions):
+    """
+    Give timed tokens and sub-regions
+    and assign each token to the sub-region nearest to its middle time.
+    """
+    parts = [[] for _ in sub_regions]
+    j = 0
+    for start, end, token in timed_tokens:
+        if end is not None and end > start:
+            time = (start + end) / 2
+        else:
+            time = start
+        while j + 1 < len(sub_regions) and \
+                time >= (sub_regions[j][1] + sub_regions[j + 1][0]) / 2:
+            j += 1
+        parts[j].append((start, end, token))
+    return parts
+
+
+def split_transcript(
+        transcript,
+        sub_regions,
+        words=None):
+    """
+    Give a transcript of a packed region, its sub-regions in milliseconds
+    relative to the packed region start and the recognized words,
+    and split the transcript into one text for each sub-region.
+    Words are assigned to the sub-region nearest to their timestamps.
+    Without words, the transcript is split in proportion to the sub-region lengths.
+    """
+    if len(sub_regions) == 1:
+        return [transcript]
+    if not transcript:
+        return [""] * len(sub_regions)
+
+    timed_tokens, separator = get_timed_tokens(transcript, words or [])
+    if timed_tokens is None:
+        if separator:
+            tokens = transcript.split()
+        else:
+            tokens = list(transcript)
+        total = sum(end - start for start, end in sub_regions) or 1
+        count = len(tokens)
+        # map each token to the speech time it is spoken at
+        timed_tokens = []
+        for k, token in enumerate(tokens):
+            position = (k + 0.5) / count * total
+            for start, end in sub_regions:
+                if position <= end - start:
+                    time = start + position
+                    break
+                position -= end - start
+            else:
+                time = sub_regions[-1][1]
+            timed_tokens.append((time, None, token))
+
+    parts = assign_tokens(timed_tokens, sub_regions)
+    return [separator.join(token for _start, _end, token in part).strip()
+            for part in parts]
+
+
+def unpack_text_list(
+        text_list,
+        regions,
+        packed_regions,
+        groups,
+        result_list=None):
+    """
+    Give a text list of the packed regions
+    and return the text list of the original regions.
+    """
+    unpacked_text_list = []
+    for i, (packed_start, _packed_end) in enumerate(packed_regions):
+        sub_regions = [(regions[index][0] - packed_start, regions[index][1] - packed_start)
+                       for index in groups[i]]
+        if result_list and i < len(result_list):
+            words = get_words(result_list[i])
+        else:
+            words = None
+        unpacked_text_list.extend(split_transcript(
+            transcript=text_list[i],
+            sub_regions=sub_regions,
+            words=words))
+    return unpacked_text_list
+
+
+def fill_token_ends(timed_tokens, region_start, region_end):
+    """
+    Give the timed tokens of a region and its boundaries,
+    fill the missing ends with the next starts
+    and return the token spans clipped to the region.
+    """
+    spans = []
+    for k, (start, end, token) in enumerate(timed_tokens):
+        if end is None or end <= start:
+            if k + 1 < len(timed_tokens):
+                end = max(timed_tokens[k + 1][0], start)
+            else:
+                end = region_end
+        start = min(max(start, region_start), region_end)
+        end = min(max(end, start), region_end)
+        spans.append((start, end, token))
+    return spans
+
+
+def split_spans(spans, region_end, split_gap, min_size):
+    """
+    Give the token spans of a region and its end,
+    split them at the gaps not smaller than split_gap
+    if both parts are not shorter than min_size.
+    Return the pieces of spans.
+    """
+    pieces = [[spans[0]]]
+    for start, end, token in spans[1:]:
+        piece_start = pieces[-1][0][0]
+        piece_end = pieces[-1][-1][1]
+        if start - piece_end >= split_gap \
+                and piece_end - piece_start >= min_size \
+                and region_end - start >= min_size:
+            pieces.append([])
+        pieces[-1].append((start, end, token))
+    return pieces
+
+
+def refine_regions(  # pylint: disable=too-many-arguments, too-many-locals
+        regions,
+        text_list,
+        result_list,
+        packed_regions=None,
+        groups=None,
+        split_gap=500,
+        min_size=500):
+    """
+    Give the speech regions, their text list
+    and the full results of the regions or the packed regions,
+    and refine the region boundaries to the first and the last words.
+    Split the regions at the word gaps not smaller than split_gap
+    if both parts are not shorter than min_size.
+    Regions without word timestamps are kept.
+    Return the new regions and the new text list.
+    """
+    if groups is None:
+        packed_regions = regions
+        groups = [[i] for i in range(len(regions))]
+
+    new_regions = []
+    new_text_list = []
+    for i, (packed_start, _packed_end) in enumerate(packed_regions):
+        if i < len(result_list):
+            words = [(start + packed_start,
+                      end + packed_start if end is not None else None,
+                      text)
+                     for start, end, text in get_words(result_list[i])]
+        else:
+            words = []
+        region_words = assign_tokens(words, [regions[index] for index in groups[i]])
+
+        for index, words in zip(groups[i], region_words):
+            region_start, region_end = regions[index]
+            text = text_list[index]
+            timed_tokens, separator = get_timed_tokens(text, words) if text else (None, "")
+            if not timed_tokens:
+                new_regions.append(regions[index])
+                new_text_list.append(text)
+                continue
+
+            spans = fill_token_ends(timed_tokens, region_start, region_end)
+            pieces = split_spans(spans, region_end, split_gap, min_size)
+            for piece in pieces:
+                start = piece[0][0]
+                end = piece[-1][1]
+                if end <= start:
+                    start, end = region_start, region_end
+                new_regions.append((start, end))
+                if len(pieces) > 1:
+                    new_text_list.append(
+                        separator.join(token for _start, _end, token in piece).strip())
+                else:
+                    new_text_list.append(text)
+    return new_regions, new_text_list
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Defines autosub's concurrent translation functionality.
+"""
+# Import built-in modules
+import collections
+import hashlib
+import importlib
+import json
+import re
+import threading
+import time
+
+# Import third-party modules
+
+
+# Any changes to the path and your own modules
+from autosub import lazy_utils
+
+futures = lazy_utils.lazy_import("concurrent.futures")  # pylint: disable=invalid-name
+requests = lazy_utils.lazy_import("requests")  # pylint: disable=invalid-name
+
+# ass override codes like "{\an8}"
+OVERRIDE_CODES_REGEX = re.compile(r"{.*?}")
+
+# the line id put before each line of a translation request
+LINE_ID_FORMAT = "[#{line_id}] {text}"
+
+# translators may add spaces or turn the brackets into full-width ones
+LINE_ID_REGEX = re.compile(r"[\[［【]\s*[#＃]\s*(\d+)\s*[\]］】]\s*")
+
+# words and the rest of a line for the dictionary lookup
+WORD_REGEX = re.compile(r"(\w+)")
+
+# the translation result of a translator backend, same attributes as py-googletrans one
+Translated = collections.namedtuple("Translated", ["src", "dest", "origin", "text"])
+
+# the language detection result of a translator backend
+Detected = collections.namedtuple("Detected", ["lang", "confidence"])
+
+
+class TokenBucket:  # pylint: disable=too-few-public-methods
+    """
+    Class for pacing the requests by a token bucket.
+    The bucket refills at the rate of qps tokens per second up to the burst size.
+    A non-positive qps means no limit.
+    """
+
+    def __init__(self, qps, burst=1):
+        self.qps = qps
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.last_time = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token. Wait until there is one.
+        """
+        if not self.qps or self.qps <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.perf_counter()
+                self.tokens = min(self.burst,
+                                  self.tokens + (now - self.last_time) * self.qps)
+                self.last_time = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.qps
+            time.sleep(wait_time)
+
+
+def run_tasks(func, count, concurrency=1, callback=None):
+    """
+    Give a function, the task count and the concurrency,
+    call the function with each task index in threads
+    and return the results by the task indexes.
+    The callback is called with the index and the result of each finished task.
+    """
+    results = [None] * count
+    if concurrency <= 1 or count <= 1:
+        for index in range(count):
+            results[index] = func(index)
+            if callback:
+                callback(index, results[index])
+        return results
+
+    executor = futures.ThreadPoolExecutor(max_workers=min(concurrency, count))
+    tasks = {}
+    try:
+        tasks = {executor.submit(func, index): index for index in range(count)}
+        for task in futures.as_completed(tasks):
+            index = tasks[task]
+            results[index] = task.result()
+            if callback:
+                callback(index, results[index])
+    except KeyboardInterrupt:
+        for task in tasks:
+            task.cancel()
+        executor.shutdown(wait=False)
+        raise
+    executor.shutdown()
+    return results
+
+
+def get_line_id_size(count):
+    """
+    Return the maximum size a line id adds to a line among count lines.
+    """
+    return len(LINE_ID_FORMAT.format(line_id=count, text="")) + 1
+
+
+def tag_line_ids(text_list, indexes):
+    """
+    Give a text list and the indexes of the lines to translate
+    and return the request text whose lines start with their indexes as the line ids.
+    """
+    return "\n".join(LINE_ID_FORMAT.format(line_id=index,
+                                           text=" ".join(text_list[index].split("\n")))
+                     for index in indexes)
+
+
+def parse_line_ids(result_text, indexes):
+    """
+    Give a translated text with line ids and the requested indexes
+    and return a dict of the translated lines by their indexes.
+    Lines split by the translator are joined back.
+    Lines merged by the translator are split at their line ids.
+    Missing or empty lines are left out so that they can be re-requested.
+    """
+    parts = LINE_ID_REGEX.split(result_text)
+    requested = set(indexes)
+    results = {}
+    for i in range(1, len(parts) - 1, 2):
+        index = int(parts[i])
+        if index not in requested or index in results:
+            continue
+        text = " ".join(line.strip() for line in parts[i + 1].split("\n") if line.strip())
+        if text:
+            results[index] = text
+    if len(parts) == 1 and len(indexes) == 1:
+        # a single line whose line id is dropped
+        text = " ".join(line.strip() for line in result_text.split("\n") if line.strip())
+        if text:
+            results[indexes[0]] = text
+    return results
+
+
+class TranslationCache:
+    """
+    Class for caching the translated lines of all translator backends in this process.
+    The lines are cached by the backend's cache key
+    so that the backends of different configs don't share them.
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.lines = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, cache_key, src, dest, text):
+        """
+        Return the cached translation of a line, or None if it isn't cached.
+        """
+        with self.lock:
+            return self.lines.get((cache_key, src, dest, text))
+
+    def put(self, cache_key, src, dest, text, result):
+        """
+        Cache the translation of a line.
+        """
+        with self.lock:
+            self.lines[(cache_key, src, dest, text)] = result
+            if len(self.lines) > self.max_size:
+                self.lines.popitem(last=False)
+
+
+# the translation cache shared by all translations in this process
+CACHE = TranslationCache()
+
+
+class Translator:
+    """
+    Base class for the translator backends.
+    A backend translates a text whose lines are tagged with the line ids
+    and returns a result with the text and src attributes like py-googletrans.
+    """
+    provider = "translator"
+    # local backends are not rate limited by default
+    is_local = False
+
+    @property
+    def cache_key(self):
+        """
+        Return the key of the backend and its config in the translation cache.
+        """
+        return self.provider
+
+    def translate(self,
+                  text,
+                  dest,
+                  src="auto"):
+        """
+        Translate text.
+        """
+        raise NotImplementedError
+
+    def detect(self, text):  # pylint: disable=unused-argument, no-self-use
+        """
+        Detect the language of text.
+        Return "auto" if the backend can't detect it.
+        """
+        return Detected(lang="auto", confidence=None)
+
+
+class LineTranslator(Translator):
+    """
+    Base class for the translator backends translating a batch of lines.
+    The line ids are kept out of the lines passed to the backend.
+    """
+
+    def translate_lines(self,
+                        lines,
+                        dest,
+                        src="auto"):
+        """
+        Translate a list of lines and return the translated list.
+        """
+        raise NotImplementedError
+
+    def translate(self,
+                  text,
+                  dest,
+                  src="auto"):
+        prefixes = []
+        lines = []
+        for line in text.split("\n"):
+            match = LINE_ID_REGEX.match(line)
+            if match:
+                prefixes.append(line[:match.end()])
+                lines.append(line[match.end():])
+            else:
+                prefixes.append("")
+                lines.append(line)
+        result_lines = self.translate_lines(lines, dest=dest, src=src)
+        return Translated(
+            src=src, dest=dest, origin=text,
+            text="\n".join(prefix + line for prefix, line in zip(prefixes, result_lines)))
+
+
+class DictTranslator(LineTranslator):
+    """
+    Class for translating offline by a dictionary of lines and words.
+    A whole line is looked up first and then its words one by one.
+    Unknown words are kept.
+    """
+    provider = "dict"
+    is_local = True
+
+    def __init__(self, entries):
+        self.entries = {key.strip().lower(): value for key, value in entries.items()}
+        self.entries_hash = hashlib.sha1(json.dumps(
+            self.entries, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    @property
+    def cache_key(self):
+        return "{provider}:{hash}".format(provider=self.provider, hash=self.entries_hash)
+
+    @classmethod
+    def from_file(cls, dict_path):
+        """
+        Load the dictionary from a json file.
+        """
+        with open(dict_path, encoding="utf-8") as dict_fp:
+            return cls(json.load(dict_fp))
+
+    def translate_line(self, line):
+        """
+        Translate a line by the dictionary.
+        """
+        result = self.entries.get(line.strip().lower())
+        if result is not None:
+            return result
+        return "".join(self.entries.get(part.lower(), part) if i % 2 else part
+                       for i, part in enumerate(WORD_REGEX.split(line)))
+
+    def translate_lines(self,
+                        lines,
+                        dest,
+                        src="auto"):
+        return [self.translate_line(line) for line in lines]
+
+
+class PluginTranslator(LineTranslator):
+    """
+    Class for translating by a python function like a local translation model.
+    The function is called with a list of lines, src and dest,
+    and returns the list of translated lines.
+    """
+    provider = "plugin"
+    is_local = True
+
+    def __init__(self,
+                 module,
+                 function="translate"):
+        self.name = "{module}.{function}".format(module=module, function=function)
+        self.function = getattr(importlib.import_module(module), function)
+
+    @property
+    def cache_key(self):
+        return "{provider}:{name}".format(provider=self.provider, name=self.name)
+
+    def translate_lines(self,
+                        lines,
+                        dest,
+                        src="auto"):
+        result_lines = list(self.function(lines, src, dest))
+        if len(result_lines) != len(lines):
+            raise ValueError("The plugin returns {count} lines instead of {total}.".format(
+                count=len(result_lines), total=len(lines)))
+        return result_lines
+
+
+class HTTPTranslator(Translator):
+    """
+    Class for translating by a LibreTranslate compatible machine translation service.
+    """
+    provider = "http"
+
+    def __init__(self,
+                 api_url,
+                 api_key=None,
+                 timeout=60):
+        self.api_url = api_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+
+    @property
+    def cache_key(self):
+        return "{provider}:{url}".format(provider=self.provider, url=self.api_url)
+
+    def post(self, path, data):
+        """
+        Send a request to the service and return the json response.
+        """
+        if self.api_key:
+            data["api_key"] = self.api_key
+        response = requests.post("{url}/{path}".format(url=self.api_url, path=path),
+                                 json=data,
+                                 timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def translate(self,
+                  text,
+                  dest,
+                  src="auto"):
+        result = self.post("translate", {"q": text,
+                                         "source": src,
+                                         "target": dest,
+                                         "format": "text"})
+        if "detectedLanguage" in result:
+            src = result["detectedLanguage"].get("language", src)
+        return Translated(src=src, dest=dest, origin=text, text=result["translatedText"])
+
+    def detect(self, text):
+        result = self.post("detect", {"q": text})
+        if not result:
+            return Detected(lang="auto", confidence=None)
+        return Detected(lang=result[0]["language"], confidence=result[0].get("confidence"))
+
+
+def get_translator(backend, config_dict):
+    """
+    Give a translator backend name and its config dict and return the backend.
+    """
+    if backend == "http":
+        return HTTPTranslator(api_url=config_dict["api_url"],
+                              api_key=config_dict.get("api_key"),
+                              timeout=config_dict.get("timeout", 60))
+    if backend == "dict":
+        if "entries" in config_dict:
+            return DictTranslator(config_dict["entries"])
+        return DictTranslator.from_file(config_dict["dict_path"])
+    if backend == "plugin":
+        return PluginTranslator(module=config_dict["module"],
+                                function=config_dict.get("function", "translate"))
+    raise ValueError("Unknown translator backend \"{backend}\".".format(backend=backend))
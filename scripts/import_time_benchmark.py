@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark autosub's startup time and guard the lazy imports.
+
+Usage: python scripts/import_time_benchmark.py [--runs N] [--max-ms MS] [--json]
+"""
+# Import built-in modules
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Heavy modules which must not be imported by the help/list code paths.
+HEAVY_MODULES = [
+    "googletrans",
+    "docx",
+    "pysubs2",
+    "fuzzywuzzy",
+    "requests",
+    "websocket",
+    "pkg_resources",
+    "google.cloud.speech_v1p1beta1",
+    "google.protobuf",
+]
+
+# args for autosub.main and whether the workflow modules are loaded
+COMMANDS = [
+    ["-h"],
+    ["-V"],
+    ["-lf"],
+    ["-lsc"],
+]
+
+CHECK_CODE = """
+import sys
+sys.argv = ["autosub"] + {argv!r}
+import autosub
+try:
+    autosub.main()
+except SystemExit:
+    pass
+loaded = [name for name in {heavy!r} if name in sys.modules]
+sys.stderr.write("LOADED=" + ",".join(loaded) + "\\n")
+"""
+
+
+def run_python(code, env):
+    """
+    Run python code in a new interpreter and return its wall time and stderr.
+    """
+    start = time.perf_counter()
+    prcs = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", code],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=env,
+        check=False)
+    return (time.perf_counter() - start) * 1000, prcs.stderr.decode("utf-8", "replace")
+
+
+def main():
+    """
+    Run the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Fail if a command's median time minus "
+                             "the bare interpreter's is above it.")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the result in json format.")
+    opts = parser.parse_args()
+
+    env = dict(os.environ)
+    repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = repo_path + os.pathsep + env.get("PYTHONPATH", "")
+
+    bare = statistics.median(
+        [run_python("pass", env)[0] for _ in range(opts.runs)])
+    result = {"bare_interpreter_ms": round(bare, 1), "commands": []}
+    is_failed = False
+
+    for argv in COMMANDS:
+        code = CHECK_CODE.format(argv=argv, heavy=HEAVY_MODULES)
+        times = []
+        loaded = []
+        for _ in range(opts.runs):
+            wall_time, err = run_python(code, env)
+            times.append(wall_time)
+            for line in err.splitlines():
+                if line.startswith("LOADED="):
+                    loaded = [name for name in line[7:].split(",") if name]
+        median = statistics.median(times)
+        item = {"args": argv,
+                "median_ms": round(median, 1),
+                "over_bare_ms": round(median - bare, 1),
+                "heavy_modules_loaded": loaded}
+        if loaded:
+            is_failed = True
+        if opts.max_ms is not None and median - bare > opts.max_ms:
+            is_failed = True
+        result["commands"].append(item)
+
+    if opts.json:
+        print(json.dumps(result, indent=4))
+    else:
+        print("bare interpreter: {:.1f} ms".format(bare))
+        for item in result["commands"]:
+            print("autosub {args:<8} {median:>8.1f} ms  (+{over:.1f} ms)  heavy: {heavy}".format(
+                args=" ".join(item["args"]),
+                median=item["median_ms"],
+                over=item["over_bare_ms"],
+                heavy=", ".join(item["heavy_modules_loaded"]) or "none"))
+
+    return 1 if is_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
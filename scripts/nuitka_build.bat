@@ -7,4 +7,4 @@ set "package_name=autosub"
 cd %~dp0
 cd ..\
 pip install -r requirements.txt
-nuitka "%package_name%" --standalone --output-dir %output_dir% --show-progress --show-scons --show-modules --windows-icon=%icon_dir% --recurse-to=multiprocessing --plugin-enable=multiprocessing --assume-yes-for-downloads
\ No newline at end of file
+nuitka "%package_name%" --standalone --output-dir %output_dir% --show-progress --show-scons --show-modules --windows-icon=%icon_dir% --recurse-to=multiprocessing --plugin-enable=multiprocessing --include-module=autosub.cmdline_utils --include-module=autosub.server_utils --include-module=google.cloud.speech_v1p1beta1 --include-module=google.protobuf.json_format --include-package=googletrans --include-package=docx --include-package=pysubs2 --include-package=fuzzywuzzy --include-package=requests --include-package=websocket --assume-yes-for-downloads
\ No newline at end of file
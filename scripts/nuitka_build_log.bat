@@ -7,5 +7,5 @@ set package_name="autosub"
 
 @echo on
 cd %~dp0
-call nuitka "../%package_name:~1,-1%" --standalone --output-dir %output_dir% --show-progress --show-scons --show-modules --windows-icon=%icon_dir% --recurse-to=multiprocessing --plugin-enable=multiprocessing --lto 1>%log_name% 2>&1 3>&1
+call nuitka "../%package_name:~1,-1%" --standalone --output-dir %output_dir% --show-progress --show-scons --show-modules --windows-icon=%icon_dir% --recurse-to=multiprocessing --plugin-enable=multiprocessing --include-module=autosub.cmdline_utils --include-module=autosub.server_utils --include-module=google.cloud.speech_v1p1beta1 --include-module=google.protobuf.json_format --include-package=googletrans --include-package=docx --include-package=pysubs2 --include-package=fuzzywuzzy --include-package=requests --include-package=websocket --lto 1>%log_name% 2>&1 3>&1
 pause>nul
\ No newline at end of file
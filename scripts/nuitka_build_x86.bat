@@ -9,4 +9,4 @@ call update_requirements.bat
 cd ..\
 pip install -r requirements.txt
 cd scripts
-nuitka "../%package_name:~1,-1%" --standalone --output-dir %output_dir% --show-progress --show-scons --show-modules --windows-icon=%icon_dir% --recurse-to=multiprocessing --plugin-enable=multiprocessing --lto --assume-yes-for-downloads --python-arch=x86
\ No newline at end of file
+nuitka "../%package_name:~1,-1%" --standalone --output-dir %output_dir% --show-progress --show-scons --show-modules --windows-icon=%icon_dir% --recurse-to=multiprocessing --plugin-enable=multiprocessing --include-module=autosub.cmdline_utils --include-module=autosub.server_utils --include-module=google.cloud.speech_v1p1beta1 --include-module=google.protobuf.json_format --include-package=googletrans --include-package=docx --include-package=pysubs2 --include-package=fuzzywuzzy --include-package=requests --include-package=websocket --lto --assume-yes-for-downloads --python-arch=x86
\ No newline at end of file
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark autosub's pipelines end to end against local stub servers.
+
+Workflows:
+    media          audio_or_video_prcs with each speech api
+    conversion     sub_conversion of a bilingual ass file and a youtube WebVTT file
+    translation    sub_trans with py-googletrans
+
+Usage: python scripts/pipeline_benchmark.py [--lengths 30,120] [--apis gsv2,gcsv1,xfyun,baidu]
+                                            [--workflows media,conversion,translation]
+                                            [--latency S] [--jitter S] [--error-rate R]
+                                            [--runs N] [--json] [--output FILE]
+"""
+# Import built-in modules
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+try:
+    import resource
+except ImportError:
+    resource = None  # pylint: disable=invalid-name
+
+# Any changes to the path and your own modules
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_PATH)
+
+import stub_servers  # pylint: disable=wrong-import-position
+
+SPEECH_APIS = ["gsv2", "gcsv1", "xfyun", "baidu"]
+WORKFLOWS = ["media", "conversion", "translation"]
+
+# autosub functions timed in the child process, grouped by stage
+STAGES = [
+    ("cmdline_utils", "convert_wav", "convert"),
+    ("auditok_utils", "auditok_gen_speech_regions", "detect"),
+    ("core", "bulk_audio_conversion", "split"),
+    ("core", "gsv2_to_text", "recognize"),
+    ("core", "gcsv1_to_text", "recognize"),
+    ("core", "xfyun_to_text", "recognize"),
+    ("core", "baidu_to_text", "recognize"),
+    ("core", "list_to_googletrans", "translate"),
+    ("sub_utils", "merge_bilingual_assfile", "merge"),
+    ("sub_utils", "merge_src_assfile", "merge"),
+    ("sub_utils", "split_dst_lf_src_assfile", "merge"),
+    ("core", "list_to_sub_str", "render"),
+    ("core", "list_to_ass_str", "render"),
+    ("core", "ssafile_to_sub_str", "render"),
+    ("sub_utils", "list_to_json_str", "render"),
+    ("sub_utils", "str_to_file", "write"),
+    ("cmdline_utils", "audio_or_video_prcs", "total"),
+    ("cmdline_utils", "sub_conversion", "total"),
+    ("cmdline_utils", "sub_trans", "total"),
+]
+
+SUB_WORDS = ["the", "quick", "brown", "fox", "jumps", "over", "a", "lazy", "dog",
+             "while", "autosub", "counts", "every", "single", "word"]
+
+
+def peak_rss_kb():
+    """
+    Return the peak resident set size of this process and its reaped children in KiB.
+    """
+    if not resource:
+        return {"self": None, "children": None}
+    scale = 1
+    if sys.platform == "darwin":
+        # bytes on macOS
+        scale = 1024
+    return {"self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale}
+
+
+def timed(func, name, stage_times):
+    """
+    Wrap a function and add its wall time to the stage.
+    """
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            item = stage_times.setdefault(name, {"seconds": 0.0, "calls": 0})
+            item["seconds"] += time.perf_counter() - start
+            item["calls"] += 1
+    return wrapper
+
+
+def run_child(spec):
+    """
+    Run a scenario in this process and write the result to spec["result_path"].
+    """
+    # pylint: disable=import-outside-toplevel
+    import googletrans.urls
+    from autosub import auditok_utils
+    from autosub import cmdline_utils
+    from autosub import constants
+    from autosub import core
+    from autosub import exceptions
+    from autosub import metrics_utils
+    from autosub import options
+    from autosub import sub_utils
+
+    http_url = spec["urls"]["http"]
+    host = http_url.split("://", 1)[1]
+    constants.GOOGLE_SPEECH_V2_API_URL = \
+        host + "/speech-api/v2/recognize?client=chromium&lang={lang}&key={key}"
+    constants.GOOGLE_CLOUD_SPEECH_API_URL = \
+        http_url + "/v1p1beta1/speech:recognize?key={api_key}"
+    constants.BAIDU_ASR_URL = http_url + "/server_api"
+    constants.BAIDU_PRO_ASR_URL = http_url + "/pro_api"
+    constants.BAIDU_TOKEN_URL = http_url + "/oauth/2.0/token"
+    googletrans.urls.TRANSLATE = "{host}/translate_a/single"
+
+    modules = {"cmdline_utils": cmdline_utils,
+               "auditok_utils": auditok_utils,
+               "core": core,
+               "sub_utils": sub_utils}
+    stage_times = {}
+    for module_name, func_name, stage in STAGES:
+        module = modules[module_name]
+        setattr(module, func_name, timed(getattr(module, func_name), stage, stage_times))
+
+    args = options.get_cmd_parser().parse_args(spec["argv"])
+    recorder = metrics_utils.enable()
+    status = "ok"
+    message = ""
+    start = time.perf_counter()
+    try:
+        if args.speech_config:
+            cmdline_utils.validate_speech_config(args)
+        cmdline_utils.input_prcs(args, input_m=None)
+    except (exceptions.ConversionException,
+            exceptions.SpeechToTextException) as err_msg:
+        status = "failed"
+        message = str(err_msg).strip()
+    except exceptions.AutosubException as err_msg:
+        message = str(err_msg).strip()
+    except Exception as error:  # pylint: disable=broad-except
+        status = "failed"
+        message = repr(error)
+    wall_time = time.perf_counter() - start
+
+    with open(spec["result_path"], "w", encoding="utf-8") as result_file:
+        json.dump({"status": status,
+                   "message": message,
+                   "wall_s": wall_time,
+                   "stages": stage_times,
+                   "peak_rss_kb": peak_rss_kb(),
+                   "metrics": recorder.report()}, result_file)
+    return 0
+
+
+def ms_to_timestamp(ms, sep="."):
+    """
+    Convert milliseconds to a hh:mm:ss.mmm timestamp.
+    """
+    return "{:02d}:{:02d}:{:02d}{}{:03d}".format(
+        ms // 3600000, ms // 60000 % 60, ms // 1000 % 60, sep, ms % 1000)
+
+
+def make_media(ffmpeg, path, length):
+    """
+    Generate a tone which is on for 2.5 s and off for 1.5 s
+    so that auditok finds a speech region every 4 s.
+    """
+    subprocess.run(
+        [ffmpeg, "-hide_banner", "-y", "-loglevel", "error",
+         "-f", "lavfi",
+         "-i", "aevalsrc=0.5*sin(2*PI*440*t)*lt(mod(t\\,4)\\,2.5):s=48000:d={}".format(length),
+         "-ac", "2", path],
+        check=True)
+
+
+def make_sentence(index, count):
+    """
+    Return a deterministic sentence.
+    """
+    return " ".join(SUB_WORDS[(index * 7 + i) % len(SUB_WORDS)] for i in range(count))
+
+
+def make_subtitles(work_dir, length):
+    """
+    Generate the subtitles inputs for a media length and return their paths and event count.
+    """
+    count = max(1, length // 4)
+    srt_lines = []
+    ass_lines = ["[Script Info]", "ScriptType: v4.00+", "",
+                 "[V4+ Styles]",
+                 "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, "
+                 "OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, "
+                 "ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, "
+                 "MarginL, MarginR, MarginV, Encoding",
+                 "Style: Default,Arial,20,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,"
+                 "0,0,0,0,100,100,0,0,1,2,2,2,10,10,10,1",
+                 "Style: Secondary,Arial,16,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,"
+                 "0,0,0,0,100,100,0,0,1,2,2,2,10,10,10,1",
+                 "",
+                 "[Events]",
+                 "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, "
+                 "Effect, Text"]
+    vtt_lines = ["WEBVTT", "Kind: captions", "Language: en", ""]
+    dst_events = []
+    src_events = []
+    for i in range(count):
+        start = i * 4000
+        end = start + 2500
+        sentence = make_sentence(i, 6)
+        srt_lines.extend([str(i + 1),
+                          "{} --> {}".format(ms_to_timestamp(start, ","),
+                                             ms_to_timestamp(end, ",")),
+                          sentence, ""])
+        ass_time = "{}:{:02d}:{:02d}.{:02d}"
+        start_str = ass_time.format(start // 3600000, start // 60000 % 60,
+                                    start // 1000 % 60, start % 1000 // 10)
+        end_str = ass_time.format(end // 3600000, end // 60000 % 60,
+                                  end // 1000 % 60, end % 1000 // 10)
+        dst_events.append("Dialogue: 0,{},{},Default,,0,0,0,,{}".format(
+            start_str, end_str, sentence[::-1]))
+        src_events.append("Dialogue: 0,{},{},Secondary,,0,0,0,,{}".format(
+            start_str, end_str, sentence))
+        # youtube WebVTT with word-level timestamps
+        words = sentence.split()
+        step = (end - start) // len(words)
+        word_line = words[0]
+        for j, word in enumerate(words[1:], 1):
+            word_line += "<{}><c> {}</c>".format(ms_to_timestamp(start + j * step), word)
+        vtt_lines.extend(["{} --> {} align:start position:0%".format(
+            ms_to_timestamp(start), ms_to_timestamp(end)), word_line, ""])
+
+    paths = {"srt": os.path.join(work_dir, "subs_{}.srt".format(length)),
+             "ass": os.path.join(work_dir, "bilingual_{}.ass".format(length)),
+             "vtt": os.path.join(work_dir, "words_{}.vtt".format(length))}
+    with open(paths["srt"], "w", encoding="utf-8") as sub_file:
+        sub_file.write("\n".join(srt_lines))
+    with open(paths["ass"], "w", encoding="utf-8") as sub_file:
+        sub_file.write("\n".join(ass_lines + src_events + dst_events) + "\n")
+    with open(paths["vtt"], "w", encoding="utf-8") as sub_file:
+        sub_file.write("\n".join(vtt_lines))
+    return paths, count
+
+
+def make_speech_configs(work_dir, ws_url):
+    """
+    Write the speech config files for the apis which need one.
+    """
+    configs = {
+        "xfyun": {"app_id": "stub", "api_key": "stub", "api_secret": "stub",
+                  "api_address": ws_url,
+                  "business": {"language": "zh_cn", "domain": "iat", "accent": "mandarin"}},
+        "baidu": {"app_id": "stub", "api_key": "stub", "api_secret": "stub",
+                  "disable_qps_limit": True,
+                  "config": {"format": "pcm", "rate": 16000, "channel": 1,
+                             "cuid": "python", "dev_pid": 1537}},
+    }
+    paths = {}
+    for api, config in configs.items():
+        paths[api] = os.path.join(work_dir, "{}.json".format(api))
+        with open(paths[api], "w", encoding="utf-8") as config_file:
+            json.dump(config, config_file)
+    return paths
+
+
+def get_scenarios(opts, work_dir, media, subtitles, speech_configs, urls):
+    """
+    Return the scenarios to run.
+    """
+    scenarios = []
+    concurrency = []
+    if opts.concurrency:
+        concurrency = ["-ac", str(opts.concurrency), "-sc", str(opts.concurrency)]
+    for length in opts.lengths:
+        out_base = os.path.join(work_dir, "out_{}".format(length))
+        if "media" in opts.workflows:
+            for api in opts.apis:
+                argv = ["-i", media[length], "-o", out_base + "_" + api,
+                        "-sapi", api, "-of", "src", "-F", "srt", "-y"] + concurrency
+                if api == "gsv2":
+                    argv += ["-S", "en-us", "-hsa"]
+                elif api == "gcsv1":
+                    argv += ["-S", "en-us", "-skey", "stub"]
+                else:
+                    argv += ["-sconf", speech_configs[api]]
+                scenarios.append({"workflow": "media", "api": api, "length_s": length,
+                                  "units": length, "unit_name": "audio_s", "argv": argv})
+        paths, count = subtitles[length]
+        if "conversion" in opts.workflows:
+            scenarios.append({"workflow": "conversion", "api": "ass", "length_s": length,
+                              "units": count * 2, "unit_name": "events",
+                              "argv": ["-i", paths["ass"], "-o", out_base + "_ass",
+                                       "-of", "dst-lf-src", "src-lf-dst", "join-events",
+                                       "-F", "ass", "-y"]})
+            scenarios.append({"workflow": "conversion", "api": "vtt", "length_s": length,
+                              "units": count, "unit_name": "events",
+                              "argv": ["-i", paths["vtt"], "-o", out_base + "_vtt",
+                                       "-er", paths["srt"], "-F", "ass", "-y"]})
+        if "translation" in opts.workflows:
+            scenarios.append({"workflow": "translation", "api": "googletrans",
+                              "length_s": length, "units": count, "unit_name": "events",
+                              "argv": ["-i", paths["srt"], "-o", out_base + "_trans",
+                                       "-SRC", "en", "-D", "zh-cn", "-slp", "0",
+                                       "-surl", urls["http"], "-F", "srt", "-y"]})
+    return scenarios
+
+
+def get_stub_stats(url):
+    """
+    Fetch the stub servers' counters.
+    """
+    with urllib.request.urlopen(url + "/stats") as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def diff_counter(after, before):
+    """
+    Return the counter changes.
+    """
+    return {key: value - before.get(key, 0)
+            for key, value in after.items() if value - before.get(key, 0)}
+
+
+def print_table(report):
+    """
+    Print a human readable summary.
+    """
+    print("{:<12} {:<12} {:>7} {:>9} {:>12} {:>11}  {}".format(
+        "workflow", "api", "length", "wall s", "throughput", "peak MiB", "stages"))
+    for item in report["results"]:
+        rss = item["peak_rss_kb"]
+        peak = max(value or 0 for value in rss.values()) / 1024
+        stages = ", ".join("{} {:.2f}".format(name, value["seconds"])
+                           for name, value in sorted(item["stages"].items())
+                           if name != "total")
+        throughput = "{:.1f} {}/s".format(item["throughput"], item["unit_name"][:5]) \
+            if item["status"] == "ok" else item["status"]
+        print("{:<12} {:<12} {:>6}s {:>9.2f} {:>12} {:>11.1f}  {}".format(
+            item["workflow"], item["api"], item["length_s"], item["wall_s"],
+            throughput, peak, stages))
+
+
+def main():  # pylint: disable=too-many-locals, too-many-statements
+    """
+    Run the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", default="30,120",
+                        help="Comma-separated synthetic media lengths in seconds.")
+    parser.add_argument("--apis", default=",".join(SPEECH_APIS),
+                        help="Comma-separated speech apis for the media workflow.")
+    parser.add_argument("--workflows", default=",".join(WORKFLOWS),
+                        help="Comma-separated workflows.")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Mean stub response latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.02,
+                        help="Max random stub latency deviation in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Probability of a stub error response.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Audio and speech concurrency passed to autosub.")
+    parser.add_argument("--work-dir", default=None,
+                        help="Keep the media and outputs in this directory.")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Show autosub's own output.")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the result in json format.")
+    parser.add_argument("--output", default=None,
+                        help="Write the json result to a file.")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    opts = parser.parse_args()
+
+    if opts.child:
+        return run_child(json.loads(opts.child))
+
+    opts.lengths = [int(length) for length in opts.lengths.split(",") if length]
+    opts.apis = [api for api in opts.apis.split(",") if api]
+    opts.workflows = [workflow for workflow in opts.workflows.split(",") if workflow]
+    for api in opts.apis:
+        if api not in SPEECH_APIS:
+            parser.error("unknown speech api: {}".format(api))
+    for workflow in opts.workflows:
+        if workflow not in WORKFLOWS:
+            parser.error("unknown workflow: {}".format(workflow))
+
+    from autosub import constants  # pylint: disable=import-outside-toplevel
+    from autosub import metadata  # pylint: disable=import-outside-toplevel
+    ffmpeg = constants.get_program_cmd("ffmpeg")
+    if "media" in opts.workflows and not ffmpeg:
+        print("ffmpeg not found.", file=sys.stderr)
+        return 1
+
+    if opts.work_dir:
+        work_dir = os.path.abspath(opts.work_dir)
+        os.makedirs(work_dir, exist_ok=True)
+    else:
+        work_dir = tempfile.mkdtemp(prefix="autosub_benchmark_")
+
+    state = stub_servers.StubState(latency=opts.latency,
+                                   jitter=opts.jitter,
+                                   error_rate=opts.error_rate,
+                                   seed=opts.seed)
+    servers, urls = stub_servers.start_stub_servers(state)
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_PATH + os.pathsep + env.get("PYTHONPATH", "")
+    # don't let the stub requests go through a proxy
+    env["NO_PROXY"] = env["no_proxy"] = "127.0.0.1,localhost"
+
+    try:
+        media = {}
+        subtitles = {}
+        for length in opts.lengths:
+            if "media" in opts.workflows:
+                media[length] = os.path.join(work_dir, "media_{}.wav".format(length))
+                if not os.path.isfile(media[length]):
+                    make_media(ffmpeg, media[length], length)
+            subtitles[length] = make_subtitles(work_dir, length)
+        speech_configs = make_speech_configs(work_dir, urls["ws"])
+        scenarios = get_scenarios(opts, work_dir, media, subtitles, speech_configs, urls)
+
+        report = {"autosub_version": metadata.VERSION,
+                  "python": platform.python_version(),
+                  "platform": platform.platform(),
+                  "cpu_count": os.cpu_count(),
+                  "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                  "settings": {"lengths": opts.lengths,
+                               "latency": opts.latency,
+                               "jitter": opts.jitter,
+                               "error_rate": opts.error_rate,
+                               "concurrency": opts.concurrency},
+                  "results": []}
+
+        result_path = os.path.join(work_dir, "child_result.json")
+        for scenario in scenarios:
+            for run in range(opts.runs):
+                if os.path.isfile(result_path):
+                    os.remove(result_path)
+                before = get_stub_stats(urls["http"])
+                spec = {"argv": scenario["argv"], "urls": urls, "result_path": result_path}
+                subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--child", json.dumps(spec)],
+                    cwd=REPO_PATH,
+                    env=env,
+                    stdout=None if opts.verbose else subprocess.DEVNULL,
+                    stderr=None if opts.verbose else subprocess.DEVNULL,
+                    check=False)
+                after = get_stub_stats(urls["http"])
+                if os.path.isfile(result_path):
+                    with open(result_path, encoding="utf-8") as result_file:
+                        result = json.load(result_file)
+                else:
+                    result = {"status": "crashed", "message": "", "wall_s": 0.0,
+                              "stages": {}, "peak_rss_kb": {"self": None, "children": None}}
+                item = {key: scenario[key]
+                        for key in ("workflow", "api", "length_s", "unit_name")}
+                item["run"] = run
+                item.update(result)
+                item["throughput"] = scenario["units"] / result["wall_s"] \
+                    if result["wall_s"] else 0.0
+                item["stub"] = {"requests": diff_counter(after["requests"],
+                                                         before["requests"]),
+                                "errors": diff_counter(after["errors"], before["errors"])}
+                report["results"].append(item)
+    finally:
+        for stub_server in servers:
+            stub_server.shutdown()
+            stub_server.server_close()
+        if not opts.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if opts.output:
+        with open(opts.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=4)
+    if opts.json:
+        print(json.dumps(report, indent=4))
+    else:
+        print_table(report)
+
+    return 1 if any(item["status"] != "ok" for item in report["results"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
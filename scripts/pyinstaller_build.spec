@@ -16,11 +16,27 @@ a = Analysis([r"..\autosub\__main__.py",
              r"..\autosub\api_google.py",
              r"..\autosub\api_xfyun.py",
              r"..\autosub\api_baidu.py",
-             r"..\autosub\sub_utils.py",],
+             r"..\autosub\sub_utils.py",
+             r"..\autosub\auditok_utils.py",
+             r"..\autosub\live_utils.py",
+             r"..\autosub\server_utils.py",
+             r"..\autosub\lazy_utils.py",],
              pathex=[r'C:\Program Files (x86)\Windows Kits\10\Redist\ucrt\DLLs\x64'],
              binaries=[],
              datas=[],
-             hiddenimports=["google.cloud.speech"],
+             hiddenimports=["google.cloud.speech",
+                            # imported by autosub.lazy_utils.lazy_import
+                            "google.cloud.speech_v1p1beta1",
+                            "google.protobuf.json_format",
+                            "googletrans",
+                            "docx",
+                            "pysubs2",
+                            "fuzzywuzzy.fuzz",
+                            "fuzzywuzzy.process",
+                            "requests",
+                            "websocket",
+                            "autosub.cmdline_utils",
+                            "autosub.server_utils"],
              hookspath=[],
              runtime_hooks=[],
              excludes=[],
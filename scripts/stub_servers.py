@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local stub servers which mimic the speech-to-text and translation apis used by autosub.
+
+HTTP server routes:
+    POST /speech-api/v2/recognize       Google Speech V2
+    POST /v1p1beta1/speech:recognize    Google Cloud Speech-to-Text V1P1Beta1 REST
+    POST /oauth/2.0/token               Baidu ASR token
+    POST /server_api, /pro_api          Baidu ASR
+    GET  /                              googletrans token page
+    GET  /translate_a/single            googletrans
+    POST /translate, /detect            LibreTranslate
+    GET  /stats                         request and error counts
+WebSocket server route:
+    /v2/iat                             Xun Fei Yun Speech-to-Text
+
+Usage: python scripts/stub_servers.py [--latency S] [--jitter S] [--error-rate R]
+"""
+# Import built-in modules
+import argparse
+import base64
+import collections
+import hashlib
+import json
+import math
+import random
+import re
+import socketserver
+import struct
+import sys
+import threading
+import time
+from http import server
+from urllib.parse import parse_qs, urlparse
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+WORDS = ["stub", "speech", "server", "returns", "some", "words",
+         "for", "the", "autosub", "benchmark", "audio", "fragment"]
+
+
+class StubState:
+    """
+    Class for the latency, error rate and counters shared by all the stub servers.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = collections.Counter()
+        self.errors = collections.Counter()
+
+    def hit(self, name):
+        """
+        Count a request, sleep for the latency and return whether it should fail.
+        """
+        with self.lock:
+            self.requests[name] += 1
+            delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+            is_error = self.random.random() < self.error_rate
+            if is_error:
+                self.errors[name] += 1
+        if delay > 0:
+            time.sleep(delay)
+        return is_error
+
+    def stats(self):
+        """
+        Return the counters as a dict.
+        """
+        with self.lock:
+            return {"requests": dict(self.requests),
+                    "errors": dict(self.errors)}
+
+
+def fake_transcript(audio_size, bytes_per_word=8000):
+    """
+    Return a deterministic fake transcript whose length grows with the audio size.
+    """
+    count = max(1, audio_size // bytes_per_word)
+    return " ".join(WORDS[(audio_size + i) % len(WORDS)] for i in range(count))
+
+
+# line ids like "[#12] " are kept as a real translator does
+LINE_ID_REGEX = re.compile(r"^(\[#\d+\] )?(.*)$")
+
+
+def fake_translation(text):
+    """
+    Return a fake translation which keeps the line count and the line ids.
+    """
+    lines = []
+    for line in text.split("\n"):
+        line_id, content = LINE_ID_REGEX.match(line).groups()
+        lines.append((line_id or "") + content[::-1])
+    return "\n".join(lines)
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, server.HTTPServer):
+    """
+    Class for a multi-threaded http server.
+    """
+    daemon_threads = True
+
+
+class StubHTTPRequestHandler(server.BaseHTTPRequestHandler):
+    """
+    Class for handling the http stub api requests.
+    """
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def send_body(self, code, body, content_type="application/json; charset=utf-8"):
+        """
+        Send a response body.
+        """
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_body(self):
+        """
+        Send an internal error response whose body isn't json.
+        """
+        self.send_body(500, "stub error", content_type="text/plain; charset=utf-8")
+
+    def read_body(self):
+        """
+        Read the request body.
+        """
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length)
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Handle the speech-to-text, token and LibreTranslate requests.
+        """
+        path = urlparse(self.path).path
+        body = self.read_body()
+
+        if path == "/speech-api/v2/recognize":
+            if self.state.hit("gsv2"):
+                self.send_error_body()
+                return
+            # the api returns an empty result line before the real one
+            lines = [json.dumps({"result": []}),
+                     json.dumps({"result": [{"alternative": [
+                         {"transcript": fake_transcript(len(body)), "confidence": 0.9}],
+                                             "final": True}],
+                                 "result_index": 0})]
+            self.send_body(200, "\n".join(lines) + "\n")
+
+        elif path == "/v1p1beta1/speech:recognize":
+            if self.state.hit("gcsv1"):
+                self.send_error_body()
+                return
+            try:
+                audio_size = len(base64.b64decode(
+                    json.loads(body.decode("utf-8"))["audio"]["content"]))
+            except (ValueError, KeyError, TypeError):
+                self.send_body(400, "{\"error\": \"bad request\"}")
+                return
+            self.send_body(200, json.dumps({"results": [{"alternatives": [
+                {"transcript": fake_transcript(audio_size), "confidence": 0.9}]}]}))
+
+        elif path == "/oauth/2.0/token":
+            self.state.hit("baidu_token")
+            self.send_body(200, json.dumps({"access_token": "stub-token",
+                                            "scope": "audio_voice_assistant_get",
+                                            "expires_in": 2592000}))
+
+        elif path in ("/server_api", "/pro_api"):
+            if self.state.hit("baidu"):
+                self.send_body(200, json.dumps({"err_no": 3307,
+                                                "err_msg": "stub error"}))
+                return
+            try:
+                audio_size = json.loads(body.decode("utf-8"))["len"]
+            except (ValueError, KeyError):
+                self.send_body(400, "{\"error\": \"bad request\"}")
+                return
+            self.send_body(200, json.dumps({"err_no": 0,
+                                            "err_msg": "success.",
+                                            "result": [fake_transcript(audio_size)]},
+                                           ensure_ascii=False))
+
+        elif path == "/translate":
+            if self.state.hit("libre"):
+                self.send_error_body()
+                return
+            request = json.loads(body.decode("utf-8"))
+            result = {"translatedText": fake_translation(request["q"])}
+            if request.get("source") == "auto":
+                result["detectedLanguage"] = {"language": "en", "confidence": 90.0}
+            self.send_body(200, json.dumps(result, ensure_ascii=False))
+
+        elif path == "/detect":
+            self.state.hit("libre_detect")
+            self.send_body(200, json.dumps([{"language": "en", "confidence": 90.0}]))
+
+        else:
+            self.send_body(404, "{\"error\": \"not found\"}")
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Handle the translation and stats requests.
+        """
+        url = urlparse(self.path)
+
+        if url.path == "/":
+            hour = math.floor(time.time() * 1000 / 3600000.0)
+            self.send_body(200,
+                           "<html><script>tkk:'{hour}.123456789'</script></html>".format(
+                               hour=hour),
+                           content_type="text/html; charset=utf-8")
+
+        elif url.path == "/translate_a/single":
+            if self.state.hit("googletrans"):
+                self.send_error_body()
+                return
+            query = parse_qs(url.query)
+            text = query.get("q", [""])[0]
+            src = query.get("sl", ["auto"])[0]
+            if src == "auto":
+                src = "en"
+            self.send_body(200, json.dumps(
+                [[[fake_translation(text), text, None, None, 1]], None, src],
+                ensure_ascii=False))
+
+        elif url.path == "/stats":
+            self.send_body(200, json.dumps(self.state.stats()))
+
+        else:
+            self.send_body(404, "{\"error\": \"not found\"}")
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        return
+
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    Class for a multi-threaded tcp server.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class StubWebSocketHandler(socketserver.StreamRequestHandler):
+    """
+    Class for a minimal WebSocket server which mimics the Xun Fei Yun api.
+    """
+    state = None
+
+    def handshake(self):
+        """
+        Read the upgrade request and accept it.
+        """
+        key = None
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b"\r\n", b"\n"):
+                break
+            name, _sep, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "sec-websocket-key":
+                key = value.strip()
+        if not key:
+            return False
+        accept = base64.b64encode(hashlib.sha1(
+            (key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+        self.wfile.write(("HTTP/1.1 101 Switching Protocols\r\n"
+                          "Upgrade: websocket\r\n"
+                          "Connection: Upgrade\r\n"
+                          "Sec-WebSocket-Accept: {accept}\r\n\r\n").format(
+                              accept=accept).encode("ascii"))
+        return True
+
+    def read_frame(self):
+        """
+        Read a frame and return its opcode and payload.
+        """
+        header = self.rfile.read(2)
+        if len(header) < 2:
+            return None, b""
+        opcode = header[0] & 0x0f
+        is_masked = header[1] & 0x80
+        length = header[1] & 0x7f
+        if length == 126:
+            length = struct.unpack(">H", self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if is_masked else b""
+        payload = self.rfile.read(length)
+        if is_masked:
+            payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+        return opcode, payload
+
+    def send_frame(self, opcode, payload):
+        """
+        Send an unmasked frame.
+        """
+        length = len(payload)
+        if length < 126:
+            header = struct.pack(">BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+        self.wfile.write(header + payload)
+
+    def handle(self):
+        if not self.handshake():
+            return
+        audio_size = 0
+        while True:
+            opcode, payload = self.read_frame()
+            if opcode is None:
+                return
+            if opcode == 0x8:
+                self.send_frame(0x8, payload[:2])
+                return
+            if opcode == 0x9:
+                self.send_frame(0xa, payload)
+                continue
+            if opcode != 0x1:
+                continue
+            try:
+                data = json.loads(payload.decode("utf-8"))["data"]
+                audio_size += len(base64.b64decode(data["audio"]))
+                status = data["status"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            if status != 2:
+                continue
+            if self.state.hit("xfyun"):
+                result = {"code": 10110, "message": "stub error", "sid": "stub"}
+            else:
+                result = {"code": 0,
+                          "message": "success",
+                          "sid": "stub",
+                          "data": {"status": 2,
+                                   "result": {"ws": [
+                                       {"cw": [{"w": word + " "}]}
+                                       for word in fake_transcript(audio_size).split()]}}}
+            self.send_frame(0x1, json.dumps(result).encode("utf-8"))
+
+
+def start_stub_servers(state, host="127.0.0.1", http_port=0, ws_port=0):
+    """
+    Start the http and WebSocket stub servers in daemon threads.
+    Return the servers and their base urls.
+    """
+    http_handler = type("BoundStubHTTPRequestHandler",
+                        (StubHTTPRequestHandler, ),
+                        {"state": state})
+    ws_handler = type("BoundStubWebSocketHandler",
+                      (StubWebSocketHandler, ),
+                      {"state": state})
+    httpd = ThreadingHTTPServer((host, http_port), http_handler)
+    wsd = ThreadingTCPServer((host, ws_port), ws_handler)
+    for stub_server in (httpd, wsd):
+        thread = threading.Thread(target=stub_server.serve_forever)
+        thread.daemon = True
+        thread.start()
+    urls = {"http": "http://{host}:{port}".format(host=host, port=httpd.server_address[1]),
+            "ws": "ws://{host}:{port}".format(host=host, port=wsd.server_address[1])}
+    return (httpd, wsd), urls
+
+
+def main():
+    """
+    Run the stub servers until KeyboardInterrupt.
+    """
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--http-port", type=int, default=0)
+    parser.add_argument("--ws-port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Mean response latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Max random latency deviation in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Probability of an error response.")
+    parser.add_argument("--seed", type=int, default=None)
+    opts = parser.parse_args()
+
+    state = StubState(latency=opts.latency,
+                      jitter=opts.jitter,
+                      error_rate=opts.error_rate,
+                      seed=opts.seed)
+    servers, urls = start_stub_servers(state,
+                                       host=opts.host,
+                                       http_port=opts.http_port,
+                                       ws_port=opts.ws_port)
+    print(json.dumps(urls))
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for stub_server in servers:
+            stub_server.shutdown()
+            stub_server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests autosub's translated line alignment.
+"""
+# Import built-in modules
+import unittest
+
+# Any changes to the path and your own modules
+from autosub import core
+
+
+class AlignTransLinesTest(unittest.TestCase):
+    """
+    Tests for core.align_trans_lines.
+    """
+
+    def test_aligned(self):
+        """
+        Empty source lines get empty results and the others keep their order.
+        """
+        self.assertEqual(core.align_trans_lines(["a", "", "b"], "A\n\nB\n"), ["A", "", "B"])
+
+    def test_fewer_lines(self):
+        """
+        Fewer translated lines can't be aligned.
+        """
+        self.assertIsNone(core.align_trans_lines(["a", "b"], "A B"))
+
+    def test_more_lines(self):
+        """
+        More translated lines can't be aligned instead of being dropped.
+        """
+        self.assertIsNone(core.align_trans_lines(["a", "b"], "A\nB\nC"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests autosub's subtitles events merging and splitting and youtube WebVTT parsing.
+"""
+# Import built-in modules
+import os
+import random
+import tempfile
+import unittest
+
+# Import third-party modules
+import pysubs2
+
+# Any changes to the path and your own modules
+from autosub import sub_utils
+
+
+def make_ssafile(events):
+    """
+    Return a subtitles file of the events' start, end, text, style and comment flag.
+    """
+    ssafile = pysubs2.SSAFile()
+    for start, end, text, style, *is_comment in events:
+        event = pysubs2.SSAEvent(start=start, end=end, text=text, style=style)
+        event.is_comment = bool(is_comment and is_comment[0])
+        ssafile.events.append(event)
+    return ssafile
+
+
+def get_events(ssafile):
+    """
+    Return the subtitles file's events as tuples of start, end, text and style.
+    """
+    return [(event.start, event.end, event.text, event.style) for event in ssafile.events]
+
+
+class MergeBilingualTest(unittest.TestCase):
+    """
+    Tests for sub_utils.merge_bilingual_assfile.
+    """
+
+    def test_same_times(self):
+        """
+        Events with the same start or end are merged in dst-lf-src order.
+        """
+        subtitles = make_ssafile([
+            (0, 1000, "hello", "Src"), (0, 1000, "你好", "Dst"),
+            (1000, 2000, "world", "Src"), (1200, 2000, "世界", "Dst"),
+            (3000, 4000, "alone", "Src"), (5000, 6000, "note", "Src", True)])
+        self.assertEqual(get_events(sub_utils.merge_bilingual_assfile(subtitles)), [
+            (0, 1000, "你好\\N{\\rSrc}hello", "Dst"),
+            (1200, 2000, "世界\\N{\\rSrc}world", "Dst"),
+            (3000, 4000, "alone", "Src"),
+            (5000, 6000, "note", "Src")])
+
+    def test_overlaps(self):
+        """
+        The uncovered parts of an overlapping event are kept
+        and the events of the other styles are placed by their first rows.
+        """
+        subtitles = make_ssafile([
+            (0, 2000, "source one", "Src"), (500, 1500, "目标一", "Dst"),
+            (3000, 4000, "two", "Src"), (3000, 3500, "二", "Dst"),
+            (5000, 6000, "alone", "Src"), (7000, 8000, "孤", "Dst"),
+            (100, 200, "sign", "Sign")])
+        self.assertEqual(get_events(sub_utils.merge_bilingual_assfile(subtitles)), [
+            (500, 1500, "目标一\\N{\\rSrc}source one", "Dst"),
+            (3000, 3500, "二\\N{\\rSrc}two", "Dst"),
+            (0, 500, "source one", "Src"),
+            (1500, 2000, "source one", "Src"),
+            (5000, 6000, "alone", "Src"),
+            (7000, 8000, "孤", "Dst"),
+            (100, 200, "sign", "Sign")])
+        self.assertEqual(get_events(sub_utils.merge_bilingual_assfile(subtitles, order=0))[:2], [
+            (500, 1500, "source one\\N{\\rDst}目标一", "Src"),
+            (3000, 4000, "two\\N{\\rDst}二", "Src")])
+
+    def test_source_kept(self):
+        """
+        The source subtitles file isn't changed.
+        """
+        subtitles = make_ssafile([(0, 2000, "source", "Src"), (500, 1500, "目标", "Dst")])
+        sub_utils.merge_bilingual_assfile(subtitles)
+        self.assertEqual(get_events(subtitles),
+                         [(0, 2000, "source", "Src"), (500, 1500, "目标", "Dst")])
+
+
+class SplitBilingualTest(unittest.TestCase):
+    """
+    Tests for sub_utils.split_dst_lf_src_assfile.
+    """
+
+    def setUp(self):
+        self.subtitles = make_ssafile([
+            (0, 1000, "你好\\N{\\rSrc}hello", "Dst"),
+            (1000, 2000, "世界\\N{\\rSrc\\i1}world", "Dst"),
+            (2000, 3000, "单行", "Dst"),
+            (2000, 3000, "a\\Nb", "Dst"),
+            (3000, 4000, "x", "Other")])
+
+    def test_reset_styles(self):
+        """
+        The lines after a style reset take the reset style and keep the other tags.
+        """
+        self.assertEqual(get_events(sub_utils.split_dst_lf_src_assfile(self.subtitles)), [
+            (3000, 4000, "x", "Other"),
+            (0, 1000, "你好", "Dst"),
+            (1000, 2000, "世界", "Dst"),
+            (2000, 3000, "单行", "Dst"),
+            (2000, 3000, "a", "Dst"),
+            (0, 1000, "hello", "Src"),
+            (1000, 2000, "{\\i1}world", "Src"),
+            (2000, 3000, "b", "Dst")])
+
+    def test_style_names(self):
+        """
+        The given style names are used for the lines without a style reset.
+        """
+        self.assertEqual(get_events(sub_utils.split_dst_lf_src_assfile(
+            self.subtitles, order=0, style_name=["A"]))[1:4], [
+                (0, 1000, "hello", "Src"),
+                (1000, 2000, "{\\i1}world", "Src"),
+                (2000, 3000, "b", "A")])
+        self.assertEqual(get_events(sub_utils.split_dst_lf_src_assfile(
+            self.subtitles, style_name=["A", "B"]))[-1], (2000, 3000, "b", "B"))
+
+    def test_round_trip(self):
+        """
+        Splitting a merged subtitles file gives back the merged events.
+        """
+        subtitles = make_ssafile([
+            (0, 1000, "hello", "Src"), (0, 1000, "你好", "Dst"),
+            (1000, 2000, "world", "Src"), (1000, 2000, "世界", "Dst")])
+        new_subtitles = sub_utils.split_dst_lf_src_assfile(
+            sub_utils.merge_bilingual_assfile(subtitles))
+        self.assertEqual(sorted(get_events(new_subtitles)), sorted(get_events(subtitles)))
+
+
+def merge_src(events, max_join_size=30, avoid_split=False):
+    """
+    Return the events of a source subtitles file merged with the stop words "and" and "but".
+    """
+    return get_events(sub_utils.merge_src_assfile(
+        make_ssafile(events),
+        stop_words_set_1={"and"},
+        stop_words_set_2={"but"},
+        max_join_size=max_join_size,
+        max_delta_time=300,
+        avoid_split=avoid_split))
+
+
+class MergeSrcTest(unittest.TestCase):
+    """
+    Tests for sub_utils.merge_src_assfile.
+    """
+
+    def test_join(self):
+        """
+        Close events are joined unless a delimiter, a comment, a gap or a style is between them.
+        """
+        self.assertEqual(merge_src([
+            (0, 1000, "one two", "Default"), (1100, 2000, "three\\Nfour.", "Default"),
+            (2100, 2500, "five", "Default"), (2600, 3000, "six", "Default", True),
+            (3100, 3500, "seven", "Default"), (4000, 4500, "eight", "Default"),
+            (50, 60, "sign", "Sign")]), [
+                (50, 60, "sign", "Sign"),
+                (0, 2000, "one two three four.", "Default"),
+                (2100, 2500, "five", "Default"),
+                (2600, 3000, "six", "Default"),
+                (3100, 3500, "seven", "Default"),
+                (4000, 4500, "eight", "Default")])
+
+    def test_split(self):
+        """
+        A joint text longer than max_join_size is split at a stop word.
+        """
+        self.assertEqual(merge_src([
+            (0, 1000, "one two three four", "Default"),
+            (1000, 2000, "five six and seven eight", "Default")]), [
+                (0, 1302, "{\\r}one two three four five six", "Default"),
+                (1302, 2000, "{\\r}and seven eight", "Default")])
+        self.assertEqual(merge_src([
+            (0, 1000, "one two three four", "Default"),
+            (1000, 2000, "five six and seven eight", "Default")], avoid_split=True), [
+                (0, 1000, "one two three four", "Default"),
+                (1000, 2000, "five six and seven eight", "Default")])
+
+    def test_blank_events(self):
+        """
+        Blank events are kept and nothing is joined with them.
+        """
+        events = [(0, 100, "", "Default"), (100, 200, "a", "Default"),
+                  (200, 300, "", "Default"), (300, 400, " ", "Default"),
+                  (400, 500, "b", "Default")]
+        self.assertEqual(merge_src(events), events)
+
+    def test_words_kept(self):
+        """
+        Each word is kept once whether the events are split or not.
+        """
+        rand = random.Random(2)
+        vocabulary = ["a", "bb", "and", "ccc", "dddd", "e.", "", "but"]
+        for _i in range(100):
+            events = []
+            end = 0
+            for _j in range(rand.randint(1, 15)):
+                start = end + rand.randint(0, 400)
+                end = start + rand.randint(100, 900)
+                text = " ".join(rand.choice(vocabulary)
+                                for _k in range(rand.randint(0, 6))).strip()
+                events.append((start, end, text, rand.choice(("Default", "Default", "Other")),
+                               rand.random() < 0.1))
+            words = sorted(word for event in events for word in event[2].split())
+            for avoid_split in (False, True):
+                new_events = merge_src(events, max_join_size=20, avoid_split=avoid_split)
+                self.assertEqual(sorted(word for event in new_events
+                                        for word in event[2].replace("{\\r}", "").split()),
+                                 words)
+
+VTT_HEADER = "WEBVTT\nKind: captions\nLanguage: en\n\n"
+
+VTT_WORD_LEVEL = VTT_HEADER + """00:00:00.000 --> 00:00:02.000 align:start position:0%
+ 
+hello<00:00:00.500><c> big</c><00:00:01.000><c> world</c>
+
+00:00:02.000 --> 00:00:02.010 align:start position:0%
+hello big world
+ 
+
+00:00:02.010 --> 00:00:04.000 align:start position:0%
+hello big world
+next<00:00:02.500><c> line</c><00:00:03.000><c> two words</c>
+
+00:00:04.000 --> 00:00:04.010 align:start position:0%
+next line two words
+ 
+"""
+
+VTT_SENTENCE_LEVEL = VTT_HEADER + """00:00:01.000 --> 00:00:02.000
+hello
+
+00:00:02.000 --> 00:00:03.500
+hello
+world
+"""
+
+
+class YTBWebVTTTest(unittest.TestCase):
+    """
+    Tests for sub_utils.YTBWebVTT.from_file.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def from_text(self, text):
+        """
+        Return the youtube WebVTT words of a WebVTT text.
+        """
+        path = os.path.join(self.temp_dir.name, "test.vtt")
+        with open(path, "w", encoding="utf-8") as file_p:
+            file_p.write(text)
+        subs = sub_utils.YTBWebVTT.from_file(path)
+        self.assertEqual(subs.path, path)
+        return [(vtt_word.start, vtt_word.end, vtt_word.word) for vtt_word in subs.vtt_words]
+
+    def test_word_level(self):
+        """
+        Words are timed by the word-level timestamps
+        and the repeated sentence lines are skipped.
+        """
+        vtt_words = self.from_text(VTT_WORD_LEVEL)
+        self.assertEqual(vtt_words[:5], [
+            (0, 500, "hello"), (500, 1000, "big"), (1000, 2010, "world"),
+            (2010, 2500, "next"), (2500, 3000, "line")])
+        self.assertEqual([vtt_word[2] for vtt_word in vtt_words[5:]], ["two", "words"])
+
+    def test_sentence_level(self):
+        """
+        Single words without word-level timestamps start where the last word ends.
+        """
+        self.assertEqual(self.from_text(VTT_SENTENCE_LEVEL),
+                         [(1000, 1500, "hello"), (1500, 2000, "world")])
+
+    def test_no_words(self):
+        """
+        A WebVTT file without cues has no words.
+        """
+        self.assertEqual(self.from_text(VTT_HEADER), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests autosub's text size partition.
+"""
+# Import built-in modules
+import random
+import unittest
+
+# Any changes to the path and your own modules
+from autosub import text_utils
+
+
+def partition(text_list, max_size, extra_size=0):
+    """
+    Return the chunks of a text list partitioned by the char counts.
+    """
+    return text_utils.TextWidthIndex(text_list).partition(
+        max_size, key="chars", extra_size=extra_size)
+
+
+class PartitionTest(unittest.TestCase):
+    """
+    Tests for text_utils.TextWidthIndex.partition.
+    """
+
+    def test_empty_list(self):
+        """
+        An empty list or a list of empty texts has no chunks.
+        """
+        self.assertEqual(partition([], 10), [])
+        self.assertEqual(partition(["", ""], 10), [])
+
+    def test_too_long_line(self):
+        """
+        A text longer than max_size takes a chunk alone.
+        """
+        self.assertEqual(partition(["abcdefgh"], 3), [(0, 1)])
+        self.assertEqual(partition(["ab", "cdefgh", "i"], 3), [(0, 1), (1, 2), (2, 3)])
+
+    def test_no_max_size(self):
+        """
+        A max_size not bigger than 0 puts all the texts in one chunk.
+        """
+        self.assertEqual(partition(["ab", "cd", "ef"], 0), [(0, 3)])
+        self.assertEqual(partition(["ab", "cd", "ef"], -1), [(0, 3)])
+
+    def test_exact_boundaries(self):
+        """
+        A chunk may be exactly max_size but not bigger.
+        """
+        self.assertEqual(partition(["ab", "cd", "ef"], 4), [(0, 2), (2, 3)])
+        self.assertEqual(partition(["ab", "cd", "ef"], 3), [(0, 1), (1, 2), (2, 3)])
+        self.assertEqual(partition(["ab", "cd", "ef"], 6), [(0, 3)])
+        self.assertEqual(partition(["ab", "", "cd"], 5, extra_size=1), [(0, 2), (2, 3)])
+        self.assertEqual(partition(["ab", "", "cd"], 6, extra_size=1), [(0, 3)])
+
+    def test_empty_texts(self):
+        """
+        Empty texts go with the chunk before them and the last chunk ends at the list end.
+        """
+        self.assertEqual(partition(["", "ab", "", "cd", ""], 2), [(0, 3), (3, 5)])
+
+    def test_chunks_cover_list(self):
+        """
+        The chunks cover the list in order and only a single text exceeds max_size.
+        """
+        rand = random.Random(1)
+        for _i in range(200):
+            text_list = ["x" * rand.choice((0, 0, 1, 3, 5, 9)) for _j in range(rand.randint(1, 30))]
+            max_size = rand.randint(1, 12)
+            chunks = partition(text_list, max_size)
+            if not any(text_list):
+                self.assertEqual(chunks, [])
+                continue
+            self.assertEqual(chunks[0][0], 0)
+            self.assertEqual(chunks[-1][1], len(text_list))
+            for (_start, end), (next_start, _end) in zip(chunks, chunks[1:]):
+                self.assertEqual(end, next_start)
+            for start, end in chunks:
+                texts = [text for text in text_list[start:end] if text]
+                self.assertTrue(texts)
+                self.assertTrue(sum(map(len, texts)) <= max_size or len(texts) == 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
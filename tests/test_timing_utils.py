@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests autosub's speech region packing and word timing.
+"""
+# Import built-in modules
+import unittest
+
+# Any changes to the path and your own modules
+from autosub import timing_utils
+
+
+def is_ordered(regions):
+    """
+    Return whether the regions are ordered without overlaps.
+    """
+    return all(start <= end for start, end in regions) \
+        and all(regions[k][1] <= regions[k + 1][0] for k in range(len(regions) - 1))
+
+
+def gcsv1_result(words):
+    """
+    Return a Google Cloud Speech-to-Text result of the words' start, end and text.
+    """
+    return {"results": [{"alternatives": [{"words": [
+        {"startTime": "{:.3f}s".format(start / 1000),
+         "endTime": "{:.3f}s".format(end / 1000),
+         "word": text} for start, end, text in words]}]}]}
+
+
+def xfyun_result(words):
+    """
+    Return Xun Fei Yun messages of the words' start and text. They have no end time.
+    """
+    return [{"data": {"result": {"ws": [
+        {"bg": start // 10, "cw": [{"w": text}]} for start, text in words]}}}]
+
+
+class PackRegionsTest(unittest.TestCase):
+    """
+    Tests for timing_utils.pack_regions.
+    """
+
+    def test_gap_edges(self):
+        """
+        A gap equal to max_gap is packed and a bigger or negative one isn't.
+        """
+        regions = [(0, 1000), (1300, 2000), (2301, 3000), (2900, 3500)]
+        packed_regions, groups = timing_utils.pack_regions(regions, max_size=10000, max_gap=300)
+        self.assertEqual(packed_regions, [(0, 2000), (2301, 3000), (2900, 3500)])
+        self.assertEqual(groups, [[0, 1], [2], [3]])
+
+    def test_size_edges(self):
+        """
+        A packed region equal to max_size is allowed and a longer one isn't.
+        """
+        regions = [(0, 1000), (1100, 2000), (2100, 3001)]
+        packed_regions, groups = timing_utils.pack_regions(regions, max_size=2000, max_gap=500)
+        self.assertEqual(packed_regions, [(0, 2000), (2100, 3001)])
+        self.assertEqual(groups, [[0, 1], [2]])
+
+    def test_groups_cover_regions(self):
+        """
+        Each region is in one group in order and the packed regions are ordered.
+        """
+        regions = [(k * 700, k * 700 + 400 + k % 3 * 100) for k in range(20)]
+        packed_regions, groups = timing_utils.pack_regions(regions, max_size=2500, max_gap=300)
+        self.assertEqual([index for group in groups for index in group], list(range(20)))
+        self.assertTrue(is_ordered(packed_regions))
+        for (start, end), group in zip(packed_regions, groups):
+            self.assertEqual((start, end), (regions[group[0]][0], regions[group[-1]][1]))
+
+    def test_empty(self):
+        """
+        No regions are packed into nothing.
+        """
+        self.assertEqual(timing_utils.pack_regions([], max_size=1000, max_gap=100), ([], []))
+
+
+class SplitTranscriptTest(unittest.TestCase):
+    """
+    Tests for timing_utils.split_transcript and timing_utils.unpack_text_list.
+    """
+
+    def test_words(self):
+        """
+        Words are split at their timestamps.
+        """
+        words = [(0, 400, "hello"), (500, 900, "big"), (2100, 2500, "world")]
+        self.assertEqual(
+            timing_utils.split_transcript("hello big world", [(0, 1000), (2000, 3000)], words),
+            ["hello big", "world"])
+
+    def test_without_words(self):
+        """
+        Characters are split in proportion to the sub-region lengths.
+        """
+        parts = timing_utils.split_transcript("一二三四五六", [(0, 1000), (1500, 3500)])
+        self.assertEqual(parts, ["一二", "三四五六"])
+
+    def test_count_mismatch(self):
+        """
+        The transcript is kept when it doesn't match the words.
+        """
+        words = [(0, 400, "hello"), (2100, 2500, "bigworld")]
+        parts = timing_utils.split_transcript("hello big world", [(0, 1000), (2000, 3000)], words)
+        self.assertEqual(parts, ["hello big", "world"])
+
+    def test_xfyun_words(self):
+        """
+        Xun Fei Yun words without end times are split at their starts.
+        """
+        words = timing_utils.get_words(xfyun_result([(100, "你好"), (2200, "世界")]))
+        self.assertEqual(words, [(100, None, "你好"), (2200, None, "世界")])
+        self.assertEqual(
+            timing_utils.split_transcript("你好世界", [(0, 1000), (2000, 3000)], words),
+            ["你好", "世界"])
+
+    def test_unpack_round_trip(self):
+        """
+        The unpacked texts of each packed region join back to its transcript.
+        """
+        regions = [(0, 800), (1000, 1500), (1700, 2600), (5000, 5600), (5800, 6000)]
+        packed_regions, groups = timing_utils.pack_regions(regions, max_size=5000, max_gap=500)
+        text_list = ["one two three four five six seven", "八九十"]
+        result_list = [gcsv1_result([(0, 300, "one"), (400, 700, "two"), (1000, 1300, "three"),
+                                     (1700, 1900, "four"), (2000, 2200, "five"),
+                                     (2300, 2500, "six"), (2500, 2600, "seven")]),
+                       xfyun_result([(0, "八"), (300, "九"), (850, "十")])]
+        for results in (None, result_list):
+            unpacked_text_list = timing_utils.unpack_text_list(
+                text_list, regions, packed_regions, groups, result_list=results)
+            self.assertEqual(len(unpacked_text_list), len(regions))
+            self.assertEqual(
+                " ".join(text for text in unpacked_text_list[:3] if text), text_list[0])
+            self.assertEqual("".join(unpacked_text_list[3:]), text_list[1])
+
+    def test_empty_transcript(self):
+        """
+        An empty transcript gives an empty text for each sub-region.
+        """
+        self.assertEqual(timing_utils.split_transcript("", [(0, 100), (200, 300)]), ["", ""])
+
+
+class RefineRegionsTest(unittest.TestCase):
+    """
+    Tests for timing_utils.refine_regions.
+    """
+
+    def test_trim_and_split(self):
+        """
+        Regions are trimmed to the words and split at the big gaps.
+        """
+        regions = [(0, 4000)]
+        words = [(300, 600, "hello"), (700, 1100, "big"), (2500, 2900, "world")]
+        new_regions, new_text_list = timing_utils.refine_regions(
+            regions, ["hello big world"], [gcsv1_result(words)], split_gap=500, min_size=500)
+        self.assertEqual(new_regions, [(300, 1100), (2500, 2900)])
+        self.assertEqual(new_text_list, ["hello big", "world"])
+
+    def test_split_edges(self):
+        """
+        A gap smaller than split_gap or a part shorter than min_size isn't split.
+        """
+        words = [(0, 600, "a"), (1099, 1700, "b")]
+        self.assertEqual(timing_utils.refine_regions(
+            [(0, 2000)], ["a b"], [gcsv1_result(words)], split_gap=500, min_size=500)[0],
+                         [(0, 1700)])
+        words = [(0, 600, "a"), (1100, 1700, "b")]
+        self.assertEqual(timing_utils.refine_regions(
+            [(0, 2000)], ["a b"], [gcsv1_result(words)], split_gap=500, min_size=500)[0],
+                         [(0, 600), (1100, 1700)])
+        self.assertEqual(timing_utils.refine_regions(
+            [(0, 1500)], ["a b"], [gcsv1_result(words)], split_gap=500, min_size=500)[0],
+                         [(0, 1500)])
+
+    def test_xfyun_without_ends(self):
+        """
+        Xun Fei Yun words without end times end at the next word or the region end
+        so they have no gaps to split at.
+        """
+        regions = [(1000, 2000), (2500, 5000)]
+        packed_regions, groups = timing_utils.pack_regions(regions, max_size=5000, max_gap=500)
+        result_list = [xfyun_result([(100, "你"), (400, "好"), (1800, "世"), (3200, "界")])]
+        new_regions, new_text_list = timing_utils.refine_regions(
+            regions, ["你好", "世界"], result_list,
+            packed_regions=packed_regions, groups=groups, split_gap=500, min_size=500)
+        self.assertEqual(new_regions, [(1100, 2000), (2800, 5000)])
+        self.assertEqual(new_text_list, ["你好", "世界"])
+
+    def test_text_and_order_kept(self):
+        """
+        The refined texts join back to the transcripts and the regions don't overlap.
+        """
+        regions = [(0, 1500), (1800, 4000), (4500, 5000), (6000, 9000)]
+        text_list = ["one two", "three four five", "", "six seven eight nine"]
+        result_list = [
+            gcsv1_result([(0, 400, "one"), (900, 1400, "two")]),
+            gcsv1_result([(100, 400, "three"), (1200, 1500, "four"), (1600, 2100, "five")]),
+            gcsv1_result([]),
+            xfyun_result([(0, "six"), (300, "seven"), (2000, "eightnine")])]
+        new_regions, new_text_list = timing_utils.refine_regions(
+            regions, text_list, result_list, split_gap=500, min_size=500)
+        self.assertTrue(is_ordered(new_regions))
+        self.assertEqual(len(new_regions), len(new_text_list))
+        self.assertEqual(" ".join(text for text in new_text_list if text),
+                         " ".join(text for text in text_list if text))
+        self.assertEqual(new_regions[0], (0, 1400))
+
+    def test_without_results(self):
+        """
+        Regions without results are kept.
+        """
+        regions = [(0, 1000), (2000, 3000)]
+        self.assertEqual(timing_utils.refine_regions(regions, ["a", "b"], []),
+                         (regions, ["a", "b"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests autosub's translation line ids and cache keys.
+"""
+# Import built-in modules
+import unittest
+
+# Any changes to the path and your own modules
+from autosub import trans_utils
+
+
+class ParseLineIdsTest(unittest.TestCase):
+    """
+    Tests for trans_utils.parse_line_ids.
+    """
+
+    def test_round_trip(self):
+        """
+        The tagged lines are parsed back by their indexes.
+        """
+        text_list = ["hello", "big\nworld", "again"]
+        result_text = trans_utils.tag_line_ids(text_list, [0, 1, 2])
+        self.assertEqual(trans_utils.parse_line_ids(result_text, [0, 1, 2]),
+                         {0: "hello", 1: "big world", 2: "again"})
+
+    def test_merged_lines(self):
+        """
+        Lines merged into one by the translator are split at their line ids.
+        """
+        self.assertEqual(trans_utils.parse_line_ids("[#3] Hallo [#4] Welt", [3, 4]),
+                         {3: "Hallo", 4: "Welt"})
+
+    def test_split_lines(self):
+        """
+        A line split into several by the translator is joined back.
+        """
+        self.assertEqual(trans_utils.parse_line_ids("[#3] Hallo\nschöne\n[#4] Welt", [3, 4]),
+                         {3: "Hallo schöne", 4: "Welt"})
+
+    def test_missing_ids(self):
+        """
+        Missing, empty and unrequested lines are left out.
+        """
+        self.assertEqual(trans_utils.parse_line_ids("[#3] Hallo\n[#4]\n[#9] Welt", [3, 4, 5]),
+                         {3: "Hallo"})
+
+    def test_full_width_ids(self):
+        """
+        Line ids with full-width brackets are recognized.
+        """
+        self.assertEqual(trans_utils.parse_line_ids("【＃3】你好［#4］世界", [3, 4]),
+                         {3: "你好", 4: "世界"})
+
+    def test_single_line_without_id(self):
+        """
+        A single requested line whose line id is dropped keeps its text.
+        """
+        self.assertEqual(trans_utils.parse_line_ids("Hallo", [7]), {7: "Hallo"})
+        self.assertEqual(trans_utils.parse_line_ids("Hallo", [7, 8]), {})
+
+
+class CacheKeyTest(unittest.TestCase):
+    """
+    Tests for the cache keys of the translator backends.
+    """
+
+    def test_dict_entries(self):
+        """
+        Dictionaries of different entries don't share the cached lines.
+        """
+        hallo = trans_utils.DictTranslator({"hello": "hallo"})
+        bonjour = trans_utils.DictTranslator({"hello": "bonjour"})
+        self.assertNotEqual(hallo.cache_key, bonjour.cache_key)
+        self.assertEqual(hallo.cache_key, trans_utils.DictTranslator({"Hello ": "hallo"}).cache_key)
+
+    def test_http_urls(self):
+        """
+        Services of different urls don't share the cached lines.
+        """
+        self.assertNotEqual(trans_utils.HTTPTranslator("http://a/").cache_key,
+                            trans_utils.HTTPTranslator("http://b").cache_key)
+        self.assertEqual(trans_utils.HTTPTranslator("http://a/").cache_key,
+                         trans_utils.HTTPTranslator("http://a", api_key="k").cache_key)
+
+    def test_cache(self):
+        """
+        The cached lines are looked up by the cache key.
+        """
+        cache = trans_utils.TranslationCache()
+        cache.put("dict:a", "en", "de", "hello", "hallo")
+        self.assertEqual(cache.get("dict:a", "en", "de", "hello"), "hallo")
+        self.assertIsNone(cache.get("dict:b", "en", "de", "hello"))
+
+
+if __name__ == "__main__":
+    unittest.main()